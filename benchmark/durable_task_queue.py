@@ -0,0 +1,84 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+benchmark the sustained enqueue rate of DurableTaskQueue
+
+    - producer threads queue no-op tasks by run_task() as fast as they can
+    - compares the in-memory PriorityTaskQueue, the durable queue writes one record per transaction (max_batch 1)
+      and the durable queue with group commit (max_batch 1000)
+    - reports the tasks per second from the first queued task until every task is committed and executed,
+      and the average records written per transaction
+
+    usage: python benchmark/durable_task_queue.py [--tasks 20000] [--producers 4]
+'''
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+from threading import Event, Lock, Thread
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hostray.util import PriorityTaskQueue, DurableTaskQueue
+
+
+def noop(index):
+    return index
+
+
+def measure(queue, tasks, producers):
+    done = Event()
+    lock = Lock()
+    remaining = [tasks]
+
+    def on_finish(result):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                done.set()
+
+    queue.register_task('noop', noop)
+
+    def produce(count):
+        for i in range(count):
+            queue.run_task('noop', i, on_finish=on_finish)
+
+    threads = [Thread(target=produce, args=(tasks // producers,))
+               for _ in range(producers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    enqueued = time.perf_counter() - start
+    done.wait()
+    elapsed = time.perf_counter() - start
+    info = queue.info()
+    queue.dispose()
+    return enqueued, elapsed, info
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=20000)
+    parser.add_argument('--producers', type=int, default=4)
+    args = parser.parse_args()
+    tasks = args.tasks // args.producers * args.producers
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, create in [('memory', lambda: PriorityTaskQueue(worker_limit=2)),
+                             ('durable, max_batch 1', lambda: DurableTaskQueue(
+                                 os.path.join(tmp_dir, 'single.db'), worker_limit=2, max_batch=1)),
+                             ('durable, group commit', lambda: DurableTaskQueue(
+                                 os.path.join(tmp_dir, 'group.db'), worker_limit=2))]:
+            enqueued, elapsed, info = measure(create(), tasks, args.producers)
+            durable = info.get('durable')
+            records = '{:>8.1f} records/commit'.format(
+                durable['committed_records'] / max(1, durable['commits'])) if durable else ''
+            print('{:<22} enqueue {:>10,.0f} tasks/s  executed {:>10,.0f} tasks/s {}'.format(
+                name, tasks / enqueued, tasks / elapsed, records))
@@ -0,0 +1,104 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+benchmark the task queue throughput of FunctionQueueWorker
+
+    - queues 10, 1k and 100k no-op tasks before the worker starts consuming
+    - compares the legacy list based queue (list.pop(0) and pause/resume) with the deque based queue
+    - reports the tasks per second from the first queued task to the last executed task
+
+    usage: python benchmark/function_queue_worker.py [--sizes 10 1000 100000]
+'''
+
+import os
+import sys
+import time
+import argparse
+from threading import Event
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hostray.util import FunctionQueueWorker
+from hostray.util.worker_pool.worker import _BaseWorker
+
+
+class LegacyFunctionQueueWorker(_BaseWorker):
+    """the legacy queue worker stores tasks as dicts in a list"""
+
+    def __init__(self, name=None):
+        super().__init__(name)
+        self.__tasks = []
+
+    @property
+    def pending_count(self):
+        return len(self.__tasks)
+
+    def run_method(self, func, *args, on_finish=None, on_exception=None, **kwargs):
+        with self._run_method_lock:
+            if callable(func):
+                self.__tasks.append({
+                    'func': func,
+                    'on_finish': on_finish,
+                    'on_exception': on_exception,
+                    'args': args,
+                    'kwargs': kwargs
+                })
+
+                if not self.is_started:
+                    self.start()
+
+                self.resume()
+
+    def _run(self):
+        while len(self.__tasks) > 0:
+            task = self.__tasks[0]
+
+            try:
+                result = self._execute_function(
+                    task['func'], *task['args'], **task['kwargs'])
+                if callable(task['on_finish']):
+                    task['on_finish'](result)
+            except Exception as e:
+                if callable(task['on_exception']):
+                    task['on_exception'](e)
+
+            with self._run_method_lock:
+                self.__tasks.pop(0)
+
+
+def noop(index):
+    return index
+
+
+def measure(worker_cls, size):
+    done = Event()
+    worker = worker_cls()
+
+    def on_last_finish(result):
+        done.set()
+
+    start = time.perf_counter()
+    for i in range(size - 1):
+        worker.run_method(noop, i)
+    worker.run_method(noop, size, on_finish=on_last_finish)
+    done.wait()
+    elapsed = time.perf_counter() - start
+    worker.dispose()
+    return elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10, 1000, 100000])
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        for name, worker_cls in [('list (before)', LegacyFunctionQueueWorker),
+                                 ('deque (after)', FunctionQueueWorker)]:
+            elapsed = measure(worker_cls, size)
+            print('{:>7} tasks  {:<14} {:>9.4f}s  {:>12,.0f} tasks/s'.format(
+                size, name, elapsed, size / elapsed))
@@ -0,0 +1,123 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+benchmark the accessor calls of DBCSUDController requests on SQLite, OrmAccessWorkerPool against AsyncOrmDB
+
+    - each request is one of the controller handlers: post (add, save, refresh), get (select), patch (load, set_attribute, save, refresh)
+      and delete (load, delete, save), the thread pool path reserves a worker for every request like the controller does
+    - the requests are sent by concurrent clients in the same event loop
+    - reports the requests per second, AsyncOrmDB requires sqlalchemy>=1.4 and aiosqlite
+
+    usage: python benchmark/orm_async_crud.py [--rows 1000] [--clients 16] [--workers 4]
+'''
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import Column, Integer, String
+from hostray.util import LocalizedMessageException, asynccontextmanager
+from hostray.util.orm import (get_declarative_base, EntityBaseAddon, OrmDBEntityAccessor, AsyncOrmDBEntityAccessor,
+                              OrmAccessWorkerPool, AsyncOrmDB, DB_MODULE_NAME)
+
+DeclarativeBase = get_declarative_base('benchmark_crud')
+
+
+class Item(DeclarativeBase, EntityBaseAddon):
+    __tablename__ = 'item'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(40), nullable=False)
+    value = Column(Integer, nullable=False)
+
+
+class ThreadPoolPath():
+    def __init__(self, path, workers):
+        self.accessor = OrmDBEntityAccessor(Item)
+        self.db = OrmAccessWorkerPool(worker_limit=workers)
+        self.db.set_session_maker(DB_MODULE_NAME.SQLITE_FILE, DeclarativeBase, file_name=path)
+
+    @asynccontextmanager
+    async def runner(self):
+        async with self.db.reserve_worker_async() as identity:
+            yield lambda func, *args, **kwargs: self.db.run_method_async(func, *args, identity=identity, **kwargs)
+
+    async def dispose(self):
+        self.db.dispose()
+
+
+class AsyncPath():
+    def __init__(self, path, workers):
+        self.accessor = AsyncOrmDBEntityAccessor(Item)
+        self.db = AsyncOrmDB(DB_MODULE_NAME.SQLITE_FILE, DeclarativeBase, file_name=path)
+
+    @asynccontextmanager
+    async def runner(self):
+        async with self.db.session() as sess:
+            yield lambda func, *args, **kwargs: func(sess, *args, **kwargs)
+
+    async def dispose(self):
+        await self.db.dispose()
+
+
+async def crud(db, row_id):
+    accessor = db.accessor
+    async with db.runner() as run:  # post
+        entity = await run(accessor.add, id=row_id, name='item', value=0)
+        await run(accessor.save)
+        await run(accessor.refresh, entity)
+
+    async with db.runner() as run:  # get
+        await run(accessor.select, id=row_id)
+
+    async with db.runner() as run:  # patch
+        entity = await run(accessor.load, id=row_id)
+        await run(accessor.set_attribute, entity, value=1)
+        await run(accessor.save)
+        await run(accessor.refresh, entity)
+
+    async with db.runner() as run:  # delete
+        entity = await run(accessor.load, id=row_id)
+        await run(accessor.delete, entity)
+        await run(accessor.save)
+
+
+async def measure(db, rows, clients):
+    async def client(index):
+        for row_id in range(index, rows, clients):
+            await crud(db, row_id + 1)
+
+    await crud(db, rows + 1)  # create the engine and schema
+    start = time.perf_counter()
+    await asyncio.gather(*[client(i) for i in range(clients)])
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, create in [('OrmAccessWorkerPool', ThreadPoolPath), ('AsyncOrmDB', AsyncPath)]:
+            loop = asyncio.new_event_loop()
+            db = create(os.path.join(tmp_dir, '{}.db'.format(name)), args.workers)
+            try:
+                elapsed = loop.run_until_complete(measure(db, args.rows, args.clients))
+                print('{:<20} {:>9.3f}s  {:>10,.0f} requests/s'.format(
+                    name, elapsed, args.rows * 4 / elapsed))
+            except LocalizedMessageException as e:
+                print('{:<20} {}'.format(name, e))
+            finally:
+                loop.run_until_complete(db.dispose())
+                loop.close()
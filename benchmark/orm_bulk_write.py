@@ -0,0 +1,82 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+benchmark ingesting rows into SQLite file by OrmDBEntityAccessor, per entity functions against the bulk functions
+
+    - per entity: add() or merge() of each row then one save(), like the rows are posted one by one in one transaction
+    - bulk: bulk_add() and bulk_merge() of all the rows then one save()
+    - merge updates the half of rows and inserts the others
+    - reports the rows per second
+
+    usage: python benchmark/orm_bulk_write.py [--rows 100000]
+'''
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import Column, Integer, String
+from hostray.util.orm import (get_declarative_base, EntityBaseAddon, OrmDBEntityAccessor,
+                              get_session_maker, DB_MODULE_NAME)
+
+DeclarativeBase = get_declarative_base('benchmark_bulk')
+
+
+class Item(DeclarativeBase, EntityBaseAddon):
+    __tablename__ = 'item'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(40), nullable=False)
+    value = Column(Integer, nullable=False)
+
+
+class ItemAccessor(OrmDBEntityAccessor):
+    def __init__(self):
+        super().__init__(Item)
+
+
+def measure(path, func, rows):
+    sess = get_session_maker(DB_MODULE_NAME.SQLITE_FILE, DeclarativeBase, file_name=path)()
+    try:
+        start = time.perf_counter()
+        func(sess, rows)
+        ItemAccessor().save(sess)
+        return time.perf_counter() - start
+    finally:
+        sess.close()
+        sess.get_bind().dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    accessor = ItemAccessor()
+    rows = [{'id': i, 'name': 'item', 'value': i} for i in range(args.rows)]
+    merge_rows = [{'id': i, 'value': -i} for i in range(args.rows // 2, args.rows + args.rows // 2)]
+
+    def add_each(sess, rows):
+        for row in rows:
+            accessor.add(sess, **row)
+
+    def merge_each(sess, rows):
+        for row in rows:
+            accessor.merge(sess, **row)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, add, merge in [('per entity', add_each, merge_each),
+                                 ('bulk', accessor.bulk_add, accessor.bulk_merge)]:
+            path = os.path.join(tmp_dir, name.replace(' ', '_') + '.db')
+            elapsed = measure(path, add, rows)
+            print('{:<12} add   {:>10,.0f} rows/s'.format(name, args.rows / elapsed))
+            elapsed = measure(path, merge, [{'name': 'item', **row} if row['id'] >= args.rows else row
+                                            for row in merge_rows])
+            print('{:<12} merge {:>10,.0f} rows/s'.format(name, args.rows / elapsed))
@@ -0,0 +1,93 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+benchmark the startup of OrmAccessWorkerPool with many workers and tables
+
+    - declares the tables in one DeclarativeBase and creates them in a SQLite file
+    - per worker engine: each worker builds its own engine and creates the schema, as the workers did before they share the engine of pool
+    - shared engine: the pool creates the engine and schema once, every worker executes its first query
+    - reports the seconds until every worker has executed one query
+
+    usage: python benchmark/orm_engine_startup.py [--workers 8] [--tables 50] [--repeat 5]
+'''
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+from threading import Barrier
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import Column, Integer, String
+from hostray.util.orm import get_declarative_base, get_session_maker, OrmAccessWorkerPool, DB_MODULE_NAME
+
+
+def declare_tables(tables):
+    base = get_declarative_base('benchmark_{}'.format(tables))
+    for i in range(tables):
+        type('Table{}'.format(i), (base,), {
+            '__tablename__': 'table_{}'.format(i),
+            'id': Column(Integer, primary_key=True),
+            'name': Column(String(40)),
+            'value': Column(Integer)
+        })
+    return base
+
+
+def query(sess):
+    return sess.execute('SELECT 1').scalar()
+
+
+def per_worker_engine(base, path, workers):
+    start = time.perf_counter()
+    makers = [get_session_maker(DB_MODULE_NAME.SQLITE_FILE, base, file_name=path)
+              for _ in range(workers)]
+    for maker in makers:
+        sess = maker()
+        query(sess)
+        sess.close()
+    elapsed = time.perf_counter() - start
+    for maker in makers:
+        maker.kw['bind'].dispose()
+    return elapsed
+
+
+def shared_engine(base, path, workers):
+    barrier = Barrier(workers)
+
+    def first_query(sess):  # every worker executes one of them
+        barrier.wait()
+        return query(sess)
+
+    start = time.perf_counter()
+    pool = OrmAccessWorkerPool(worker_limit=workers)
+    pool.set_session_maker(DB_MODULE_NAME.SQLITE_FILE, base, file_name=path)
+    tasks = [pool.submit(first_query) for _ in range(workers)]
+    for task in tasks:
+        task.result()
+    elapsed = time.perf_counter() - start
+    pool.dispose()
+    return elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--tables', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    base = declare_tables(args.tables)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'startup.db')
+        get_session_maker(DB_MODULE_NAME.SQLITE_FILE, base, file_name=path).kw['bind'].dispose()  # create the tables
+
+        for name, measure in [('per worker engine', per_worker_engine), ('shared engine', shared_engine)]:
+            elapsed = min(measure(base, path, args.workers) for _ in range(args.repeat))
+            print('{:<18} {} workers {} tables {:>8.1f} ms'.format(
+                name, args.workers, args.tables, elapsed * 1000))
@@ -0,0 +1,89 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+benchmark reading a large table of SQLite file by OrmDBEntityAccessor
+
+    - select(): loads all the entities into a list, then converts them to client dicts like GET of DBCSUDController
+    - iterate(): converts the entities fetched by yield_per, the way GET streams with stream=true
+    - reports the elapsed time, the time to the first entity and the peak of traced memory
+    - compares reading the last page by OFFSET against select_page() after the primary key of previous page
+
+    usage: python benchmark/orm_keyset_stream.py [--rows 200000] [--page 100]
+'''
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import Column, Integer, String
+from hostray.util.orm import (get_declarative_base, EntityBaseAddon, OrmDBEntityAccessor,
+                              get_session_maker, DB_MODULE_NAME)
+
+DeclarativeBase = get_declarative_base('benchmark_keyset')
+
+
+class Item(DeclarativeBase, EntityBaseAddon):
+    __tablename__ = 'item'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(40), nullable=False)
+    value = Column(Integer, nullable=False)
+
+
+class ItemAccessor(OrmDBEntityAccessor):
+    def __init__(self):
+        super().__init__(Item)
+
+
+def measure_read(sess, entities):
+    tracemalloc.start()
+    start = time.perf_counter()
+    first = None
+    for entity in entities(sess):
+        if first is None:
+            first = time.perf_counter() - start
+        entity.to_client_dict()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, first, peak
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--page', type=int, default=100)
+    args = parser.parse_args()
+
+    accessor = ItemAccessor()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sess = get_session_maker(DB_MODULE_NAME.SQLITE_FILE, DeclarativeBase,
+                                 file_name=os.path.join(tmp_dir, 'keyset.db'))()
+        accessor.bulk_add(sess, [{'id': i, 'name': 'item', 'value': i} for i in range(args.rows)])
+        accessor.save(sess)
+
+        for name, entities in [('select', accessor.select), ('iterate', accessor.iterate)]:
+            elapsed, first, peak = measure_read(sess, entities)
+            sess.expunge_all()
+            print('{:<8} {:>8.2f} s  first entity {:>8.1f} ms  peak memory {:>8.1f} MB'.format(
+                name, elapsed, first * 1000, peak / 1024 / 1024))
+
+        last = args.rows - args.page
+        for name, page in [('offset', lambda: sess.query(Item).order_by(Item.id).offset(last).limit(args.page).all()),
+                           ('keyset', lambda: accessor.select_page(sess, args.page, last - 1))]:
+            start = time.perf_counter()
+            for _ in range(10):
+                entities = page()
+            print('{:<8} last page {:>8.2f} ms'.format(name, (time.perf_counter() - start) * 100))
+            assert entities[0].id == last
+
+        sess.close()
+        sess.get_bind().dispose()
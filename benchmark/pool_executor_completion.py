@@ -0,0 +1,101 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+benchmark the completion signaling of PoolWorkerExecutor
+
+    - submits 1k concurrent run_method_async() calls to an AsyncWorkerPool
+    - compares the legacy "sleep(0)" spinning executor with the event-driven executor
+    - reports the event loop thread cpu time and the latency percentiles of calls
+
+    usage: python benchmark/pool_executor_completion.py [--calls 1000] [--workers 4] [--task-ms 1]
+'''
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hostray.util import AsyncWorkerPool, PoolWorkerExecutor
+
+
+class SpinPoolWorkerExecutor(PoolWorkerExecutor):
+    """the legacy executor waits for result by spinning on asyncio.sleep(0)"""
+
+    def queue_method(self, func, args, kwargs, loop=None):
+        self._done = False
+        self._worker.run_method(func, *args, on_finish=self._on_finish,
+                                on_exception=self._on_exception, **kwargs)
+
+    async def wait_async(self):
+        while not self._done:
+            await asyncio.sleep(0)
+        return self.get_result()
+
+    def _set_done(self):
+        self._done = True
+
+
+class SpinAsyncWorkerPool(AsyncWorkerPool):
+    def _get_free_executor(self, identity=None):
+        executor = super()._get_free_executor(identity=identity)
+        return SpinPoolWorkerExecutor(executor._worker) if executor else None
+
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def task(ms):
+    time.sleep(ms / 1000)
+
+
+async def measure(pool, calls, task_ms):
+    latencies = []
+
+    async def call():
+        start = time.perf_counter()
+        await pool.run_method_async(task, task_ms)
+        latencies.append(time.perf_counter() - start)
+
+    cpu_start = time.thread_time()
+    wall_start = time.perf_counter()
+    await asyncio.gather(*[call() for _ in range(calls)])
+    wall = time.perf_counter() - wall_start
+    cpu = time.thread_time() - cpu_start
+    return wall, cpu, latencies
+
+
+def run(name, pool_cls, args):
+    loop = asyncio.new_event_loop()
+    pool = pool_cls(worker_limit=args.workers)
+    try:
+        wall, cpu, latencies = loop.run_until_complete(
+            measure(pool, args.calls, args.task_ms))
+    finally:
+        pool.dispose()
+        loop.close()
+
+    print('{:<14} wall: {:>8.3f}s  loop cpu: {:>8.3f}s ({:>5.1f}%)  p50: {:>8.2f}ms  p99: {:>8.2f}ms'.format(
+        name, wall, cpu, cpu / wall * 100,
+        percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--task-ms', type=float, default=1)
+    args = parser.parse_args()
+
+    print('{} concurrent run_method_async() calls, {} workers, {}ms task'.format(
+        args.calls, args.workers, args.task_ms))
+    run('spin (before)', SpinAsyncWorkerPool, args)
+    run('event (after)', AsyncWorkerPool, args)
@@ -0,0 +1,65 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+benchmark fanning out tiny functions to AsyncWorkerPool
+
+    - executes a tiny function with 10k items
+    - compares one run_method_async() call per item with a single map_async() call
+    - reports the wall time and the calls per second
+
+    usage: python benchmark/pool_map.py [--items 10000] [--workers 4] [--chunksize N]
+'''
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hostray.util import AsyncWorkerPool
+
+
+def validate(index):
+    return index % 7 == 0
+
+
+async def per_call(pool, items, chunksize):
+    return await asyncio.gather(*[pool.run_method_async(validate, i) for i in items])
+
+
+async def mapped(pool, items, chunksize):
+    return await pool.map_async(validate, items, chunksize=chunksize)
+
+
+def run(name, func, args):
+    loop = asyncio.new_event_loop()
+    pool = AsyncWorkerPool(worker_limit=args.workers)
+    items = list(range(args.items))
+    try:
+        start = time.perf_counter()
+        results = loop.run_until_complete(func(pool, items, args.chunksize))
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.dispose()
+        loop.close()
+
+    assert results == [validate(i) for i in items]
+    print('{:<26} {:>9.4f}s  {:>12,.0f} calls/s'.format(
+        name, elapsed, args.items / elapsed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--chunksize', type=int, default=None)
+    args = parser.parse_args()
+
+    print('{} items, {} workers'.format(args.items, args.workers))
+    run('run_method_async (before)', per_call, args)
+    run('map_async (after)', mapped, args)
@@ -7,18 +7,47 @@
 Last Updated:  Sunday, 10th November 2019 by hsky77 (howardlkung@gmail.com)
 '''
 
+import os
 import time
 import random
 import asyncio
+from threading import Event, Timer, current_thread
 
 from ..util import Worker, FunctionLoopWorker, FunctionQueueWorker
 from .base import UnitTestCase
 
 
+def _get_pid(index: int) -> tuple:
+    return index, os.getpid()
+
+
+def _crash() -> None:
+    os._exit(1)
+
+
 class WorkerTestCase(UnitTestCase):
     def test(self):
         self.test_pools()
         self.test_workers()
+        self.test_queue_worker()
+        self.test_work_stealing()
+        self.test_elastic_pool()
+        self.test_process_pool()
+        self.test_pool_executor()
+        self.test_map_gather()
+        self.test_priority_queue()
+        self.test_backpressure()
+        self.test_scheduler()
+        self.test_timeout_cancellation()
+        self.test_metrics()
+        self.test_reservation()
+        self.test_broadcast()
+        self.test_iterate()
+        self.test_single_flight()
+        self.test_coroutine_pool()
+        self.test_durable_queue()
+        self.test_resource_pool()
+        self.test_adaptive_limit()
 
     def test_pools(self):
         """test worker pool both sync and async function"""
@@ -170,3 +199,1059 @@ class WorkerTestCase(UnitTestCase):
                 pass
 
             self.assertGreaterEqual(self.loop_count, 2)
+
+    def test_queue_worker(self):
+        """test pending_count is exact and dispose() drains the queued functions"""
+        started = Event()
+        release = Event()
+        results = []
+
+        def block():
+            started.set()
+            release.wait()
+
+        worker = FunctionQueueWorker()
+        worker.run_method(block)
+        started.wait()
+        for i in range(3):
+            worker.run_method(results.append, i)
+
+        self.assertEqual(worker.pending_count, 4)
+        worker.dispose()
+        release.set()
+        worker.join()
+
+        self.assertEqual(worker.pending_count, 0)
+        self.assertEqual(results, [0, 1, 2])
+
+    def test_work_stealing(self):
+        """test idle worker steals queued functions from the worker blocked by a slow function"""
+        from ..util import AsyncWorkerPool
+        loop = asyncio.get_event_loop()
+        ap = AsyncWorkerPool(worker_limit=2, work_stealing=True)
+        release = Event()
+
+        def foo(index):
+            return index
+
+        def get_thread_name():
+            return current_thread().name
+
+        async def run():
+            async with ap.reserve_worker_async() as identity:
+                results = await asyncio.gather(
+                    *[ap.run_method_async(get_thread_name, identity=identity) for _ in range(10)],
+                    *[ap.run_method_async(foo, i) for i in range(20)])
+                self.assertEqual(len(set(results[:10])), 1)
+                self.assertEqual(results[10:], list(range(20)))
+
+            slow = asyncio.ensure_future(ap.run_method_async(release.wait))
+            results = await asyncio.wait_for(asyncio.gather(
+                *[ap.run_method_async(foo, i) for i in range(20)]), 5)
+            self.assertEqual(results, list(range(20)))
+
+            release.set()
+            await slow
+
+        try:
+            loop.run_until_complete(run())
+        finally:
+            release.set()
+            ap.dispose()
+
+    def test_elastic_pool(self):
+        """test pool spawns workers under burst and retires idle workers down to min_workers"""
+        from ..util import AsyncWorkerPool
+        loop = asyncio.get_event_loop()
+        ap = AsyncWorkerPool(worker_limit=4, min_workers=1, idle_timeout=0.1)
+        release = Event()
+
+        async def burst():
+            futures = [asyncio.ensure_future(ap.run_method_async(release.wait)) for _ in range(4)]
+            await asyncio.sleep(0.1)
+            self.assertEqual(ap.info()['size'], 4)
+            release.set()
+            await asyncio.gather(*futures)
+
+        try:
+            loop.run_until_complete(burst())
+            start_time = time.time()
+            while ap.info()['size'] > 1:
+                self.assertGreaterEqual(3, time.time() - start_time)
+                time.sleep(0.05)
+            self.assertEqual(ap.run_method(sum, [1, 2]), 3)
+            self.assertEqual(ap.info()['size'], 1)
+        finally:
+            release.set()
+            ap.dispose()
+
+        # queued function does not wait long enough to spawn another worker
+        ap = AsyncWorkerPool(worker_limit=4, scale_up_wait=10)
+        release.clear()
+
+        async def queued():
+            futures = [asyncio.ensure_future(ap.run_method_async(release.wait)) for _ in range(2)]
+            await asyncio.sleep(0.1)
+            self.assertEqual(ap.info()['size'], 1)
+            release.set()
+            await asyncio.gather(*futures)
+
+        try:
+            loop.run_until_complete(queued())
+        finally:
+            release.set()
+            ap.dispose()
+
+    def test_process_pool(self):
+        """test functions run in worker processes, unpicklable function is rejected and crashed processes are restarted"""
+        from ..util import ProcessWorkerPool, LocalizedMessageException
+        from concurrent.futures.process import BrokenProcessPool
+        loop = asyncio.get_event_loop()
+        pp = ProcessWorkerPool(worker_limit=2)
+
+        async def run():
+            return await asyncio.gather(*[pp.run_method_async(_get_pid, i) for i in range(10)])
+
+        try:
+            results = loop.run_until_complete(run())
+            self.assertEqual([r[0] for r in results], list(range(10)))
+            self.assertNotIn(os.getpid(), [r[1] for r in results])
+
+            with self.assertRaises(LocalizedMessageException):
+                pp.run_method(lambda: 1)
+
+            with self.assertRaises(BrokenProcessPool):
+                pp.run_method(_crash)
+            self.assertEqual(pp.run_method(_get_pid, 1)[0], 1)
+            self.assertEqual(pp.info()['restart_count'], 1)
+        finally:
+            pp.dispose()
+
+    def test_pool_executor(self):
+        """test WorkerPoolExecutor works as concurrent.futures.Executor and the default executor of asyncio loop"""
+        from ..util import AsyncWorkerPool, WorkerPoolExecutor
+        ap = AsyncWorkerPool(pool_name='executor', worker_limit=1)
+        executor = WorkerPoolExecutor(ap, dispose_pool=True)
+        release = Event()
+
+        def foo(index):
+            return index
+
+        def foo_raise_exception():
+            raise Exception('This is from foo_raise_exception()')
+
+        try:
+            self.assertEqual(executor.submit(foo, 1).result(), 1)
+            self.assertEqual(list(executor.map(foo, range(5))), list(range(5)))
+            with self.assertRaises(Exception):
+                executor.submit(foo_raise_exception).result()
+
+            blocked = executor.submit(release.wait)
+            cancelled = executor.submit(foo, 2)
+            self.assertTrue(cancelled.cancel())
+            release.set()
+            self.assertTrue(blocked.result())
+            self.assertTrue(cancelled.cancelled())
+
+            loop = asyncio.new_event_loop()
+            try:
+                loop.set_default_executor(executor)
+                name = loop.run_until_complete(
+                    loop.run_in_executor(None, lambda: current_thread().name))
+                self.assertTrue(name.startswith('executor'))
+            finally:
+                loop.close()
+        finally:
+            release.set()
+            executor.shutdown()
+
+        with self.assertRaises(RuntimeError):
+            executor.submit(foo, 1)
+
+    def test_map_gather(self):
+        """test map_async() and gather_async() return results in order, or as the chunks complete"""
+        from ..util import AsyncWorkerPool, ProcessWorkerPool
+        loop = asyncio.get_event_loop()
+        ap = AsyncWorkerPool(worker_limit=4)
+        pp = ProcessWorkerPool(worker_limit=2)
+
+        def foo(index):
+            if index == 0:
+                time.sleep(0.1)  # the first chunk completes last
+            return index
+
+        def foo_raise_exception(index):
+            raise Exception('This is from foo_raise_exception()')
+
+        async def run():
+            self.assertEqual(await ap.map_async(foo, range(1000)), list(range(1000)))
+            self.assertEqual(await ap.map_async(foo, range(100), chunksize=7), list(range(100)))
+            self.assertEqual(await ap.map_async(foo, []), [])
+
+            results = await ap.map_async(foo, range(100), chunksize=10, ordered=False)
+            self.assertEqual(sorted(results), list(range(100)))
+            self.assertGreater(results.index(0), 0)  # the slow first chunk is not the first completed
+
+            results = await ap.gather_async([(foo, 1), (max, 2, 3), random.random] * 10)
+            self.assertEqual(len(results), 30)
+            self.assertEqual(results[:2], [1, 3])
+            with self.assertRaises(Exception):
+                await ap.map_async(foo_raise_exception, range(10))
+
+            results = await pp.map_async(_get_pid, range(10), chunksize=3)
+            self.assertEqual([r[0] for r in results], list(range(10)))
+
+        try:
+            loop.run_until_complete(run())
+        finally:
+            ap.dispose()
+            pp.dispose()
+
+    def test_priority_queue(self):
+        """test PriorityTaskQueue executes higher priority first and drops the functions past deadline"""
+        from ..util import PriorityTaskQueue, TaskPriority
+        queue = PriorityTaskQueue(worker_limit=1)
+        started = Event()
+        release = Event()
+        results = []
+        expired = []
+
+        def block():
+            started.set()
+            release.wait()
+
+        queue.run_method(block)
+        started.wait()
+        queue.run_method(results.append, 'low', priority=TaskPriority.Low)
+        queue.run_method(results.append, 'normal')
+        queue.run_method(results.append, 'high', priority=TaskPriority.High)
+        queue.run_method(results.append, 'stale', priority=TaskPriority.High,
+                         deadline=0.01, on_expired=expired.append)
+
+        info = queue.info()
+        self.assertEqual(info['pendings'], {'High': 2, 'Normal': 1, 'Low': 1})
+
+        time.sleep(0.05)
+        release.set()
+        queue.dispose()
+        for w in queue.workers:
+            w.join()
+
+        self.assertEqual(results, ['high', 'normal', 'low'])
+        self.assertEqual(expired, [results.append])
+        self.assertEqual(queue.info()['expired'], 1)
+        self.assertFalse(queue.run_method(results.append, 'disposed'))
+
+    def test_backpressure(self):
+        """test the pool and queue reached max_pending block, reject, drop the oldest or let caller run functions"""
+        from ..util import AsyncWorkerPool, PriorityTaskQueue, QueueFullException
+        loop = asyncio.get_event_loop()
+        release = Event()
+
+        def foo(index):
+            return index
+
+        def get_thread_name():
+            return current_thread().name
+
+        started = Event()
+
+        def block():
+            started.set()
+            return release.wait()
+
+        for policy in ['reject', 'drop_oldest', 'caller_runs']:
+            release.clear()
+            started.clear()
+            ap = AsyncWorkerPool(worker_limit=1, max_pending=2, backpressure=policy)
+            try:
+                blocked = ap.submit(block)
+                self.assertTrue(started.wait(3))  # executing, not the oldest queued one
+                queued = ap.submit(foo, 1)
+                if policy == 'reject':
+                    with self.assertRaises(QueueFullException):
+                        ap.submit(foo, 2)
+                    self.assertEqual(ap.info()['rejected'], 1)
+                elif policy == 'drop_oldest':
+                    latest = ap.submit(foo, 2)
+                    self.assertIsInstance(queued.exception(), QueueFullException)
+                    release.set()
+                    self.assertEqual(latest.result(), 2)
+                    self.assertEqual(ap.info()['dropped'], 1)
+                else:
+                    self.assertEqual(ap.submit(get_thread_name).result(), current_thread().name)
+                    self.assertEqual(ap.info()['caller_runs'], 1)
+                release.set()
+                self.assertTrue(blocked.result())
+            finally:
+                release.set()
+                ap.dispose()
+
+        ap = AsyncWorkerPool(worker_limit=2, max_pending=1)
+
+        async def run():
+            self.assertEqual(await asyncio.gather(*[ap.run_method_async(foo, i) for i in range(20)]),
+                             list(range(20)))
+            self.assertEqual(await ap.map_async(foo, range(100)), list(range(100)))
+
+        try:
+            loop.run_until_complete(run())
+            self.assertGreater(ap.info()['blocked'], 0)
+            self.assertEqual(ap.info()['waiting'], 0)
+        finally:
+            ap.dispose()
+
+        # the caller runs with a temporary resource and off the event loop, the reserved functions are not run by caller
+        release.clear()
+        started.clear()
+        disposed = []
+        ap = AsyncWorkerPool(worker_limit=1, max_pending=2, backpressure='caller_runs',
+                             resource_factory=lambda: 'resource', resource_dispose=disposed.append)
+
+        def get_resource_thread(resource):
+            return resource, current_thread().name
+
+        def generate(resource, count):
+            for _ in range(count):
+                yield get_resource_thread(resource)
+
+        async def caller_runs():
+            self.assertNotEqual(await ap.run_method_async(get_resource_thread),
+                                ('resource', current_thread().name))
+            items = [item async for item in ap.iterate_async(generate, 2)]
+            self.assertEqual(len(items), 2)
+            self.assertTrue(all(item[0] == 'resource' and not item[1] == current_thread().name for item in items))
+
+        try:
+            with ap.reserve_worker() as identity:
+                blocked = ap.submit(lambda resource: block(), identity=identity)
+                self.assertTrue(started.wait(3))
+                ap.submit(lambda resource: None, identity=identity)
+                self.assertEqual(ap.submit(get_resource_thread).result(), ('resource', current_thread().name))
+                self.assertIsInstance(ap.submit(get_resource_thread, identity=identity).exception(), QueueFullException)
+                loop.run_until_complete(caller_runs())
+                self.assertEqual(disposed, ['resource'] * 3)
+                self.assertEqual(ap.info()['caller_runs'], 3)
+                self.assertEqual(ap.info()['rejected'], 1)
+                release.set()
+                self.assertTrue(blocked.result())
+        finally:
+            release.set()
+            ap.dispose()
+
+        # the functions of reservation are not dropped, the caller waits instead
+        release.clear()
+        started.clear()
+        ap = AsyncWorkerPool(worker_limit=2, max_pending=2, backpressure='drop_oldest')
+        try:
+            with ap.reserve_worker() as identity:
+                blocked = ap.submit(block, identity=identity)
+                self.assertTrue(started.wait(3))
+                reserved = ap.submit(foo, 1, identity=identity)
+                Timer(0.2, release.set).start()
+                latest = ap.submit(foo, 2)  # waits until the queued function of reservation is executed
+                self.assertEqual(reserved.result(), 1)
+                self.assertEqual(latest.result(), 2)
+                self.assertEqual(ap.info()['dropped'], 0)
+        finally:
+            release.set()
+            ap.dispose()
+
+        release.clear()
+        queue = PriorityTaskQueue(worker_limit=1, max_pending=1, backpressure='reject')
+        try:
+            queue.run_method(release.wait)
+            start_time = time.time()
+            while queue.info()['pendings']['Normal'] > 0:  # wait for worker takes it
+                self.assertGreaterEqual(3, time.time() - start_time)
+            queue.run_method(foo, 1)
+            with self.assertRaises(QueueFullException):
+                queue.run_method(foo, 2)
+        finally:
+            release.set()
+            queue.dispose()
+
+    def test_scheduler(self):
+        """test one-shot, periodic, cascaded and cancelled jobs, and FunctionLoopWorker stops immediately"""
+        from threading import active_count
+        from ..util import TimerWheelScheduler, get_scheduler
+
+        # small wheels cascade the jobs through every level
+        scheduler = TimerWheelScheduler(tick_seconds=0.001, wheel_size=4, levels=3)
+        try:
+            fired = {}
+            done = Event()
+
+            def mark(key):
+                fired[key] = time.monotonic()
+                if len(fired) == 3:
+                    done.set()
+
+            start_time = time.monotonic()
+            scheduler.schedule(mark, 'now')
+            scheduler.schedule(mark, 'cascaded', delay=0.03)
+            scheduler.schedule(mark, 'beyond_top_level', delay=0.15)
+            scheduler.schedule(mark, 'cancelled', delay=0.05).cancel()
+            self.assertTrue(done.wait(3))
+            self.assertGreaterEqual(fired['cascaded'] - start_time, 0.03)
+            self.assertGreaterEqual(fired['beyond_top_level'] - start_time, 0.15)
+            time.sleep(0.1)
+            self.assertNotIn('cancelled', fired)
+
+            counts = {'delay': 0, 'rate': 0}
+
+            def count(key):
+                counts[key] += 1
+
+            def on_exception(e):
+                self.check_exp = True
+
+            self.check_exp = False
+            delay_job = scheduler.schedule(count, 'delay', interval=0.02)
+            rate_job = scheduler.schedule(count, 'rate', interval=0.02, fixed_rate=True)
+            raise_job = scheduler.schedule(lambda: 1 / 0, interval=0.02, on_exception=on_exception)
+            time.sleep(0.3)
+            for job in (delay_job, rate_job, raise_job):
+                job.cancel()
+            self.assertTrue(self.check_exp)
+            self.assertGreaterEqual(counts['delay'], 3)
+            self.assertGreaterEqual(counts['rate'], counts['delay'] - 1)
+
+            frozen = dict(counts)
+            time.sleep(0.1)
+            self.assertEqual(counts, frozen)
+            self.assertEqual(scheduler.info()['jobs'], 0)
+        finally:
+            scheduler.dispose()
+        self.assertTrue(scheduler.schedule(print).cancelled)
+
+        # a blocking loop occupies one thread, the other loop fires on the rest
+        scheduler = TimerWheelScheduler(worker_limit=2)
+        release = Event()
+        try:
+            blocked = []
+            looped = []
+            scheduler.schedule(lambda: blocked.append(release.wait(3)), interval=0.01)
+            scheduler.schedule(looped.append, 1, interval=0.01)
+            time.sleep(0.3)
+            self.assertEqual(blocked, [])
+            self.assertGreaterEqual(len(looped), 3)
+        finally:
+            release.set()
+            scheduler.dispose()
+
+        self.assertEqual(get_scheduler(8).info()['pool']['max_workers'], 8)
+        self.assertEqual(get_scheduler(4).info()['pool']['max_workers'], 4)
+
+        # many loop workers share the scheduler threads, and dispose() does not wait for the interval
+        looped = []
+
+        def loop():
+            looped.append(1)
+
+        threads = active_count()
+        workers = [FunctionLoopWorker(loop_interval_seconds=10) for _ in range(100)]
+        for w in workers:
+            w.run_method(loop)
+        start_time = time.time()
+        while len(looped) < 100:
+            self.assertGreaterEqual(3, time.time() - start_time)
+        self.assertLess(active_count() - threads, 10)
+
+        start_time = time.time()
+        for w in workers:
+            w.dispose()
+            self.assertFalse(w.is_func_running)
+        self.assertGreater(1, time.time() - start_time)
+
+    def test_timeout_cancellation(self):
+        """test the timed out or cancelled functions are removed from queue, and the executing one sees its token"""
+        from ..util import AsyncWorkerPool, ProcessWorkerPool, TaskTimeoutException, get_cancellation_token
+        loop = asyncio.get_event_loop()
+        ap = AsyncWorkerPool(worker_limit=1)
+        started = Event()
+        stopped = Event()
+        executed = []
+
+        def cooperative():
+            started.set()
+            token = get_cancellation_token()
+            if token.wait(3):  # cancelled
+                stopped.set()
+
+        def foo(index):
+            executed.append(index)
+            return index
+
+        async def run():
+            self.assertIsNone(get_cancellation_token())
+
+            running = asyncio.ensure_future(ap.run_method_async(cooperative, timeout=0.1))
+            queued = asyncio.ensure_future(ap.run_method_async(foo, 1, timeout=0.05))
+            cancelled = asyncio.ensure_future(ap.run_method_async(foo, 2))
+            await asyncio.sleep(0.01)
+            cancelled.cancel()
+
+            start_time = time.time()
+            with self.assertRaises(TaskTimeoutException):
+                await queued
+            with self.assertRaises(asyncio.TimeoutError):
+                await running
+            self.assertGreater(1, time.time() - start_time)
+            with self.assertRaises(asyncio.CancelledError):
+                await cancelled
+
+            self.assertTrue(stopped.wait(3))
+            self.assertEqual(await ap.run_method_async(foo, 3, timeout=1), 3)
+            self.assertEqual(executed, [3])
+
+        try:
+            loop.run_until_complete(run())
+            self.assertTrue(started.is_set())
+            self.assertEqual(ap.info()['timed_out'], 2)
+            self.assertEqual(ap.info()['cancelled'], 1)
+            self.assertEqual(ap.info()['workers'][0]['pending_task'], 0)
+
+            release = Event()
+            blocked = ap.submit(release.wait)
+            future = ap.submit(foo, 4)
+            self.assertTrue(future.cancel())
+            self.assertEqual(ap.info()['workers'][0]['pending_task'], 1)
+            release.set()
+
+            with self.assertRaises(TaskTimeoutException):
+                ap.run_method(time.sleep, 0.5, timeout=0.05)
+            self.assertTrue(blocked.result())
+            self.assertEqual(ap.run_method(foo, 5, timeout=1), 5)
+            self.assertEqual(executed, [3, 5])
+        finally:
+            ap.dispose()
+
+        pp = ProcessWorkerPool(worker_limit=1)
+        try:
+            with self.assertRaises(TaskTimeoutException):
+                pp.run_method(time.sleep, 0.5, timeout=0.05)
+            with self.assertRaises(TaskTimeoutException):
+                loop.run_until_complete(pp.run_method_async(time.sleep, 0.5, timeout=0.05))
+            self.assertEqual(pp.info()['timed_out'], 2)
+        finally:
+            pp.dispose()
+
+    def test_metrics(self):
+        """test the latency percentiles, exceptions and windows of pool and queue metrics"""
+        from ..util import AsyncWorkerPool, PriorityTaskQueue, LatencyHistogram
+
+        histogram = LatencyHistogram()
+        for ms in range(1, 101):
+            histogram.record(ms / 1000)
+        self.assertEqual(histogram.count, 100)
+        self.assertLessEqual(0.05, histogram.percentile(50))
+        self.assertLessEqual(histogram.percentile(50), 0.05 * 1.25)
+        self.assertLessEqual(0.099, histogram.percentile(99))
+        self.assertEqual(histogram.percentile(100), 0.1)
+
+        def raise_exception():
+            raise Exception('This is from raise_exception()')
+
+        ap = AsyncWorkerPool(worker_limit=1, idle_timeout=0.05)
+        try:
+            ap.run_method(time.sleep, 0.05)
+            for _ in range(10):
+                ap.submit(max, 1, 2)
+            ap.submit(raise_exception)
+            ap.run_method(max, 1, 2)
+
+            metrics = ap.info()['metrics']
+            self.assertEqual(metrics['executed'], 13)
+            self.assertEqual(metrics['exceptions'], 1)
+            self.assertGreater(metrics['tasks_per_second'], 0)
+            self.assertGreaterEqual(metrics['execution']['max'], 0.05)
+            self.assertGreater(metrics['queue_wait']['max'], 0)
+
+            start_time = time.time()
+            while ap.info()['size'] > 0:  # the metrics of retired worker are kept
+                self.assertGreaterEqual(3, time.time() - start_time)
+            self.assertEqual(ap.info()['metrics']['executed'], 13)
+
+            self.assertEqual(ap.reset_metrics().executed, 13)
+            self.assertEqual(ap.info()['metrics']['executed'], 0)
+            ap.run_method(max, 1, 2)
+            self.assertEqual(ap.info()['metrics']['execution']['count'], 1)
+        finally:
+            ap.dispose()
+
+        queue = PriorityTaskQueue(worker_limit=2)
+        try:
+            for _ in range(5):
+                queue.run_method(time.sleep, 0.01)
+            queue.run_method(raise_exception)
+            start_time = time.time()
+            while queue.info()['metrics']['executed'] < 6:
+                self.assertGreaterEqual(3, time.time() - start_time)
+            self.assertEqual(queue.info()['metrics']['exceptions'], 1)
+            self.assertGreaterEqual(queue.info()['metrics']['execution']['p99'], 0.01)
+            self.assertEqual(queue.reset_metrics().executed, 6)
+            self.assertEqual(queue.info()['metrics']['executed'], 0)
+        finally:
+            queue.dispose()
+
+    def test_reservation(self):
+        """test the reserved worker is bound when pool is full, and the waiters are served in FIFO order"""
+        from ..util import AsyncWorkerPool
+        loop = asyncio.get_event_loop()
+
+        def get_thread_name():
+            return current_thread().name
+
+        ap = AsyncWorkerPool(worker_limit=2, min_workers=2)
+        try:
+            ap.run_method(time.sleep, 0)  # spawn workers then the pool is full
+            ap.run_method(time.sleep, 0)
+            self.assertEqual(ap.info()['size'], 2)
+            with ap.reserve_worker() as identity:
+                reserved = ap.run_method(get_thread_name, identity=identity)
+                for _ in range(10):
+                    self.assertEqual(ap.run_method(get_thread_name, identity=identity), reserved)
+                    self.assertNotEqual(ap.run_method(get_thread_name), reserved)
+                self.assertEqual(ap.info()['reserved'], 1)
+            self.assertEqual(ap.info()['reserved'], 0)
+
+            order = []
+
+            async def reserve(index, hold):
+                async with ap.reserve_worker_async() as identity:
+                    order.append(index)
+                    await asyncio.sleep(hold)
+                    return await ap.run_method_async(get_thread_name, identity=identity)
+
+            async def run():
+                holders = [asyncio.ensure_future(reserve(i, 0.05)) for i in range(2)]
+                await asyncio.sleep(0.01)
+                waiters = [asyncio.ensure_future(reserve(i, 0)) for i in range(2, 6)]
+                cancelled = asyncio.ensure_future(reserve(-1, 0))
+                await asyncio.sleep(0.01)
+                self.assertEqual(ap.info()['reservation_waiting'], 5)
+                cancelled.cancel()
+                await asyncio.gather(*holders, *waiters)
+                with self.assertRaises(asyncio.CancelledError):
+                    await cancelled
+
+            loop.run_until_complete(run())
+            self.assertEqual(order, list(range(6)))
+            self.assertEqual(ap.info()['reserved'], 0)
+            self.assertEqual(ap.info()['reservation_waiting'], 0)
+            self.assertEqual(ap.info()['size'], 2)
+        finally:
+            ap.dispose()
+
+    def test_broadcast(self):
+        """test broadcast runs after the queued functions, concurrently on all workers and times out"""
+        from ..util import AsyncWorkerPool, TaskTimeoutException
+        loop = asyncio.get_event_loop()
+
+        class SlowWorker(FunctionQueueWorker):
+            def slow(self, seconds):
+                time.sleep(seconds)
+                return self.name
+
+        class SlowPool(AsyncWorkerPool):
+            def _create_worker(self, name):
+                return SlowWorker(name=name)
+
+        worker_count = 4
+        ap = SlowPool(worker_limit=worker_count, min_workers=worker_count)
+        try:
+            for _ in range(worker_count):
+                ap.run_method(time.sleep, 0)
+            self.assertEqual(len(ap.workers), worker_count)
+            names = [w.name for w in ap.workers]
+            executed = []
+
+            ap.submit(time.sleep, 0.05)
+            ap.submit(executed.append, 1)
+            start_time = time.time()
+            self.assertEqual(ap.broadcast_method('slow', 0.1), names)
+            self.assertEqual(executed, [1])  # drained before the broadcast
+            self.assertLess(time.time() - start_time, 0.1 * worker_count)
+            self.assertEqual(ap.broadcast_method('not_exist'), [])
+
+            async def run():
+                start_time = time.time()
+                self.assertEqual(await ap.broadcast_method_async('slow', 0.1), names)
+                self.assertLess(time.time() - start_time, 0.1 * worker_count)
+
+                with self.assertRaises(TaskTimeoutException):
+                    await ap.broadcast_method_async('slow', 0.2, timeout=0.05)
+            loop.run_until_complete(run())
+
+            with self.assertRaises(TaskTimeoutException):
+                ap.broadcast_method('slow', 0.2, timeout=0.05)
+            self.assertEqual(ap.info()['timed_out'], 2)
+        finally:
+            ap.dispose()
+
+    def test_iterate(self):
+        """test iterate_async() streams the items with bounded buffer, raises the exception and closes the generator"""
+        from ..util import AsyncWorkerPool
+        loop = asyncio.get_event_loop()
+        ap = AsyncWorkerPool(worker_limit=2)
+        progress = {'produced': 0, 'finished': False}
+        closed = Event()
+
+        def rows(count, fail_at=None):
+            try:
+                for i in range(count):
+                    if i == fail_at:
+                        raise Exception('This is from rows()')
+                    progress['produced'] = i + 1
+                    yield i
+                progress['finished'] = True
+            finally:
+                progress['thread'] = current_thread().name
+                closed.set()
+
+        async def run():
+            buffer = 8
+            results = []
+            async for item in ap.iterate_async(rows, 10000, buffer=buffer):
+                if not results:
+                    self.assertFalse(progress['finished'])  # the first item arrives early
+                self.assertLessEqual(progress['produced'] - len(results), buffer + 1)
+                results.append(item)
+            self.assertEqual(results, list(range(10000)))
+
+            results = []
+            with self.assertRaises(Exception):
+                async for item in ap.iterate_async(rows, 100, fail_at=50):
+                    results.append(item)
+            self.assertEqual(results, list(range(50)))
+
+            closed.clear()
+            stream = ap.iterate_async(rows, 10000, buffer=4)
+            async for item in stream:
+                if item == 10:
+                    break
+            await stream.aclose()
+            self.assertTrue(closed.wait(3))
+            self.assertNotEqual(progress['thread'], current_thread().name)
+            self.assertLess(progress['produced'], 100)
+
+        try:
+            loop.run_until_complete(run())
+            start_time = time.time()
+            while ap.info()['workers'][0]['pending_task'] > 0:
+                self.assertGreaterEqual(3, time.time() - start_time)
+        finally:
+            ap.dispose()
+
+    def test_single_flight(self):
+        """test the concurrent calls with the same dedupe_key share one execution, its result and exception"""
+        from ..util import AsyncWorkerPool, TaskTimeoutException
+        from concurrent.futures import ThreadPoolExecutor
+        loop = asyncio.get_event_loop()
+        ap = AsyncWorkerPool(worker_limit=4)
+        calls = []
+        release = Event()
+
+        def load(name):
+            calls.append(name)
+            release.wait(3)
+            if name == 'bad':
+                raise Exception('This is from load()')
+            return {'name': name}
+
+        async def run():
+            release.clear()
+            futures = [asyncio.ensure_future(ap.run_method_async(load, 'report', dedupe_key='report'))
+                       for _ in range(10)]
+            other = asyncio.ensure_future(ap.run_method_async(load, 'config', dedupe_key='config'))
+            await asyncio.sleep(0.05)
+            self.assertEqual(ap.info()['dedupe_in_flight'], 2)
+            release.set()
+            results = await asyncio.gather(*futures)
+            self.assertEqual((await other)['name'], 'config')
+            self.assertTrue(all(r is results[0] for r in results))
+            self.assertEqual(sorted(calls), ['config', 'report'])
+
+            release.clear()
+            futures = [asyncio.ensure_future(ap.run_method_async(load, 'bad', dedupe_key='bad'))
+                       for _ in range(3)]
+            await asyncio.sleep(0.05)
+            release.set()
+            for result in await asyncio.gather(*futures, return_exceptions=True):
+                self.assertEqual(str(result), 'This is from load()')
+
+            # the follower stops waiting, the leader still gets the result
+            release.clear()
+            leader = asyncio.ensure_future(ap.run_method_async(load, 'late', dedupe_key='late'))
+            await asyncio.sleep(0.05)
+            with self.assertRaises(TaskTimeoutException):
+                await ap.run_method_async(load, 'late', dedupe_key='late', timeout=0.05)
+            release.set()
+            self.assertEqual((await leader)['name'], 'late')
+
+        try:
+            loop.run_until_complete(run())
+            self.assertEqual(calls.count('report'), 1)
+            self.assertEqual(calls.count('bad'), 1)
+            self.assertEqual(calls.count('late'), 1)
+            self.assertEqual(ap.info()['dedupe_hits'], 9 + 2 + 1)
+            self.assertEqual(ap.info()['dedupe_in_flight'], 0)
+
+            # the completed key executes again
+            release.clear()
+            with ThreadPoolExecutor(max_workers=5) as threads:
+                futures = [threads.submit(ap.run_method, load, 'sync', dedupe_key='sync') for _ in range(5)]
+                time.sleep(0.05)
+                release.set()
+                self.assertEqual(len(set(id(f.result()) for f in futures)), 1)
+            self.assertEqual(calls.count('sync'), 1)
+            self.assertEqual(ap.run_method(load, 'sync', dedupe_key='sync')['name'], 'sync')
+            self.assertEqual(calls.count('sync'), 2)
+        finally:
+            ap.dispose()
+
+    def test_coroutine_pool(self):
+        """test coroutine functions run concurrently in worker loops with the per worker resource"""
+        from ..util import CoroutineWorkerPool, TaskTimeoutException
+        loop = asyncio.get_event_loop()
+        created = []
+        disposed = []
+
+        async def create_session():
+            await asyncio.sleep(0.01)
+            created.append(current_thread().name)
+            return {'thread': current_thread().name, 'loop': asyncio.get_event_loop()}
+
+        async def close_session(session):
+            disposed.append(session['thread'])
+
+        async def fetch(session, index, delay=0.1):
+            self.assertIs(session['loop'], asyncio.get_event_loop())
+            self.assertEqual(session['thread'], current_thread().name)
+            await asyncio.sleep(delay)
+            return index
+
+        async def fail(session):
+            raise Exception('This is from fail()')
+
+        cp = CoroutineWorkerPool(worker_limit=2, resource_factory=create_session, resource_dispose=close_session)
+        try:
+            async def run():
+                start_time = time.time()
+                results = await cp.map_async(fetch, range(100))
+                self.assertEqual(results, list(range(100)))
+                self.assertLess(time.time() - start_time, 1)  # concurrent in the worker loops
+
+                with self.assertRaises(Exception) as ctx:
+                    await cp.run_method_async(fail)
+                self.assertEqual(str(ctx.exception), 'This is from fail()')
+
+                with self.assertRaises(TaskTimeoutException):
+                    await cp.run_method_async(fetch, 0, delay=1, timeout=0.05)
+
+            loop.run_until_complete(run())
+            self.assertEqual(cp.run_method(fetch, 1, delay=0), 1)
+            with self.assertRaises(TaskTimeoutException):
+                cp.run_method(fetch, 0, delay=1, timeout=0.05)
+
+            info = cp.info()
+            self.assertEqual(info['size'], 2)
+            self.assertEqual(info['timed_out'], 2)
+            self.assertEqual(info['metrics']['exceptions'], 1)
+            self.assertEqual(sorted(created), sorted(w.name for w in cp.workers))  # created once per worker
+        finally:
+            cp.dispose()
+        self.assertEqual(sorted(disposed), sorted(created))
+
+        cp = CoroutineWorkerPool(worker_limit=1, max_concurrency=2)
+        try:
+            running = []
+
+            async def track():
+                running.append(1)
+                peak = len(running)
+                await asyncio.sleep(0.05)
+                running.pop()
+                return peak
+
+            self.assertLessEqual(max(loop.run_until_complete(
+                cp.gather_async([track] * 6))), 2)
+        finally:
+            cp.dispose()
+
+    def test_durable_queue(self):
+        """test the durable tasks are committed in batch, replayed after restart and acknowledged when done"""
+        import tempfile
+        from ..util import DurableTaskQueue, LocalizedMessageException, QueueFullException
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'tasks.db')
+            executed = []
+            release = Event()
+
+            def audit(index, blocking=False):
+                if blocking:
+                    release.wait(3)
+                executed.append(index)
+
+            queue = DurableTaskQueue(path)
+            self.assertEqual(queue.register_task('audit', audit), 0)
+            with self.assertRaises(LocalizedMessageException):
+                queue.run_task('not_registered')
+            with self.assertRaises(LocalizedMessageException):
+                queue.run_task('audit', lambda: None)
+
+            queue.run_task('audit', 0, blocking=True)
+            for i in range(1, 200):
+                queue.run_task('audit', i)
+            self.assertTrue(queue.flush(3))
+            self.assertLess(queue.info()['durable']['commits'], 200)  # group commit
+
+            # simulate crash: the file is copied while the tasks are blocked
+            crashed_path = os.path.join(tmp_dir, 'crashed.db')
+            import sqlite3
+            with sqlite3.connect(path) as source, sqlite3.connect(crashed_path) as target:
+                source.backup(target)
+            release.set()
+            queue.dispose()
+            self.assertEqual(executed, list(range(200)))
+
+            # the completed tasks are acknowledged
+            queue = DurableTaskQueue(path)
+            self.assertEqual(queue.register_task('audit', audit), 0)
+            queue.dispose()
+
+            executed.clear()
+            queue = DurableTaskQueue(crashed_path)
+            self.assertEqual(queue.info()['durable']['recovered'], {'audit': 200})
+            self.assertEqual(queue.register_task('audit', audit), 200)
+            queue.run_task('audit', 200)
+            queue.dispose()
+            self.assertEqual(executed, list(range(201)))
+
+            queue = DurableTaskQueue(crashed_path)
+            self.assertEqual(queue.register_task('audit', audit), 0)
+            queue.dispose()
+
+            # the rejected task is not replayed after restart
+            rejected_path = os.path.join(tmp_dir, 'rejected.db')
+            started = Event()
+            release.clear()
+            executed.clear()
+
+            def hold(index):
+                if index == 0:
+                    started.set()
+                    release.wait(3)
+                executed.append(index)
+
+            queue = DurableTaskQueue(rejected_path, max_pending=1, backpressure='reject')
+            queue.register_task('hold', hold)
+            queue.run_task('hold', 0)
+            self.assertTrue(started.wait(3))
+            queue.run_task('hold', 1)
+            with self.assertRaises(QueueFullException):
+                queue.run_task('hold', 2)
+            release.set()
+            queue.dispose()
+            self.assertEqual(executed, [0, 1])
+
+            queue = DurableTaskQueue(rejected_path)
+            self.assertEqual(queue.register_task('hold', hold), 0)
+            queue.dispose()
+
+    def test_resource_pool(self):
+        """test each worker creates its resource once, refreshes and disposes it, and replaces the broken one"""
+        from ..util import AsyncWorkerPool
+        loop = asyncio.get_event_loop()
+        created = []
+        disposed = []
+
+        class Client():
+            def __init__(self):
+                self.thread = current_thread().name
+                self.broken = False
+                created.append(self)
+
+        def query(client, index):
+            self.assertEqual(client.thread, current_thread().name)
+            return client, index
+
+        ap = AsyncWorkerPool(worker_limit=2, min_workers=2, resource_factory=Client,
+                             resource_dispose=disposed.append, health_check=lambda c: not c.broken)
+        try:
+            for i in range(10):
+                client, index = ap.run_method(query, i)
+                self.assertEqual(index, i)
+
+            results = loop.run_until_complete(ap.map_async(query, range(100), chunksize=10))
+            self.assertEqual([index for _, index in results], list(range(100)))
+            self.assertLessEqual(len(created), 2)
+            self.assertEqual(disposed, [])
+
+            ap.run_method(query, 0)
+            while len(created) < 2:  # the other worker
+                loop.run_until_complete(ap.gather_async([(query, i) for i in range(4)], chunksize=1))
+            self.assertEqual(ap.check_resources(), [True, True])
+
+            created[0].broken = True
+            self.assertEqual(sorted(loop.run_until_complete(ap.check_resources_async())), [False, True])
+            self.assertEqual(disposed, [created[0]])
+
+            ap.refresh_resources()
+            self.assertEqual(len(disposed), 2)
+            self.assertIs(disposed[-1], created[1])
+            self.assertEqual(ap.check_resources(), [True, True])  # not created yet
+
+            client, _ = ap.run_method(query, 0)
+            self.assertEqual(len(created), 3)
+        finally:
+            ap.dispose()
+            for w in ap.workers:
+                w.join()
+        self.assertIs(disposed[-1], client)
+
+    def test_adaptive_limit(self):
+        """test AdaptiveLimit probes upward when healthy and backs off when the execution time rises"""
+        from ..util import AsyncWorkerPool, AdaptiveLimit
+        from threading import Lock
+        loop = asyncio.get_event_loop()
+
+        limit = AdaptiveLimit(initial_limit=4, window=4)
+        limit.set_range(8)
+        self.assertEqual((limit.min_limit, limit.max_limit, limit.limit), (1, 8, 4))
+        for _ in range(3):
+            self.assertFalse(limit.record(0.01, True))
+        self.assertTrue(limit.record(0.01, True))  # the window covers limit functions
+        self.assertEqual((limit.limit, limit.last_decision), (5, 'increase'))
+        for _ in range(5):
+            limit.record(0.01, False)
+        self.assertEqual((limit.limit, limit.last_decision), (5, 'hold'))
+        for _ in range(5):
+            limit.record(0.05, True)
+        self.assertEqual((limit.limit, limit.last_decision), (4, 'decrease'))
+
+        # the execution time grows with the concurrent executions like an overloaded database
+        lock = Lock()
+        running = [0]
+
+        def query():
+            with lock:
+                running[0] += 1
+                concurrency = running[0]
+            time.sleep(0.001 * concurrency * concurrency)
+            with lock:
+                running[0] -= 1
+
+        ap = AsyncWorkerPool(worker_limit=8, adaptive_limit={'window': 5})
+        try:
+            loop.run_until_complete(asyncio.gather(*[ap.run_method_async(query) for _ in range(300)]))
+            info = ap.info()['adaptive_limit']
+            self.assertEqual(info['max_limit'], 8)
+            self.assertGreater(info['increases'], 0)
+            self.assertGreater(info['decreases'], 0)
+            self.assertLess(info['limit'], 8)
+            self.assertEqual(ap.info()['max_pending'], info['limit'])
+        finally:
+            ap.dispose()
@@ -25,14 +25,25 @@ root_setting = {'name': 'hostray UT Server Config',
 component_setting = {
     'localization': {'dir': None},
     'logger': {'dir': 'files/logs', 'log_to_resource': False},
-    'worker_pool': {'default': 2},
-    'task_queue': {'worker_count': 3},
+    'worker_pool': {'default': 2, 'stealing': {'workers': 2, 'work_stealing': True, 'default_executor': True},
+                    'elastic': {'min_workers': 1, 'max_workers': 2, 'idle_timeout': 30},
+                    'cpu': {'type': 'process', 'workers': 1},
+                    'bounded': {'workers': 2, 'max_pending': 100, 'backpressure': 'reject'},
+                    'aio': {'type': 'coroutine', 'workers': 1, 'max_concurrency': 10},
+                    'adaptive': {'workers': 2, 'adaptive_limit': {'min_limit': 1, 'window': 5}}},
+    'task_queue': {'worker_count': 3, 'max_pending': 1000, 'backpressure': 'caller_runs'},
     'memory_cache': {'sess_lifetime': 600},
     'orm_db': {
         'db_0': {
             'module': 'sqlite_memory',
             'worker': 1,
-            'connection_refresh': 60
+            'connection_refresh': 60,
+            'pool_pre_ping': True
+        },
+        'db_1': {
+            'module': 'sqlite_memory',
+            'worker': 1,
+            'async': True
         }
     },
     'services':
@@ -67,6 +78,18 @@ component_setting = {
                 'put': ['name', 'age', 'gender'],
                 'patch': ['id', 'note', 'schedule'],
                 'delete': ['id']
+            },
+            '/test_orm_custom_get': {
+                'name': 'test_orm_custom_get',
+                'get': None
+            },
+            '/test_orm_async': {
+                'name': 'test_orm_async',
+                'get': None,
+                'post': ['id', 'name', 'age', 'gender'],
+                'put': ['name', 'age', 'gender'],
+                'patch': ['id', 'note', 'schedule'],
+                'delete': ['id']
             }
 
         }
@@ -82,6 +105,18 @@ controller_setting = {
                 'use_orm_db': 'db_0'
         }
     },
+    '/test_orm_custom_get': {
+        'enum': 'test_orm_custom_get',
+        'params': {
+                'use_orm_db': 'db_0'
+        }
+    },
+    '/test_orm_async': {
+        'enum': 'test_orm_async',
+        'params': {
+                'use_orm_db': 'db_1'
+        }
+    },
     '/test_download': {
         'enum': 'test_download'
     },
@@ -124,6 +159,13 @@ class WebTestCase(UnitTestCase):
         self.assertEqual(config.get_parameter(
             'orm_db.db_0.module'), 'sqlite_memory')
 
+        from ..web import HostrayWebException
+        from ..web.config_validator import WorkerPoolSetting
+        with self.assertRaises(HostrayWebException):
+            WorkerPoolSetting({'workers': 2, 'adaptive_limit': {'limit': 2}})
+        with self.assertRaises(HostrayWebException):
+            WorkerPoolSetting({'workers': 2, 'adaptive_limit': 'fast'})
+
         HostrayWebConfigControllerValidator(controller_setting)
         HostrayWebConfigRootValidator(root_setting)
 
@@ -272,42 +314,114 @@ class WebTestCase(UnitTestCase):
                 response = service.invoke('test_api')
                 self.assertEqual(response.status_code, 200)
 
-                # test orm
-                response = service.invoke('test_orm', 'get', id=3)
-                self.assertEqual(response.status_code, 200)
-                self.assertEqual(response.text, '')
+                # test orm, the async db requires sqlalchemy>=1.4 and aiosqlite
+                orm_services = ['test_orm']
+                try:
+                    import aiosqlite
+                    from sqlalchemy.ext.asyncio import AsyncSession
+                    orm_services.append('test_orm_async')
+                except ImportError:
+                    pass
 
-                response = service.invoke(
-                    'test_orm', 'post', id=3, name='someone', age=22, gender='male')
-                self.assertEqual(response.status_code, 200)
+                for orm_service in orm_services:
+                    response = service.invoke(orm_service, 'get', id=3)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.text, '')
 
-                response = service.invoke(
-                    'test_orm', 'put', name='someone', age=22, gender='males')
-                self.assertEqual(response.status_code, 200)
+                    response = service.invoke(
+                        orm_service, 'post', id=3, name='someone', age=22, gender='male')
+                    self.assertEqual(response.status_code, 200)
 
-                response = service.invoke(
-                    'test_orm', 'patch', id=3, note='this is note', schedule='2019-11-05 15:06:41.606609')
-                self.assertEqual(response.status_code, 200)
-                self.assertEqual(
-                    response.text, 'This page is expired, please refresh pages')
+                    response = service.invoke(
+                        orm_service, 'put', name='someone', age=22, gender='males')
+                    self.assertEqual(response.status_code, 200)
 
-                response = service.invoke('test_orm', 'get', id=3)
-                self.assertEqual(response.status_code, 200)
-                self.assertNotEqual(response.text, '')
+                    response = service.invoke(
+                        orm_service, 'patch', id=3, note='this is note', schedule='2019-11-05 15:06:41.606609')
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(
+                        response.text, 'This page is expired, please refresh pages')
 
-                response = service.invoke('test_orm', 'patch', cookies=response.cookies,
-                                          id=3, note='this is note', schedule='2019-11-05 15:06:41.606609')
-                self.assertEqual(response.status_code, 200)
-                self.assertNotEqual(
-                    response.text, 'This page is expired, please refresh pages')
+                    response = service.invoke(orm_service, 'get', id=3)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertNotEqual(response.text, '')
 
-                response = service.invoke(
-                    'test_orm', 'delete', cookies=response.cookies, id=3)
-                self.assertEqual(response.status_code, 200)
+                    response = service.invoke(orm_service, 'patch', cookies=response.cookies,
+                                              id=3, note='this is note', schedule='2019-11-05 15:06:41.606609')
+                    self.assertEqual(response.status_code, 200)
+                    self.assertNotEqual(
+                        response.text, 'This page is expired, please refresh pages')
 
-                response = service.invoke('test_orm', 'get', id=3)
-                self.assertEqual(response.status_code, 200)
-                self.assertEqual(response.text, '')
+                    response = service.invoke(
+                        orm_service, 'delete', cookies=response.cookies, id=3)
+                    self.assertEqual(response.status_code, 200)
+
+                    response = service.invoke(orm_service, 'get', id=3)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.text, '')
+
+                    # bulk rows of JSON array
+                    response = service.invoke(orm_service, 'post', json=[
+                        {'id': 10, 'name': 'bulk', 'age': 20, 'gender': 'male'},
+                        {'id': 11, 'name': 'bulk', 'age': 21, 'gender': 'female'}])
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(
+                        response.text, '2 rows added, 0 rows updated, 0 rows deleted')
+
+                    response = service.invoke(orm_service, 'put', json=[
+                        {'id': 11, 'age': 31},
+                        {'id': 12, 'name': 'bulk', 'age': 32, 'gender': 'male'}])
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(
+                        response.text, '1 rows added, 1 rows updated, 0 rows deleted')
+
+                    # keyset pages and streaming
+                    response = service.invoke(
+                        orm_service, 'get', name='bulk', limit=2)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.headers['Next-After'], '11')
+
+                    response = service.invoke(
+                        orm_service, 'get', name='bulk', limit=2, after=response.headers['Next-After'])
+                    self.assertEqual(response.status_code, 200)
+                    self.assertFalse('Next-After' in response.headers)
+                    self.assertEqual(response.json()['id'], 12)
+
+                    response = service.invoke(
+                        orm_service, 'get', name='bulk', after=10, stream='true')
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual([r['id'] for r in response.json()], [11, 12])
+
+                    if orm_service == 'test_orm':  # the customized GET method gets limit
+                        response = service.invoke(
+                            'test_orm_custom_get', 'get', name='bulk', limit=1)
+                        self.assertEqual(response.status_code, 200)
+                        self.assertFalse('Next-After' in response.headers)
+                        self.assertEqual(response.json()['id'], 10)
+
+                    response = service.invoke(
+                        orm_service, 'get', limit='many')
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(
+                        response.text, "many is not the object of <class 'int'>")
+
+                    # single row of JSON request is not bulk
+                    response = service.invoke(orm_service, 'post', json={'id': 13},
+                                              params={'id': 13, 'name': 'bulk', 'age': 23, 'gender': 'male'})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.text, 'data has been added')
+
+                    response = service.invoke(
+                        orm_service, 'post', json=[13])
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(
+                        response.text, 'request body is not a JSON array of objects')
+
+                    response = service.invoke(orm_service, 'delete', json=[
+                        {'id': 10}, {'id': 11}, {'id': 12}, {'id': 13}])
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(
+                        response.text, '0 rows added, 0 rows updated, 4 rows deleted')
 
                 # test bytes upload
                 from ..web.client import StreamUploadClient
@@ -42,6 +42,12 @@ LocalCode_Missing_DB_Name: int = 54                     # args: ()
 LocalCode_Not_Allow_Update: int = 55                    # args: (str)
 LocalCode_Must_Be_Type: int = 56                        # args: (str, Type)
 LocalCode_Invalid_Column: int = 57                      # args: (str)
+LocalCode_Async_Orm_Not_Supported: int = 58             # args: (Exception)
+
+LocalCode_Not_Picklable: int = 60                       # args: (Callable, Exception)
+LocalCode_Queue_Full: int = 61                          # args: (str, int)
+LocalCode_Task_Timeout: int = 62                        # args: (Callable, float)
+LocalCode_Task_Not_Registered: int = 63                 # args: (str)
 
 LocalCode_Not_HierarchyElementMeta_Subclass = 90        # args: (str)
 LocalCode_No_Parameters = 91                            # args: (type)
@@ -52,11 +52,11 @@ class HostrayLogger(logging.Logger):
             self.removeHandler(self.__file_handler)
             self.__file_handler = None
 
-    def _log(self, level, msg, args, exc_info=None, extra=None, stack_info=False):
-        # need a lock when logging in multi-thread process
+    def _log(self, level, msg, args, exc_info=None, extra=None, stack_info=False, **kwargs):
+        # need a lock when logging in multi-thread process, kwargs such as stacklevel of python 3.8
         try:
             self.lock.acquire()
-            super()._log(level, msg, args, exc_info=exc_info, extra=extra, stack_info=stack_info)
+            super()._log(level, msg, args, exc_info=exc_info, extra=extra, stack_info=stack_info, **kwargs)
         finally:
             self.lock.release()
 
@@ -59,9 +59,24 @@ This module wraps "SQLAlchemy (https://www.sqlalchemy.org/)" to provide simplifi
             pool.run_method(accessor.save, identity=identity)
             pool.run_method(accessor.refresh, entity, identity=identity)
 
+    # Usage with AsyncOrmDB in event loop, requires sqlalchemy>=1.4 and aiosqlite or aiomysql
+
+        from hostray.util.orm import AsyncOrmDB, AsyncOrmDBEntityAccessor
+
+        class AsyncTestAccessor(AsyncOrmDBEntityAccessor):
+            def __init__(self):
+                super().__init__(TestEntity)
+
+        db = AsyncOrmDB(DB_MODULE_NAME.SQLITE_MEMORY, DeclarativeBase)
+        async with db.session() as sess:
+            entity = await accessor.add(sess, name='someone', age=30, gender='male', secret='my secret')
+            await accessor.save(sess)
+            await accessor.refresh(sess, entity)
+
 
 Last Updated:  Monday, 4th November 2019 by hsky77 (howardlkung@gmail.com)
 '''
 
-from .access_executor_pool import OrmAccessWorkerPool, DB_MODULE_NAME, get_session_maker
+from .access_executor_pool import OrmAccessWorkerPool, DB_MODULE_NAME, get_session_maker, get_engine_args
 from .entity import get_declarative_base, EntityBaseAddon, OrmDBEntityAccessor, DeclarativeMeta, Entity
+from .async_accessor import AsyncOrmDB, AsyncOrmDBEntityAccessor, get_async_connection_string
@@ -11,9 +11,12 @@ Last Updated:  Monday, 4th November 2019 by hsky77 (howardlkung@gmail.com)
 import time
 import asyncio
 from enum import Enum
-from typing import Any, Callable
+from threading import Lock
+from contextlib import contextmanager
+from typing import Any, Callable, Dict
 
 from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.declarative import DeclarativeMeta
 
@@ -63,9 +66,34 @@ def get_connection_string(db_module: DB_MODULE_NAME, **kwargs) -> str:
     return connect_string
 
 
+def get_engine_args(db_module: DB_MODULE_NAME, pool_size: int = None, max_overflow: int = None, pool_timeout: float = None,
+                    pool_recycle: int = None, pool_pre_ping: bool = False, **kwargs) -> Dict:
+    """
+    return the connection pool arguments of create_engine()
+
+    pool_size, max_overflow and pool_timeout only apply to the queue pool of module mysql,
+    sqlite uses the single connection pool of sqlalchemy
+    """
+    engine_args = {}
+    if pool_pre_ping:
+        engine_args['pool_pre_ping'] = True
+    if pool_recycle is not None:
+        engine_args['pool_recycle'] = pool_recycle
+
+    if db_module == DB_MODULE_NAME.MYSQL:
+        for k, v in (('pool_size', pool_size), ('max_overflow', max_overflow), ('pool_timeout', pool_timeout)):
+            if v is not None:
+                engine_args[k] = v
+    return engine_args
+
+
 def get_session_maker(db_module: DB_MODULE_NAME, declared_entity_base: DeclarativeMeta, autoflush: bool = False, **kwargs) -> Session:
     connect_args = {}
-    engine_args = {}
+    engine_args = get_engine_args(db_module, **kwargs)
+    if db_module == DB_MODULE_NAME.SQLITE_MEMORY:  # the threads share one connection, otherwise each of them has its own database
+        connect_args['check_same_thread'] = False
+        engine_args['poolclass'] = StaticPool
+
     engine = create_engine(get_connection_string(db_module, **kwargs),
                            connect_args=connect_args, **engine_args)
     declared_entity_base.metadata.create_all(engine)
@@ -73,47 +101,46 @@ def get_session_maker(db_module: DB_MODULE_NAME, declared_entity_base: Declarati
 
 
 class _OrmAccessWorker(FunctionQueueWorker):
-    """worker class keeps the session and connection to execute orm entity object or SQLs"""
+    """worker class keeps the session to execute orm entity object or SQLs, the session is made by the session maker of pool"""
 
-    def __init__(self, name: str = None):
-        super().__init__()
+    def __init__(self, name: str = None, session_maker: Callable[[], sessionmaker] = None):
         super().__init__(name=name)
-        self.__sess_maker = None
+        self.__get_session_maker = session_maker
         self.__sess = None
 
-    def set_orm_engine(self, db_module: DB_MODULE_NAME, declared_entity_base: DeclarativeMeta, autoflush: bool = False, **kwargs) -> None:
-        with self.resource_lock:
-            self.__sess_maker = None
-            self.db_module = db_module
-            self.declared_entity_base = declared_entity_base
-            self.autoflush = autoflush
-            self.db_kwargs = kwargs
-
     def close_session(self, *args, **kwargs) -> None:
         """this function should also be called by worker thread"""
         if self.__sess is not None:
             self.__sess.close()
         self.__sess = None
 
-        if self.__sess_maker is not None:
-            self.__sess_maker.close_all()
+    def run(self) -> None:
+        """do not directly call this function, it will be called by thread automatically"""
+        try:
+            super().run()
+        finally:  # return the connection of retired worker to the pool of engine
+            self.close_session()
 
     def _execute_function(self, func: Callable, *args, **kwargs) -> Any:
         if self.__sess is None:
-            with self.resource_lock:
-                if self.__sess_maker is None:
-                    self.__sess_maker = get_session_maker(
-                        self.db_module, self.declared_entity_base, self.autoflush, **self.db_kwargs)
-
-                self.__sess = self.__sess_maker()
+            self.__sess = self.__get_session_maker()()
         return func(self.__sess, *args, **kwargs)
 
 
 class OrmAccessWorkerPool(AsyncWorkerPool):
-    """orm db executor worker pool"""
+    """
+    orm db executor worker pool, kwargs are the parameters of WorkerPool such as adaptive_limit
 
-    def __init__(self, pool_name: str = None, worker_limit: int = 1):
-        super().__init__(pool_name, worker_limit)
+    the workers share one engine and its connection pool, the engine and schema are created when the first function runs
+
+    the memory database of sqlite_memory lives in one connection, the sessions on it are not isolated,
+    so the pool has only one worker for it and the sessions are serialized
+    """
+
+    def __init__(self, pool_name: str = None, worker_limit: int = 1, **kwargs):
+        self.__engine_lock = Lock()
+        self.__session_maker = None
+        super().__init__(pool_name, worker_limit, **kwargs)
         self.enable_orm_log(False)
 
     def enable_orm_log(self, echo: bool = False) -> None:
@@ -122,37 +149,75 @@ class OrmAccessWorkerPool(AsyncWorkerPool):
         sqla_logger.propagate = echo
 
     def set_session_maker(self, db_module: DB_MODULE_NAME, declared_entity_base: DeclarativeMeta, autoflush: bool = False, **kwargs) -> None:
-        self.db_module = db_module
-        self.declared_entity_base = declared_entity_base
-        self.autoflush = autoflush
-        self.db_kwargs = kwargs
+        """set the parameters of engine, the engine created by the previous parameters is disposed after the sessions are closed"""
+        if self.__session_maker is not None:
+            self.reset_connection()
 
-        for w in self.workers:
-            w.set_orm_engine(db_module, declared_entity_base,
-                             autoflush, **kwargs)
+        if db_module == DB_MODULE_NAME.SQLITE_MEMORY:
+            self._set_worker_limit(1)
+
+        with self.__engine_lock:
+            self.db_module = db_module
+            self.declared_entity_base = declared_entity_base
+            self.autoflush = autoflush
+            self.db_kwargs = kwargs
+            session_maker, self.__session_maker = self.__session_maker, None
+
+        if session_maker is not None:
+            session_maker.kw['bind'].dispose()
+
+    def get_session_maker(self) -> sessionmaker:
+        """return the session maker shared by workers, the engine is created and the schema is created once"""
+        with self.__engine_lock:
+            if self.__session_maker is None:
+                self.__session_maker = get_session_maker(
+                    self.db_module, self.declared_entity_base, self.autoflush, **self.db_kwargs)
+            return self.__session_maker
 
     def dispose(self) -> None:
         self.reset_connection()
         super().dispose()
+        with self.__engine_lock:
+            session_maker, self.__session_maker = self.__session_maker, None
+        if session_maker is not None:
+            session_maker.kw['bind'].dispose()
 
-    def reset_connection(self) -> None:
-        """
-        reset db worker sessions and connection
-
-        attention: do not call this function in the clauses of 'with reserve_worker()' and 'with reserve_worker_async()'
+    def reset_connection(self, timeout: float = None, dispose_engine: bool = False) -> None:
         """
-        self.broadcast_method('close_session')
+        close db worker sessions and return their connections to the engine, the workers reset concurrently after their queued functions
 
-    async def reset_connection_async(self) -> None:
-        """
-        reset db worker sessions and connection
+        dispose_engine: also replace all the connections of engine shared by workers
 
         attention: do not call this function in the clauses of 'with reserve_worker()' and 'with reserve_worker_async()'
         """
-        await self.broadcast_method_async('close_session')
+        self.broadcast_method('close_session', timeout=timeout)
+        if dispose_engine:
+            self._reconnect()
+
+    async def reset_connection_async(self, timeout: float = None, dispose_engine: bool = False) -> None:
+        """the same as reset_connection() but await the workers"""
+        await self.broadcast_method_async('close_session', timeout=timeout)
+        if dispose_engine:
+            self._reconnect()
+
+    def _reconnect(self) -> None:
+        """replace the connections of engine, the memory database of sqlite_memory lives in its only connection"""
+        with self.__engine_lock:
+            if self.__session_maker is not None and not self.db_module == DB_MODULE_NAME.SQLITE_MEMORY:
+                self.__session_maker.kw['bind'].dispose()
+
+    @contextmanager
+    def _caller_context(self):
+        """the caller runs the function with a temporary session, sqlite_memory has no other connection for it"""
+        if self.db_module == DB_MODULE_NAME.SQLITE_MEMORY:
+            with self._lock:
+                self._admission.reject_caller_run()
+
+        sess = self.get_session_maker()()
+        try:
+            yield (sess,)
+        finally:
+            sess.close()
 
     def _create_worker(self, name: str) -> _OrmAccessWorker:
-        worker = _OrmAccessWorker(name=name)
-        worker.set_orm_engine(self.db_module, self.declared_entity_base,
-                              self.autoflush, **self.db_kwargs)
-        return worker
+        return _OrmAccessWorker(name=name, session_maker=self.get_session_maker)
@@ -0,0 +1,202 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+asyncio orm access by the asyncio extension of sqlalchemy, the accessor functions are awaited in the event loop
+instead of being handed off to the threads of OrmAccessWorkerPool
+
+    - AsyncOrmDBEntityAccessor defines the functions of OrmDBEntityAccessor as coroutine functions with AsyncSession
+    - AsyncOrmDB keeps the async engine of one database, sqlite uses aiosqlite and mysql uses aiomysql
+    - sqlalchemy>=1.4 and the driver are imported when the engine is created, the thread pool path does not require them
+'''
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple, Union
+
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.ext.declarative import DeclarativeMeta
+
+from .. import LocalizedMessageException, LocalCode_Async_Orm_Not_Supported, asynccontextmanager
+from .access_executor_pool import DB_MODULE_NAME, get_connection_string, get_engine_args
+from .entity import Entity, OrmDBEntityAccessor, _keyset, _bulk_add, _bulk_merge, _bulk_delete
+
+
+def get_async_connection_string(db_module: DB_MODULE_NAME, **kwargs) -> str:
+    """return the connection string with the asyncio driver of db_module"""
+    connect_string = get_connection_string(db_module, **kwargs)
+    if db_module == DB_MODULE_NAME.MYSQL:
+        return connect_string.replace('mysql+pymysql://', 'mysql+aiomysql://', 1)
+    return connect_string.replace('sqlite://', 'sqlite+aiosqlite://', 1)
+
+
+class AsyncOrmDB():
+    """keeps the async engine of one database, the engine and schema are created by the first session"""
+
+    def __init__(self, db_module: DB_MODULE_NAME, declared_entity_base: DeclarativeMeta, autoflush: bool = False, **kwargs):
+        self.db_module = db_module
+        self.declared_entity_base = declared_entity_base
+        self.autoflush = autoflush
+        self.db_kwargs = kwargs
+        self.__session_maker = None
+        self.__engine_lock = None
+
+    async def get_session_maker(self) -> sessionmaker:
+        """return the session maker of AsyncSession"""
+        if self.__session_maker is None:
+            if self.__engine_lock is None:  # bound to the running loop
+                self.__engine_lock = asyncio.Lock()
+
+            async with self.__engine_lock:
+                if self.__session_maker is None:
+                    self.__session_maker = await self._create_session_maker()
+        return self.__session_maker
+
+    @asynccontextmanager
+    async def session(self) -> 'AsyncSession':
+        """yield a new AsyncSession and close it after the clause"""
+        sess = (await self.get_session_maker())()
+        try:
+            yield sess
+        finally:
+            await sess.close()
+
+    async def run_accessor(self, accessor_func: Callable[..., Awaitable], *args, **kwargs) -> Any:
+        """await the function of AsyncOrmDBEntityAccessor with a new session as the first argument"""
+        async with self.session() as sess:
+            return await accessor_func(sess, *args, **kwargs)
+
+    async def reset_connection(self) -> None:
+        """replace the connections of engine, the connection of SQLITE_MEMORY is kept with its database"""
+        if self.__session_maker is not None and not self.db_module == DB_MODULE_NAME.SQLITE_MEMORY:
+            await self.__session_maker.kw['bind'].dispose()
+
+    async def dispose(self) -> None:
+        session_maker, self.__session_maker = self.__session_maker, None
+        if session_maker is not None:
+            await session_maker.kw['bind'].dispose()
+
+    async def _create_session_maker(self) -> sessionmaker:
+        try:
+            from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+            engine_args = get_engine_args(self.db_module, **self.db_kwargs)
+            if self.db_module == DB_MODULE_NAME.SQLITE_MEMORY:  # one memory database for the sessions
+                engine_args['poolclass'] = StaticPool
+            elif self.db_module == DB_MODULE_NAME.SQLITE_FILE:  # keep the connections instead of opening one per session
+                from sqlalchemy.pool import AsyncAdaptedQueuePool
+                engine_args['poolclass'] = AsyncAdaptedQueuePool
+            engine = create_async_engine(get_async_connection_string(
+                self.db_module, **self.db_kwargs), **engine_args)
+        except ImportError as e:
+            raise LocalizedMessageException(
+                LocalCode_Async_Orm_Not_Supported, e) from e
+
+        async with engine.begin() as conn:
+            await conn.run_sync(self.declared_entity_base.metadata.create_all)
+
+        # the entities are read after commit without lazy loading in event loop
+        return sessionmaker(bind=engine, class_=AsyncSession, autoflush=self.autoflush, expire_on_commit=False)
+
+
+class AsyncOrmDBEntityAccessor():
+    """this class defines the functions of OrmDBEntityAccessor as coroutine functions,
+        AsyncSession instance is required as the first argument when defining or overriding functions
+    """
+
+    def __init__(self, entity_cls: Entity = None):
+        super().__init__()
+        if entity_cls is not None:
+            self.set_entity_cls(entity_cls)
+
+    def set_entity_cls(self, entity_cls: Entity) -> None:
+        self.entity_cls = entity_cls
+
+    async def select(self, sess: 'AsyncSession', **kwargs) -> List[Entity]:
+        from sqlalchemy.future import select
+        result = await sess.execute(select(self.entity_cls).filter_by(**kwargs))
+        return result.scalars().all()
+
+    async def select_page(self, sess: 'AsyncSession', limit: int, after: Union[Any, Tuple] = None, **kwargs) -> List[Entity]:
+        from sqlalchemy.future import select
+        result = await sess.execute(_keyset(select(self.entity_cls).filter_by(**kwargs), self.entity_cls, limit, after))
+        return result.scalars().all()
+
+    async def iterate(self, sess: 'AsyncSession', limit: int = None, after: Union[Any, Tuple] = None,
+                      yield_per: int = 1000, **kwargs) -> AsyncIterator[Entity]:
+        """async generator streams the rows by server side cursor"""
+        from sqlalchemy.future import select
+        statement = _keyset(select(self.entity_cls).filter_by(**kwargs), self.entity_cls, limit, after)
+        result = await sess.stream(statement.execution_options(yield_per=yield_per))
+        try:
+            async for entity in result.scalars():
+                yield entity
+        finally:
+            await result.close()
+
+    async def load(self, sess: 'AsyncSession', **kwargs) -> Entity:
+        if len(kwargs) > 0:
+            from sqlalchemy.future import select
+            result = await sess.execute(select(self.entity_cls).filter_by(**kwargs).limit(1))
+            return result.scalars().first()
+
+    async def delete(self, sess: 'AsyncSession', entities, **kwargs) -> None:
+        if not isinstance(entities, list):
+            entities = [entities]
+
+        for entity in entities:
+            await sess.delete(entity)
+
+    async def add(self, sess: 'AsyncSession', **kwargs) -> Entity:
+        entity = self.entity_cls()
+        sess.add(entity)
+        await self.set_attribute(sess, entity, False, **kwargs)
+        return entity
+
+    async def merge(self, sess: 'AsyncSession', **kwargs) -> Entity:
+        pkeys = self.entity_cls.get_primary_key_args(**kwargs)
+        entity = await self.load(sess, **pkeys)
+        if entity is None:
+            entity = await self.add(sess, **kwargs)
+        else:
+            await self.set_attribute(
+                sess, entity, **self.entity_cls.get_non_primary_key_args(**kwargs))
+        return entity
+
+    async def set_attribute(self, sess: 'AsyncSession', entity: Entity, check_fix: bool = True, **kwargs) -> None:
+        OrmDBEntityAccessor.set_attribute(self, sess, entity, check_fix, **kwargs)
+
+    async def refresh(self, sess: 'AsyncSession', entity: Entity) -> Entity:
+        await sess.refresh(entity)
+        return entity
+
+    async def bulk_add(self, sess: 'AsyncSession', rows: List[Dict[str, Any]], batch_size: int = 1000) -> int:
+        return await sess.run_sync(_bulk_add, self.entity_cls, rows, batch_size)
+
+    async def bulk_merge(self, sess: 'AsyncSession', rows: List[Dict[str, Any]], batch_size: int = 500) -> Tuple[int, int]:
+        return await sess.run_sync(_bulk_merge, self.entity_cls, rows, batch_size)
+
+    async def bulk_delete(self, sess: 'AsyncSession', rows: List[Dict[str, Any]], batch_size: int = 500) -> int:
+        return await sess.run_sync(_bulk_delete, self.entity_cls, rows, batch_size)
+
+    async def flush(self, sess: 'AsyncSession') -> None:
+        try:
+            changed = (len(sess.new), len(sess.dirty), len(sess.deleted))
+            await sess.flush()
+            return changed
+        except:
+            await self.rollback(sess)
+            raise
+
+    async def rollback(self, sess: 'AsyncSession') -> None:
+        await sess.rollback()
+
+    async def save(self, sess: 'AsyncSession') -> None:
+        try:
+            changed = (len(sess.new), len(sess.dirty), len(sess.deleted))
+            await sess.commit()
+            return changed
+        except:
+            await self.rollback(sess)
+            raise
@@ -10,11 +10,13 @@ Last Updated:  Monday, 4th November 2019 by hsky77 (howardlkung@gmail.com)
 import json
 from enum import Enum
 from datetime import datetime
-from typing import Dict, Any, Tuple, List, Union
+from typing import Dict, Any, Tuple, List, Union, Iterator
 
+from sqlalchemy import DateTime, tuple_
 from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base
 from sqlalchemy.inspection import inspect
 from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import bindparam, and_
 
 from .. import (PY_DT_Converter, str_to_datetime, LocalizedMessageWarning,
                 LocalCode_Not_Allow_Update, LocalCode_Must_Be_Type, LocalCode_Invalid_Column)
@@ -163,16 +165,143 @@ class EntityBaseAddon():
 Entity = Union[DeclarativeMeta, EntityBaseAddon]
 
 
+def _chunks(rows: List, size: int) -> Iterator[List]:
+    for i in range(0, len(rows), max(1, size)):
+        yield rows[i:i + size]
+
+
+def _group_by_keys(rows: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """the rows of executemany statement should have the same keys"""
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    return list(groups.values())
+
+
+def _validate_rows(entity_cls: Entity, rows: List[Dict[str, Any]], check_fix: bool = False) -> List[Dict[str, Any]]:
+    """validate the columns of rows like set_attribute(), return the rows with datetime strings converted"""
+    columns = {c.name: c for c in inspect(entity_cls).columns}
+    validator = entity_cls() if issubclass(entity_cls, EntityBaseAddon) else None
+    result = []
+    for row in rows:
+        row = dict(row)
+        for k, v in row.items():
+            if not k in columns:
+                raise LocalizedMessageWarning(LocalCode_Invalid_Column, k)
+            if isinstance(v, str) and isinstance(columns[k].type, DateTime):
+                row[k] = str_to_datetime(v)
+
+        if validator is not None:
+            validator.parameter_validation(check_fix, **row)
+        result.append(row)
+    return result
+
+
+def _primary_key_names(entity_cls: Entity) -> List[str]:
+    """the primary key column names of any declarative entity class"""
+    return [c.name for c in inspect(entity_cls).primary_key]
+
+
+def _key_filter(entity_cls: Entity, keys: List[Tuple]):
+    """IN-list of primary keys"""
+    columns = list(inspect(entity_cls).primary_key)
+    if len(columns) == 1:
+        return columns[0].in_([key[0] for key in keys])
+    return tuple_(*columns).in_(keys)
+
+
+def _primary_key(entity_cls: Entity, row: Dict[str, Any]) -> Tuple:
+    return tuple(row.get(k) for k in _primary_key_names(entity_cls))
+
+
+def _keyset(statement, entity_cls: Entity, limit: int = None, after: Union[Any, Tuple] = None):
+    """order the query or select statement by primary keys, filter the rows after the key and limit them"""
+    columns = list(inspect(entity_cls).primary_key)
+    if after is not None:
+        if len(columns) == 1:
+            statement = statement.filter(columns[0] > after)
+        else:
+            statement = statement.filter(tuple_(*columns) > tuple_(*after))
+    statement = statement.order_by(*columns)
+    if limit is not None:
+        statement = statement.limit(limit)
+    return statement
+
+
+def _bulk_add(sess: Session, entity_cls: Entity, rows: List[Dict[str, Any]], batch_size: int) -> int:
+    table = entity_cls.__table__
+    rows = _validate_rows(entity_cls, rows)
+    for group in _group_by_keys(rows):
+        for batch in _chunks(group, batch_size):
+            sess.execute(table.insert(), batch)
+    return len(rows)
+
+
+def _bulk_merge(sess: Session, entity_cls: Entity, rows: List[Dict[str, Any]], batch_size: int) -> Tuple[int, int]:
+    """the rows of the same primary key in a batch are merged by the last one, the rows of primary keys only are not counted as updated"""
+    table = entity_cls.__table__
+    pkeys = _primary_key_names(entity_cls)
+    rows = _validate_rows(entity_cls, rows)
+    inserted = updated = 0
+    for batch in _chunks(rows, batch_size):
+        deduped, generated = {}, []
+        for row in batch:
+            key = _primary_key(entity_cls, row)
+            if None in key:  # None is generated by database
+                generated.append(row)
+            else:
+                deduped[key] = row
+
+        existing = set(tuple(r) for r in sess.query(*[table.c[k] for k in pkeys]).filter(
+            _key_filter(entity_cls, list(deduped)))) if deduped else set()
+
+        inserts, updates = list(generated), []
+        for key, row in deduped.items():
+            if key in existing:
+                values = {k: v for k, v in row.items() if not k in pkeys}
+                if values:  # nothing to update if the row has primary keys only
+                    updates.append((key, values))
+            else:
+                inserts.append(row)
+
+        for group in _group_by_keys(inserts):
+            sess.execute(table.insert(), group)
+
+        # the primary keys are bound by other names, the columns of parameters are SET by executemany
+        _validate_rows(entity_cls, [values for _, values in updates], True)
+        statement = table.update().where(
+            and_(*[table.c[k] == bindparam('_pk_' + k) for k in pkeys]))
+        for group in _group_by_keys([{**{'_pk_' + k: v for k, v in zip(pkeys, key)}, **values}
+                                     for key, values in updates]):
+            sess.execute(statement, group)
+
+        inserted += len(inserts)
+        updated += len(updates)
+    return inserted, updated
+
+
+def _bulk_delete(sess: Session, entity_cls: Entity, rows: List[Dict[str, Any]], batch_size: int) -> int:
+    table = entity_cls.__table__
+    deleted = 0
+    for batch in _chunks([_primary_key(entity_cls, row) for row in rows], batch_size):
+        deleted += sess.execute(table.delete().where(
+            _key_filter(entity_cls, batch))).rowcount
+    return deleted
+
+
 class OrmDBEntityAccessor():
     """this class defines how to access the db entities, so session instance is required
         as the first argument when defining or overriding functions
 
             - select(): select database with or without keys and return a list of entities
+            - select_page(): select at most limit entities after the primary key of previous page (keyset pagination)
+            - iterate(): yield the selected entities by fetching yield_per rows at a time instead of loading all of them
             - load(): like select but just retunr first matched entity 
             - delete(): delete a list of entities
             - add(): insert one entity but not replace if it exists
             - merge(): insert or replace one entity
             - set_attribute(): update entity columns
+            - bulk_add(), bulk_merge(), bulk_delete(): insert, upsert and delete rows of dict by a few statements without loading entities
             - refresh(): refresh entity from database
             - flush(): session flushing
             - rollback(): session rollback
@@ -195,6 +324,20 @@ class OrmDBEntityAccessor():
 
         return [o for o in qobj]
 
+    def select_page(self, sess: Session, limit: int, after: Union[Any, Tuple] = None, **kwargs) -> List[Entity]:
+        """
+        keyset pagination, select at most limit entities ordered by primary key which is greater than after,
+        after is the primary key of the last entity of previous page, or the tuple of keys if the primary key is composite
+        """
+        return _keyset(sess.query(self.entity_cls).filter_by(**kwargs), self.entity_cls, limit, after).all()
+
+    def iterate(self, sess: Session, limit: int = None, after: Union[Any, Tuple] = None,
+                yield_per: int = 1000, **kwargs) -> Iterator[Entity]:
+        """yield the entities ordered by primary key, the rows are fetched yield_per rows at a time"""
+        query = _keyset(sess.query(self.entity_cls).filter_by(**kwargs), self.entity_cls, limit, after)
+        for entity in query.yield_per(yield_per):
+            yield entity
+
     def load(self, sess: Session, **kwargs) -> Entity:
         if len(kwargs) > 0:
             return sess.query(self.entity_cls).filter_by(**kwargs).first()
@@ -242,6 +385,22 @@ class OrmDBEntityAccessor():
         sess.refresh(entity)
         return entity
 
+    def bulk_add(self, sess: Session, rows: List[Dict[str, Any]], batch_size: int = 1000) -> int:
+        """insert rows by executemany statements, return the number of inserted rows"""
+        return _bulk_add(sess, self.entity_cls, rows, batch_size)
+
+    def bulk_merge(self, sess: Session, rows: List[Dict[str, Any]], batch_size: int = 500) -> Tuple[int, int]:
+        """
+        insert or update rows by primary keys, each batch selects the existing keys in one IN-list query,
+        then inserts and updates the rows by executemany statements, return the numbers of inserted and updated rows,
+        the last row wins if a batch has the same primary key more than once
+        """
+        return _bulk_merge(sess, self.entity_cls, rows, batch_size)
+
+    def bulk_delete(self, sess: Session, rows: List[Dict[str, Any]], batch_size: int = 500) -> int:
+        """delete the rows of the primary keys in rows by IN-list statements, return the number of deleted rows"""
+        return _bulk_delete(sess, self.entity_cls, rows, batch_size)
+
     def flush(self, sess: Session) -> None:
         try:
             changed = (len(sess.new), len(sess.dirty), len(sess.deleted))
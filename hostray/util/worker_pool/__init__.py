@@ -6,11 +6,21 @@
 '''
 This module wraps threading.Thread to execute functions:
     - Worker: executes function once
-    - FunctionLoopWorker: looping a single function before calling stop()
+    - FunctionLoopWorker: looping a single function before calling stop(), executed by the shared TimerWheelScheduler
     - FunctionQueueWorker: queue functions to be executed (FIFO)
 
     - WorkerPool: pooling the workers to execute function once, the workers could be reserved to run multiple functions
     - AsyncWorkerPool: inherit from WorkerPool, allow execute functions asynchronously
+    - ProcessWorkerPool: execute cpu bound functions in worker processes, the functions must be picklable
+    - CoroutineWorkerPool: execute coroutine functions concurrently in worker threads, each of them runs its own event loop
+    - PriorityTaskQueue: queue functions by TaskPriority to be executed in background, drop the functions past their deadline
+    - DurableTaskQueue: PriorityTaskQueue stores the registered tasks in SQLite file with group commit, replayed after restart
+    - BackpressurePolicy: the policy of pools and queues reached max_pending, QueueFullException is raised if rejected or dropped
+    - AdaptiveLimit: AIMD limit adjusts max_pending of WorkerPool by the execution time of functions
+    - TimerWheelScheduler: run periodic and one-shot jobs on a small set of threads, get_scheduler() returns the shared one
+    - CancellationToken: get_cancellation_token() returns the token of executing function cancelled by timeout or the caller
+    - TaskMetrics, LatencyHistogram: queue wait and execution time of the functions shown in info() of pools and queues
+    - WorkerPoolExecutor: concurrent.futures.Executor backed by the pools, could be the default executor of asyncio loop
 
     note: run_method() of WorkerPool and AsyncWorkerPool blocks the main thread
 
@@ -18,4 +28,14 @@ Last Updated:  Monday, 4th November 2019 by hsky77 (howardlkung@gmail.com)
 '''
 
 from .worker import Worker, FunctionLoopWorker, FunctionQueueWorker
+from .cancellation import CancellationToken, TaskTimeoutException, get_cancellation_token
+from .metrics import TaskMetrics, LatencyHistogram
+from .backpressure import BackpressurePolicy, QueueFullException
+from .limiter import AdaptiveLimit
 from .pool import WorkerPool, AsyncWorkerPool, PoolWorkerExecutor
+from .process_pool import ProcessWorkerPool
+from .coroutine_pool import CoroutineWorkerPool, CoroutineWorker
+from .executor import WorkerPoolExecutor
+from .task_queue import PriorityTaskQueue, TaskPriority
+from .durable_queue import DurableTaskQueue
+from .scheduler import TimerWheelScheduler, ScheduledJob, get_scheduler
@@ -0,0 +1,181 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+admission control of the queues and pools with max_pending, the policy decides what happens when the queue is full
+
+    - BackpressurePolicy.Block: the caller waits until the pending functions are less than max_pending
+    - BackpressurePolicy.Reject: raise QueueFullException
+    - BackpressurePolicy.DropOldest: drop the oldest queued function, the dropped function raises QueueFullException,
+      the functions of reservation are not dropped
+    - BackpressurePolicy.CallerRuns: the caller executes the function by itself, the pool rejects the function of reservation
+'''
+
+import asyncio
+from enum import Enum
+from collections import deque
+from threading import Event
+from typing import Callable, Dict, Union
+
+from ..localization import LocalizedMessageException
+from ..constants import LocalCode_Queue_Full
+
+
+class BackpressurePolicy(Enum):
+    Block = 'block'
+    Reject = 'reject'
+    DropOldest = 'drop_oldest'
+    CallerRuns = 'caller_runs'
+
+
+class QueueFullException(LocalizedMessageException):
+    """raised when the function is rejected or dropped by the queue has max_pending functions"""
+
+    def __init__(self, name: str, max_pending: int):
+        super().__init__(LocalCode_Queue_Full, name, max_pending)
+
+
+class _Waiter():
+    """the blocked caller, waits with threading.Event or asyncio.Future if loop is specified"""
+    __slots__ = ('event', 'loop', 'future')
+
+    def __init__(self, loop: asyncio.AbstractEventLoop = None):
+        self.event = Event() if loop is None else None
+        self.loop = loop
+        self.future = None
+
+    def reset(self) -> None:
+        if self.loop is None:
+            self.event.clear()
+        else:
+            self.future = self.loop.create_future()
+
+    def wake(self) -> None:
+        if self.loop is None:
+            self.event.set()
+        else:
+            try:
+                self.loop.call_soon_threadsafe(self._resolve, self.future)
+            except RuntimeError:  # loop has been closed, nobody is waiting
+                pass
+
+    @staticmethod
+    def _resolve(future: asyncio.Future) -> None:
+        if not future.done():
+            future.set_result(None)
+
+
+class _Admission():
+    """
+    admission control of the queue has max_pending, no limit if max_pending is None
+
+    the queue passes its lock, get_pending() returns the number of pending functions
+    and drop_oldest() drops the oldest queued function and returns True if any
+    """
+
+    def __init__(self, name: str, max_pending: int = None,
+                 policy: Union[BackpressurePolicy, str] = BackpressurePolicy.Block):
+        self.name = name
+        self.max_pending = max_pending
+        self.policy = BackpressurePolicy(policy)
+        self.waiters = deque()
+        self.rejected = 0
+        self.dropped = 0
+        self.caller_runs = 0
+        self.blocked = 0
+
+    def info(self) -> Dict:
+        return {
+            'max_pending': self.max_pending,
+            'backpressure': self.policy.value,
+            'waiting': len(self.waiters),
+            'blocked': self.blocked,
+            'rejected': self.rejected,
+            'dropped': self.dropped,
+            'caller_runs': self.caller_runs
+        }
+
+    def admit(self, lock, get_pending: Callable[[], int], drop_oldest: Callable[[], bool],
+              enqueue: Callable[[], None]) -> bool:
+        """call enqueue() with lock and return True if the function is admitted, return False if caller should run the function"""
+        waiter = None
+        try:
+            while True:
+                with lock:
+                    admitted = self._check(get_pending, drop_oldest, waiter)
+                    if admitted is not None:
+                        if admitted:
+                            enqueue()
+                        return admitted
+
+                    if waiter is None:
+                        waiter = self._add_waiter()
+                    waiter.reset()
+                waiter.event.wait()
+        finally:
+            if waiter is not None:
+                self._remove_waiter(lock, get_pending, waiter)
+
+    async def admit_async(self, lock, get_pending: Callable[[], int], drop_oldest: Callable[[], bool],
+                          enqueue: Callable[[], None]) -> bool:
+        """the same as admit() but await if the caller should wait"""
+        waiter = None
+        try:
+            while True:
+                with lock:
+                    admitted = self._check(get_pending, drop_oldest, waiter)
+                    if admitted is not None:
+                        if admitted:
+                            enqueue()
+                        return admitted
+
+                    if waiter is None:
+                        waiter = self._add_waiter(asyncio.get_event_loop())
+                    waiter.reset()
+                await waiter.future
+        finally:
+            if waiter is not None:
+                self._remove_waiter(lock, get_pending, waiter)
+
+    def reject_caller_run(self) -> None:
+        """the admitted caller run could not be executed by caller, count and raise it as rejected"""
+        self.caller_runs -= 1
+        self.rejected += 1
+        raise QueueFullException(self.name, self.max_pending)
+
+    def notify(self, pending: int) -> None:
+        """call with lock when the pending functions decrease, wake up the first waiting caller"""
+        if self.waiters and (self.max_pending is None or pending < self.max_pending):
+            self.waiters[0].wake()
+
+    def _check(self, get_pending: Callable[[], int], drop_oldest: Callable[[], bool], waiter: _Waiter) -> bool:
+        """return True if admitted, False if caller runs the function, None if caller should wait"""
+        if self.max_pending is None:
+            return True
+
+        if (not self.waiters or self.waiters[0] is waiter) and get_pending() < self.max_pending:
+            return True
+
+        if self.policy is BackpressurePolicy.Reject:
+            self.rejected += 1
+            raise QueueFullException(self.name, self.max_pending)
+        elif self.policy is BackpressurePolicy.CallerRuns:
+            self.caller_runs += 1
+            return False
+        elif self.policy is BackpressurePolicy.DropOldest and not self.waiters and drop_oldest():
+            self.dropped += 1
+            return True
+        return None  # block, or nothing could be dropped since all functions are executing
+
+    def _add_waiter(self, loop: asyncio.AbstractEventLoop = None) -> _Waiter:
+        waiter = _Waiter(loop)
+        self.waiters.append(waiter)
+        self.blocked += 1
+        return waiter
+
+    def _remove_waiter(self, lock, get_pending: Callable[[], int], waiter: _Waiter) -> None:
+        with lock:
+            self.waiters.remove(waiter)
+            self.notify(get_pending())
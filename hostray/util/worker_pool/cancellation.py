@@ -0,0 +1,56 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+cooperative cancellation of the functions executed by the pools
+
+    - the function is removed from the worker queue if it is cancelled or timed out before it starts
+    - the executing function gets its CancellationToken by get_cancellation_token() and checks it to stop early
+'''
+
+import asyncio
+from threading import Event, local
+from typing import Callable
+
+from ..localization import LocalizedMessageException
+from ..constants import LocalCode_Task_Timeout
+
+
+class TaskTimeoutException(LocalizedMessageException, asyncio.TimeoutError):
+    """raised to the caller when the function does not complete in timeout seconds"""
+
+    def __init__(self, func: Callable, timeout: float):
+        super().__init__(LocalCode_Task_Timeout, getattr(func, '__name__', func), timeout)
+
+
+class CancellationToken():
+    """cancelled when the caller stops waiting for the result of function"""
+    __slots__ = ('_event',)
+
+    def __init__(self):
+        self._event = Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """sleep until cancelled or timeout seconds elapsed, return True if cancelled"""
+        return self._event.wait(timeout)
+
+
+_local = local()
+
+
+def get_cancellation_token() -> CancellationToken:
+    """return the token of function executing in current thread, or None if the function is not cancellable"""
+    return getattr(_local, 'token', None)
+
+
+def _set_cancellation_token(token: CancellationToken) -> None:
+    _local.token = token
@@ -0,0 +1,328 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+CoroutineWorkerPool executes coroutine functions in worker threads, each thread runs its own event loop
+
+    - the coroutines run concurrently in the worker loop, so the cpu spiky async libraries do not block the caller's loop
+    - the results are bridged back to the caller by concurrent.futures.Future or asyncio.Future of the caller's loop
+    - the loop-bound resource (such as aiohttp.ClientSession) is created by resource_factory in each worker loop
+      when the first coroutine runs, it is passed as the first argument of coroutine functions and disposed with the worker
+'''
+
+import time
+import asyncio
+import inspect
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Union
+from threading import Lock, RLock, Thread
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from .pool import _to_calls
+from .cancellation import TaskTimeoutException
+from .metrics import TaskMetrics
+from .singleflight import _SingleFlight
+
+
+async def _call(func: Callable, *args, **kwargs) -> Any:
+    """await the result of func if it is awaitable"""
+    result = func(*args, **kwargs)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+class CoroutineWorker(Thread):
+    """thread runs its own event loop to execute coroutine functions concurrently"""
+
+    def __init__(self, name: str = None, max_concurrency: int = None,
+                 resource_factory: Callable[[], Union[Any, Awaitable]] = None,
+                 resource_dispose: Callable[[Any], Union[None, Awaitable]] = None):
+        super().__init__(name=name)
+        self._loop = asyncio.new_event_loop()
+        self._lock = Lock()
+        self._start_called = False
+        self._pending = 0
+        self._max_concurrency = max_concurrency
+        self._semaphore = None
+        self._resource_factory = resource_factory
+        self._resource_dispose = resource_dispose
+        self._resource = None
+        self._metrics = TaskMetrics()
+
+    @property
+    def pending_count(self) -> int:
+        """number of queued and executing coroutines"""
+        return self._pending
+
+    @property
+    def metrics(self) -> TaskMetrics:
+        """queue wait and execution time of the coroutines completed since the last reset_metrics()"""
+        return self._metrics
+
+    def reset_metrics(self) -> TaskMetrics:
+        """start a new metrics window and return the metrics of the ended one"""
+        metrics, self._metrics = self._metrics, TaskMetrics()
+        return metrics
+
+    def run_method(self, coro_func: Callable[..., Awaitable], *args, **kwargs) -> Future:
+        """schedule coroutine function in the worker loop and return concurrent.futures.Future of the result"""
+        with self._lock:
+            if not self._start_called:  # the coroutines scheduled before the loop runs are executed once it starts
+                self._start_called = True
+                self.start()
+            self._pending += 1
+        try:
+            future = asyncio.run_coroutine_threadsafe(
+                self._execute(coro_func, args, kwargs, time.monotonic()), self._loop)
+        except RuntimeError:  # the loop has been closed
+            with self._lock:
+                self._pending -= 1
+            raise
+        future.add_done_callback(self._on_done)
+        return future
+
+    def dispose(self) -> None:
+        """stop the worker loop, the executing coroutines are cancelled and the resource is disposed"""
+        with self._lock:
+            if self._loop.is_closed():
+                return
+            if self._start_called:
+                try:
+                    self._loop.call_soon_threadsafe(self._loop.stop)
+                except RuntimeError:  # closed by the worker thread
+                    pass
+            else:
+                self._loop.close()
+
+    def run(self) -> None:
+        """do not directly call this function, it will be called by thread automatically"""
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_forever()
+        finally:
+            try:
+                tasks = asyncio.all_tasks(self._loop)
+                for task in tasks:
+                    task.cancel()
+                self._loop.run_until_complete(
+                    asyncio.gather(*tasks, return_exceptions=True))
+                self._loop.run_until_complete(self._dispose_resource())
+                self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+            finally:
+                self._loop.close()
+
+    async def _execute(self, coro_func: Callable[..., Awaitable], args: tuple, kwargs: dict, queued_time: float) -> Any:
+        if self._max_concurrency is not None:
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self._max_concurrency)
+            await self._semaphore.acquire()
+
+        start = time.monotonic()
+        failed = False
+        try:
+            if self._resource_factory is not None:
+                args = (await self._get_resource(),) + args
+            return await coro_func(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            if self._semaphore is not None:
+                self._semaphore.release()
+            now = time.monotonic()
+            self._metrics.record(start - queued_time, now - start, failed)
+
+    async def _get_resource(self) -> Any:
+        """the resource is created by the first coroutine, the concurrent ones wait for it"""
+        if self._resource is None:
+            self._resource = self._loop.create_task(
+                _call(self._resource_factory))
+
+        task = self._resource
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            if self._resource is task and task.done():  # create again by the next coroutine
+                self._resource = None
+            raise
+
+    async def _dispose_resource(self) -> None:
+        task, self._resource = self._resource, None
+        if task is None or not task.done() or task.cancelled() or task.exception() is not None:
+            return
+
+        if self._resource_dispose is not None:
+            try:
+                await _call(self._resource_dispose, task.result())
+            except Exception:
+                pass
+
+    def _on_done(self, future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+
+class CoroutineWorkerPool():
+    """
+    pool of CoroutineWorker, the interface is compatible with the run_method() and run_method_async() of AsyncWorkerPool
+    but the functions must be coroutine functions
+
+    max_concurrency: the maximum of coroutines executing concurrently in each worker, unlimited if None
+
+    resource_factory: create the resource of each worker in its loop, could be coroutine function,
+        the resource is passed as the first argument of coroutine functions
+
+    resource_dispose: called with the resource when the worker is disposed, could be coroutine function
+
+    timeout: the coroutine is cancelled if it does not complete in timeout seconds
+
+    dedupe_key: the concurrent calls with the same dedupe_key share one execution, see WorkerPool
+    """
+
+    def __init__(self, pool_name: str = None, worker_limit: int = 4, max_concurrency: int = None,
+                 resource_factory: Callable[[], Union[Any, Awaitable]] = None,
+                 resource_dispose: Callable[[Any], Union[None, Awaitable]] = None):
+        self._pool_name = pool_name or type(self).__name__
+        self.__worker_limit = max(1, worker_limit)
+        self.__disposing = False
+        self._max_concurrency = max_concurrency
+        self._resource_factory = resource_factory
+        self._resource_dispose = resource_dispose
+        self._workers: List[CoroutineWorker] = []
+        self._lock = RLock()
+        self._timed_out_count = 0
+        self._cancelled_count = 0
+        self._single_flight = _SingleFlight()
+        self._metrics_window_start = time.monotonic()
+
+    @property
+    def workers(self) -> List[CoroutineWorker]:
+        return list(self._workers)
+
+    @property
+    def worker_limit(self) -> int:
+        return self.__worker_limit
+
+    def dispose(self) -> None:
+        with self._lock:
+            self.__disposing = True
+            workers = list(self._workers)
+
+        for worker in workers:
+            worker.dispose()
+
+        for worker in workers:
+            if worker.is_alive():
+                worker.join()
+
+    def info(self) -> Dict:
+        """return the dict show the current condition of this pool"""
+        with self._lock:
+            return {
+                'type': 'coroutine',
+                'size': len(self._workers),
+                'max_workers': self.__worker_limit,
+                'max_concurrency': self._max_concurrency,
+                'timed_out': self._timed_out_count,
+                'cancelled': self._cancelled_count,
+                **self._single_flight.info(),
+                'metrics': self.get_metrics().info(),
+                'workers': [{
+                    'name': w.name,
+                    'pending_task': w.pending_count
+                } for w in self._workers]
+            }
+
+    def get_metrics(self) -> TaskMetrics:
+        """return the metrics merged from the workers in current window"""
+        with self._lock:
+            return TaskMetrics.merged([w.metrics for w in self._workers], self._metrics_window_start)
+
+    def reset_metrics(self) -> TaskMetrics:
+        """start a new metrics window and return the metrics of the ended one"""
+        with self._lock:
+            window_start, self._metrics_window_start = self._metrics_window_start, time.monotonic()
+            return TaskMetrics.merged([w.reset_metrics() for w in self._workers], window_start)
+
+    def run_method(self, coro_func: Callable[..., Awaitable], *args, timeout: float = None,
+                   dedupe_key: Hashable = None, **kwargs) -> Any:
+        """execute coroutine function in worker loop, note this causes current thread blocking, raise TaskTimeoutException if timeout"""
+        if dedupe_key is not None:
+            return self._single_flight.run(dedupe_key, lambda: self.submit(coro_func, *args, **kwargs),
+                                           coro_func, timeout, self._count_cancelled)
+
+        future = self.submit(coro_func, *args, **kwargs)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            if future.done():  # raised by the coroutine
+                raise
+            future.cancel()
+            self._count_cancelled(timed_out=True)
+            raise TaskTimeoutException(coro_func, timeout) from None
+
+    async def run_method_async(self, coro_func: Callable[..., Awaitable], *args, timeout: float = None,
+                               dedupe_key: Hashable = None, **kwargs) -> Any:
+        """
+        execute coroutine function in worker loop and await the result in current loop
+
+        timeout: raise TaskTimeoutException if the coroutine does not complete in timeout seconds,
+            the coroutine is also cancelled if the awaiting coroutine is cancelled
+        """
+        if dedupe_key is not None:
+            return await self._single_flight.run_async(dedupe_key, lambda: self.submit(coro_func, *args, **kwargs),
+                                                       coro_func, timeout, self._count_cancelled)
+
+        future = asyncio.wrap_future(self.submit(coro_func, *args, **kwargs))
+        try:
+            if timeout is None:
+                return await future
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():  # raised by the coroutine
+                raise
+            self._count_cancelled(timed_out=True)
+            raise TaskTimeoutException(coro_func, timeout) from None
+        except asyncio.CancelledError:
+            self._count_cancelled()
+            raise
+
+    async def map_async(self, coro_func: Callable[..., Awaitable], iterable: Iterable, chunksize: int = None,
+                        ordered: bool = True) -> List[Any]:
+        """execute coro_func with each item of iterable, chunksize is ignored since the coroutines run concurrently"""
+        return await self.gather_async([(coro_func, item) for item in iterable], ordered=ordered)
+
+    async def gather_async(self, calls: Iterable[Union[Callable, tuple]], chunksize: int = None,
+                           ordered: bool = True) -> List[Any]:
+        """execute the list of coroutine function or tuple (coro_func, *args), return the results in completion order if not ordered"""
+        futures = [self.run_method_async(func, *args) for func, args in _to_calls(calls)]
+        if ordered:
+            return list(await asyncio.gather(*futures))
+        return [await future for future in asyncio.as_completed(futures)]
+
+    def submit(self, coro_func: Callable[..., Awaitable], *args, **kwargs) -> Future:
+        """schedule coroutine function without blocking, return concurrent.futures.Future of the result"""
+        return self._get_worker().run_method(coro_func, *args, **kwargs)
+
+    def _get_worker(self) -> CoroutineWorker:
+        """the least loaded worker, a new worker is spawned if every worker is executing"""
+        with self._lock:
+            if self.__disposing:
+                raise RuntimeError(
+                    '{} has been disposed'.format(self._pool_name))
+
+            worker = min(self._workers, key=lambda w: w.pending_count, default=None)
+            if worker is None or (worker.pending_count > 0 and len(self._workers) < self.__worker_limit):
+                worker = CoroutineWorker('{}_{}'.format(self._pool_name, len(self._workers)),
+                                         self._max_concurrency, self._resource_factory, self._resource_dispose)
+                self._workers.append(worker)
+            return worker
+
+    def _count_cancelled(self, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self._timed_out_count += 1
+            else:
+                self._cancelled_count += 1
@@ -0,0 +1,230 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+DurableTaskQueue persists the queued tasks in a SQLite file, the tasks survive crash and restart
+
+    - the tasks are registered by name, run_task() stores the name and the pickled arguments
+    - a committer thread writes the queued and completed tasks in batch, one transaction (fsync) for
+      all the tasks queued while the previous batch was committing (group commit)
+    - the worker executes the task after its record is committed, the record is deleted after the task is done,
+      the tasks left in the file are replayed when they are registered again (at-least-once, the task should be idempotent)
+'''
+
+import time
+import pickle
+import sqlite3
+from threading import Condition, Lock, Thread
+from typing import Any, Callable, Dict, List, Union
+
+from .task_queue import PriorityTaskQueue, TaskPriority
+from .backpressure import BackpressurePolicy
+from ..localization import LocalizedMessageException
+from ..constants import LocalCode_Not_Picklable, LocalCode_Task_Not_Registered
+
+
+class _DurableCall():
+    """execute the task after its record is committed"""
+    __slots__ = ('queue', 'task_id', 'func')
+
+    def __init__(self, queue: 'DurableTaskQueue', task_id: int, func: Callable):
+        self.queue = queue
+        self.task_id = task_id
+        self.func = func
+
+    def __call__(self, *args, **kwargs) -> Any:
+        self.queue._wait_committed(self.task_id)
+        return self.func(*args, **kwargs)
+
+
+class DurableTaskQueue(PriorityTaskQueue):
+    """
+    PriorityTaskQueue stores the tasks in SQLite file at path
+
+    max_batch: the maximum of records written in one transaction
+    """
+    retry_interval = 1.0  # seconds to wait before writing again if the transaction failed
+
+    def __init__(self, path: str, queue_name: str = None, worker_limit: int = 1, max_pending: int = None,
+                 backpressure: Union[BackpressurePolicy, str] = BackpressurePolicy.Block, max_batch: int = 1000):
+        super().__init__(queue_name, worker_limit=worker_limit,
+                         max_pending=max_pending, backpressure=backpressure)
+        self.path = path
+        self._max_batch = max(1, max_batch)
+        self._commit_cond = Condition(Lock())
+        self._inserts = []
+        self._acks = []
+        self._committed_id = 0
+        self._commit_count = 0
+        self._record_count = 0
+        self._closed = False
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=FULL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS durable_task (id INTEGER PRIMARY KEY, name TEXT NOT NULL, '
+                           'payload BLOB NOT NULL, priority INTEGER NOT NULL, deadline REAL)')
+        self._conn.commit()
+
+        self._recovered: Dict[str, List[tuple]] = {}
+        for row in self._conn.execute('SELECT id, name, payload, priority, deadline FROM durable_task ORDER BY id'):
+            self._recovered.setdefault(row[1], []).append(row)
+            self._committed_id = row[0]
+        self._next_id = self._committed_id + 1
+
+        self._committer = Thread(name='{}_committer'.format(self._queue_name),
+                                 target=self._commit_loop)
+        self._committer.start()
+
+    def register_task(self, name: str, func: Callable) -> int:
+        """register func by name, the recovered tasks of name are queued again, return the number of them"""
+        self._tasks[name] = func
+        recovered = self._recovered.pop(name, [])
+        for task_id, _, payload, priority, deadline in recovered:
+            args, kwargs = pickle.loads(payload)
+            self._queue(task_id, func, args, kwargs, priority, deadline)
+        return len(recovered)
+
+    def run_task(self, name: str, *args,
+                 priority: TaskPriority = TaskPriority.Normal,
+                 deadline: float = None,
+                 on_finish: Callable[[Any], None] = None,
+                 on_exception: Callable[[Exception], None] = None,
+                 on_expired: Callable[[Callable], None] = None,
+                 **kwargs) -> bool:
+        """
+        store and queue the registered task of name, return True if it is accepted
+
+        deadline: seconds since queued, it is kept across restart
+        """
+        if not name in self._tasks:
+            raise LocalizedMessageException(LocalCode_Task_Not_Registered, name)
+
+        try:
+            payload = pickle.dumps((args, kwargs), pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            raise LocalizedMessageException(
+                LocalCode_Not_Picklable, name, e) from e
+
+        expire_time = None if deadline is None else time.time() + deadline
+        with self._commit_cond:
+            if self._closed:
+                return False
+            task_id = self._next_id
+            self._next_id += 1
+            self._inserts.append(
+                (task_id, name, payload, int(priority), expire_time))
+            self._commit_cond.notify()
+
+        try:
+            accepted = self._queue(task_id, self._tasks[name], args, kwargs, priority, expire_time,
+                                   on_finish, on_exception, on_expired)
+        except Exception:  # rejected by backpressure, the record is deleted with or after it is written
+            self._ack(task_id)
+            raise
+        if not accepted:  # disposing
+            self._ack(task_id)
+        return accepted
+
+    def flush(self, timeout: float = None) -> bool:
+        """wait until the queued tasks are committed, return False if timeout"""
+        with self._commit_cond:
+            last_id = self._next_id - 1
+            return self._commit_cond.wait_for(
+                lambda: self._committed_id >= last_id or self._closed, timeout)
+
+    def info(self) -> Dict:
+        return {
+            **super().info(),
+            'durable': {
+                'path': self.path,
+                'commits': self._commit_count,
+                'committed_records': self._record_count,
+                'uncommitted': len(self._inserts),
+                'recovered': {k: len(v) for k, v in self._recovered.items()}
+            }
+        }
+
+    def dispose(self) -> None:
+        """execute the queued tasks, then commit their completion and close the file"""
+        super().dispose()
+        for w in self.workers:
+            w.join()
+
+        with self._commit_cond:
+            self._closed = True
+            self._commit_cond.notify_all()
+        self._committer.join()
+        self._conn.close()
+
+    def _queue(self, task_id: int, func: Callable, args: tuple, kwargs: dict, priority: int, expire_time: float,
+               on_finish: Callable[[Any], None] = None,
+               on_exception: Callable[[Exception], None] = None,
+               on_expired: Callable[[Callable], None] = None) -> bool:
+        def finish(result):
+            self._ack(task_id)
+            if callable(on_finish):
+                on_finish(result)
+
+        def exception(e):  # raised or dropped by backpressure
+            self._ack(task_id)
+            if callable(on_exception):
+                on_exception(e)
+
+        def expired(_):
+            self._ack(task_id)
+            if callable(on_expired):
+                on_expired(func)
+
+        return self.run_method(_DurableCall(self, task_id, func), *args, priority=priority,
+                               deadline=None if expire_time is None else expire_time - time.time(),
+                               on_finish=finish, on_exception=exception, on_expired=expired, **kwargs)
+
+    def _ack(self, task_id: int) -> None:
+        with self._commit_cond:
+            self._acks.append(task_id)
+            self._commit_cond.notify()
+
+    def _wait_committed(self, task_id: int) -> None:
+        with self._commit_cond:
+            self._commit_cond.wait_for(
+                lambda: self._committed_id >= task_id or self._closed)
+
+    def _commit_loop(self) -> None:
+        """write all the pending records in one transaction, the records arrived meanwhile are written in the next one"""
+        while True:
+            with self._commit_cond:
+                self._commit_cond.wait_for(
+                    lambda: self._inserts or self._acks or self._closed)
+                inserts = self._inserts[:self._max_batch]
+                del self._inserts[:self._max_batch]
+                # the record is deleted in the transaction writes it or after, otherwise it would be orphaned
+                pending_id = self._inserts[0][0] if self._inserts else self._next_id
+                acks = [task_id for task_id in self._acks if task_id < pending_id]
+                self._acks = [task_id for task_id in self._acks if task_id >= pending_id]
+                if not inserts and not acks and self._closed:
+                    return
+
+            try:
+                with self._conn:
+                    if inserts:
+                        self._conn.executemany('INSERT INTO durable_task (id, name, payload, priority, deadline) '
+                                               'VALUES (?, ?, ?, ?, ?)', inserts)
+                    if acks:
+                        self._conn.executemany('DELETE FROM durable_task WHERE id = ?',
+                                               [(task_id,) for task_id in acks])
+            except sqlite3.Error:  # such as disk full or locked, retry later
+                with self._commit_cond:
+                    self._inserts[:0] = inserts
+                    self._acks.extend(acks)
+                time.sleep(self.retry_interval)
+                continue
+
+            with self._commit_cond:
+                if inserts:
+                    self._committed_id = inserts[-1][0]
+                self._commit_count += 1
+                self._record_count += len(inserts) + len(acks)
+                self._commit_cond.notify_all()
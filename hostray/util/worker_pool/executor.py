@@ -0,0 +1,59 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+WorkerPoolExecutor adapts the hostray pools to concurrent.futures.Executor
+
+    - the functions are executed by the workers of pool, so loop.run_in_executor() shares the size and the info() of pool
+    - it inherits ThreadPoolExecutor only because asyncio loop.set_default_executor() requires it,
+      the threads of ThreadPoolExecutor are never created
+'''
+
+from typing import Callable, Union
+from concurrent.futures import Future, ThreadPoolExecutor, wait as wait_futures
+
+from .pool import WorkerPool
+from .process_pool import ProcessWorkerPool
+
+
+class WorkerPoolExecutor(ThreadPoolExecutor):
+    """concurrent.futures.Executor submits functions to WorkerPool or ProcessWorkerPool, dispose the pool in shutdown() if dispose_pool is True"""
+
+    def __init__(self, pool: Union[WorkerPool, ProcessWorkerPool], dispose_pool: bool = False):
+        super().__init__(max_workers=1)
+        self._pool = pool
+        self._dispose_pool = dispose_pool
+        self._futures = set()
+
+    @property
+    def pool(self) -> Union[WorkerPool, ProcessWorkerPool]:
+        return self._pool
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        with self._shutdown_lock:
+            if self._shutdown:
+                raise RuntimeError('cannot schedule new futures after shutdown')
+
+            future = self._pool.submit(fn, *args, **kwargs)
+            self._futures.add(future)
+
+        future.add_done_callback(self._futures.discard)
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        with self._shutdown_lock:
+            self._shutdown = True
+            futures = list(self._futures)
+
+        if cancel_futures:
+            for future in futures:
+                future.cancel()
+
+        if wait:
+            wait_futures(futures)
+
+        if self._dispose_pool:
+            self._pool.dispose()
+
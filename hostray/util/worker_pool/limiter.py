@@ -0,0 +1,101 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+adaptive concurrency limit of WorkerPool
+
+    - AdaptiveLimit adjusts max_pending of pool, the functions in flight (queued and executing), by AIMD:
+      the limit is multiplied by backoff if the average execution time of a window of functions rises above
+      tolerance times the baseline, otherwise it increases by one if the limit was reached in that window
+    - the baseline is the lowest window average, it follows the higher averages slowly so the limit recovers
+      when the workload becomes slower for good
+'''
+
+from typing import Dict
+
+
+class AdaptiveLimit():
+    """AIMD limit of the functions in flight, the methods are called with the lock of pool"""
+
+    def __init__(self, initial_limit: int = None, min_limit: int = 1, max_limit: int = None,
+                 tolerance: float = 2.0, backoff: float = 0.9, window: int = 10, baseline_drift: float = 0.01):
+        """
+        max_limit: the pool sets it to max_pending or worker_limit if None
+
+        initial_limit: min_limit if None, the limit probes upward from it so the baseline is measured without overload
+
+        tolerance: back off if the window average execution time exceeds tolerance times the baseline
+
+        window: the minimum of functions in a window, the window also covers at least limit functions
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max_limit
+        self.limit = initial_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.window = max(1, window)
+        self.baseline_drift = baseline_drift
+        self.baseline = None
+        self.window_latency = None
+        self.increases = 0
+        self.decreases = 0
+        self.last_decision = None
+        self._total = 0.0
+        self._count = 0
+        self._saturated = False
+
+    def set_range(self, max_limit: int) -> None:
+        """called by pool to set the default max_limit"""
+        if self.max_limit is None:
+            self.max_limit = max_limit
+        self.max_limit = max(self.min_limit, self.max_limit)
+        if self.limit is None:
+            self.limit = self.min_limit
+        self.limit = min(max(self.limit, self.min_limit), self.max_limit)
+
+    def info(self) -> Dict:
+        return {
+            'limit': self.limit,
+            'min_limit': self.min_limit,
+            'max_limit': self.max_limit,
+            'baseline_latency': self.baseline,
+            'window_latency': self.window_latency,
+            'increases': self.increases,
+            'decreases': self.decreases,
+            'last_decision': self.last_decision
+        }
+
+    def record(self, latency: float, saturated: bool) -> bool:
+        """record the execution time of function, saturated is True if the limit is reached, return True if the limit changed"""
+        self._total += latency
+        self._count += 1
+        self._saturated = self._saturated or saturated
+        if self._count < max(self.window, self.limit):
+            return False
+
+        average = self._total / self._count
+        saturated = self._saturated
+        self._total = 0.0
+        self._count = 0
+        self._saturated = False
+        self.window_latency = average
+
+        if self.baseline is None or average < self.baseline:
+            self.baseline = average
+        else:
+            self.baseline += (average - self.baseline) * self.baseline_drift
+
+        limit = self.limit
+        if average > self.baseline * self.tolerance:
+            self.limit = max(self.min_limit, int(self.limit * self.backoff))
+            self.decreases += 1
+            self.last_decision = 'decrease'
+        elif saturated:
+            self.limit = min(self.max_limit, self.limit + 1)
+            self.increases += 1
+            self.last_decision = 'increase'
+        else:
+            self.last_decision = 'hold'
+        return self.limit != limit
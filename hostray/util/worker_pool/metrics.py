@@ -0,0 +1,135 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+always-on latency metrics of the executed tasks
+
+    - LatencyHistogram counts the latencies in log2 buckets split into 4 sub-buckets, the percentiles are
+      estimated by the upper bound of bucket (at most 25% above) and the histograms of workers are merged without losing precision
+    - TaskMetrics records the queue wait, execution time and exceptions of tasks since window_start,
+      each FunctionQueueWorker writes its own metrics without lock and the pools merge them in info()
+'''
+
+import math
+import time
+from math import frexp
+from typing import Dict, Iterable
+
+# the buckets cover 2 ** -24 (60 nanoseconds) to 2 ** 16 (18 hours) seconds
+_MIN_EXPONENT = -23
+_MAX_EXPONENT = 17
+_SUB_BUCKETS = 4
+_BUCKET_COUNT = (_MAX_EXPONENT - _MIN_EXPONENT) * _SUB_BUCKETS
+
+
+class LatencyHistogram():
+    """log-bucketed histogram of latencies in seconds"""
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * _BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        # seconds = mantissa * 2 ** exponent, 0.5 <= mantissa < 1, so int(mantissa * 8) is 4 to 7
+        mantissa, exponent = frexp(seconds)
+        index = (exponent - _MIN_EXPONENT - 1) * _SUB_BUCKETS + int(mantissa * 2 * _SUB_BUCKETS)
+        if index < 0 or seconds <= 0:
+            index = 0
+        elif index >= _BUCKET_COUNT:
+            index = _BUCKET_COUNT - 1
+
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: 'LatencyHistogram') -> None:
+        counts = self.counts
+        for i, c in enumerate(other.counts):
+            if c:
+                counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent: float) -> float:
+        """return the upper bound of bucket contains the given percentile, 0 if no latency is recorded"""
+        if self.count == 0:
+            return 0.0
+
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(self.max, self._upper_bound(i))
+        return self.max
+
+    def info(self) -> Dict:
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max
+        }
+
+    @staticmethod
+    def _upper_bound(index: int) -> float:
+        exponent, sub = divmod(index, _SUB_BUCKETS)
+        return math.ldexp(0.5 + (sub + 1) / (2 * _SUB_BUCKETS), exponent + _MIN_EXPONENT)
+
+
+class TaskMetrics():
+    """queue wait and execution time histograms, the executed and failed tasks since window_start"""
+    __slots__ = ('queue_wait', 'execution', 'exceptions', 'window_start')
+
+    def __init__(self):
+        self.queue_wait = LatencyHistogram()
+        self.execution = LatencyHistogram()
+        self.exceptions = 0
+        self.window_start = time.monotonic()
+
+    @property
+    def executed(self) -> int:
+        return self.execution.count
+
+    def record(self, queue_wait: float, execution: float, failed: bool = False) -> None:
+        self.queue_wait.record(queue_wait)
+        self.execution.record(execution)
+        if failed:
+            self.exceptions += 1
+
+    def merge(self, other: 'TaskMetrics') -> None:
+        self.queue_wait.merge(other.queue_wait)
+        self.execution.merge(other.execution)
+        self.exceptions += other.exceptions
+        self.window_start = min(self.window_start, other.window_start)
+
+    def info(self, now: float = None) -> Dict:
+        window = (now or time.monotonic()) - self.window_start
+        return {
+            'window_seconds': window,
+            'executed': self.executed,
+            'exceptions': self.exceptions,
+            'tasks_per_second': self.executed / window if window > 0 else 0.0,
+            'queue_wait': self.queue_wait.info(),
+            'execution': self.execution.info()
+        }
+
+    @classmethod
+    def merged(cls, metrics: Iterable['TaskMetrics'], window_start: float = None) -> 'TaskMetrics':
+        """return the new TaskMetrics merged from metrics, the window starts at window_start if specified"""
+        result = cls()
+        if window_start is not None:
+            result.window_start = window_start
+        for m in metrics:
+            result.merge(m)
+        return result
@@ -9,37 +9,97 @@ Last Updated:  Monday, 4th November 2019 by hsky77 (howardlkung@gmail.com)
 
 
 import time
+import math
 import asyncio
-from typing import Any, Callable, List, Dict
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Dict, Hashable, Iterable, Iterator, Tuple, Union
+from threading import Event, RLock
 from contextlib import contextmanager
-
-from .worker import FunctionQueueWorker
+from functools import partial
+from concurrent.futures import Future
+
+from .worker import FunctionQueueWorker, _QueuedTask
+from .cancellation import CancellationToken, TaskTimeoutException
+from .metrics import TaskMetrics
+from .backpressure import BackpressurePolicy, QueueFullException, _Admission
+from .reservation import _Reservations, _ReservationWaiter
+from .stream import _GeneratorStream
+from .singleflight import _SingleFlight, _start_task
+from .resource import _ResourceWorker
+from .limiter import AdaptiveLimit
 from ..asynccontextmanager import asynccontextmanager
 
 
 class PoolWorkerExecutor():
-    def __init__(self, worker: FunctionQueueWorker):
+    """
+    queue function to the worker and wait for the result,
+    the completion is signaled by threading.Event for sync callers and asyncio.Future for async callers
+
+    the function is cancelled if the caller is timed out or cancelled, see cancel()
+    """
+
+    def __init__(self, worker: FunctionQueueWorker, stealable: bool = False):
         self._worker = worker
+        self._stealable = stealable
         self._done = False
         self._exception = None
         self._result = None
-
-    def run_method(self, func: Callable, *args, **kwargs) -> Any:
-        self._done = False
-        self._worker.run_method(func, *args, on_finish=self._on_finish,
-                                on_exception=self._on_exception, **kwargs)
-        while not self._done:
-            time.sleep(0)
+        self._event = None
+        self._loop = None
+        self._future = None
+        self._task = None
+
+    def run_method(self, func: Callable, *args, timeout: float = None, **kwargs) -> Any:
+        self.queue_method(func, args, kwargs)
+        return self.wait(timeout)
+
+    async def run_method_async(self, func: Callable, *args, timeout: float = None, **kwargs) -> Any:
+        self.queue_method(func, args, kwargs, loop=asyncio.get_event_loop())
+        return await self.wait_async(timeout)
+
+    def queue_method(self, func: Callable, args: tuple, kwargs: dict, loop: asyncio.AbstractEventLoop = None) -> None:
+        """queue function without waiting, specify loop if the result will be awaited by wait_async()"""
+        self._reset()
+        if loop is None:
+            self._event = Event()
+        else:
+            self._loop = loop
+            self._future = loop.create_future()
+        self._queue_task(func, args, kwargs)
+
+    def wait(self, timeout: float = None) -> Any:
+        """block current thread until the queued function is done, raise TaskTimeoutException if timeout"""
+        if not self._event.wait(timeout) and not self._done:
+            self.cancel()
+            raise TaskTimeoutException(self._task.func, timeout)
         return self.get_result()
 
-    async def run_method_async(self, func: Callable, *args, **kwargs) -> Any:
-        self._done = False
-        self._worker.run_method(func, *args, on_finish=self._on_finish,
-                                on_exception=self._on_exception, **kwargs)
-        while not self._done:
-            await asyncio.sleep(0)
+    async def wait_async(self, timeout: float = None) -> Any:
+        """await until the queued function is done, raise TaskTimeoutException if timeout"""
+        try:
+            if timeout is None:
+                await self._future
+            else:
+                await asyncio.wait_for(self._future, timeout)
+        except asyncio.TimeoutError:
+            if not self._done:
+                self.cancel()
+                raise TaskTimeoutException(self._task.func, timeout) from None
+        except asyncio.CancelledError:
+            self.cancel()
+            raise
         return self.get_result()
 
+    def cancel(self) -> bool:
+        """
+        remove the queued function from worker and return True if it has not started,
+        otherwise the executing function gets cancelled token from get_cancellation_token()
+        """
+        if self._task is None or self._done:
+            return False
+
+        self._task.token.cancel()
+        return self._worker.remove_task(self._task)
+
     def get_result(self) -> Any:
         if self._done:
             if self._exception is not None:
@@ -48,124 +108,575 @@ class PoolWorkerExecutor():
                 return self._result
         return
 
+    def _queue_task(self, func: Callable, args: tuple, kwargs: dict) -> None:
+        if callable(func):
+            self._task = _QueuedTask(func, args, kwargs, self._on_finish, self._on_exception,
+                                     self._stealable, CancellationToken())
+            self._worker._queue_task(self._task)
+
+    def _reset(self) -> None:
+        self._done = False
+        self._exception = None
+        self._result = None
+        self._event = None
+        self._loop = None
+        self._future = None
+        self._task = None
+
     def _on_finish(self, result: Any) -> None:
         self._result = result
-        self._done = True
+        self._set_done()
 
     def _on_exception(self, e: Exception) -> None:
         self._exception = e
+        self._set_done()
+
+    def _set_done(self) -> None:
+        """called by worker thread"""
         self._done = True
+        if self._event is not None:
+            self._event.set()
+
+        if self._future is not None:
+            try:
+                self._loop.call_soon_threadsafe(
+                    self._resolve_future, self._future)
+            except RuntimeError:  # loop has been closed, nobody is waiting
+                pass
+
+    @staticmethod
+    def _resolve_future(future: asyncio.Future) -> None:
+        """called by event loop thread"""
+        if not future.done():
+            future.set_result(None)
+
+
+class _FutureCall():
+    """call the function if the future is not cancelled, then forward the result to the future"""
+    __slots__ = ('future', 'func')
+
+    def __init__(self, func: Callable):
+        self.future = Future()
+        self.func = func
+
+    def __call__(self, *args, **kwargs) -> Any:
+        if self.future.set_running_or_notify_cancel():
+            return self.func(*args, **kwargs)
+
+    def on_finish(self, result: Any) -> None:
+        if not self.future.done():
+            self.future.set_result(result)
+
+    def on_exception(self, e: Exception) -> None:
+        if not self.future.done():
+            self.future.set_exception(e)
+
+
+class _ChunkCall():
+    """call the chunk of functions in a single task, the arguments injected by worker are passed to each function"""
+    __slots__ = ('calls',)
+
+    def __init__(self, calls: List[Tuple[Callable, tuple]]):
+        self.calls = calls
+
+    def __call__(self, *args, **kwargs) -> List[Any]:
+        return [func(*args, *call_args, **kwargs) for func, call_args in self.calls]
+
+
+def _to_calls(calls: Iterable[Union[Callable, tuple]]) -> List[Tuple[Callable, tuple]]:
+    """convert function or tuple (func, *args) to tuple (func, args)"""
+    return [(c[0], tuple(c[1:])) if isinstance(c, tuple) else (c, ()) for c in calls]
+
+
+async def _gather_chunks_async(run_method_async: Callable[..., Awaitable], calls: List[Tuple[Callable, tuple]],
+                               chunksize: int, worker_limit: int, ordered: bool) -> List[Any]:
+    """execute the chunks of calls and return the results in order or as the chunks complete"""
+    if not calls:
+        return []
+
+    if chunksize is None:  # split calls into 4 chunks per worker to balance the uneven functions
+        chunksize = math.ceil(len(calls) / (worker_limit * 4))
+    chunksize = max(1, chunksize)
+
+    futures = [run_method_async(_ChunkCall(calls[i:i + chunksize]))
+               for i in range(0, len(calls), chunksize)]
+
+    results = []
+    if ordered:
+        for chunk in await asyncio.gather(*futures):
+            results.extend(chunk)
+    else:
+        for future in asyncio.as_completed(futures):
+            results.extend(await future)
+    return results
 
 
 class WorkerPool():
+    """
+    pool of FunctionQueueWorker, the functions without identity are queued to the worker with the least pending tasks
+
+    work_stealing: the idle workers take the queued functions without identity from the busiest worker,
+        the functions with identity always run in the reserved worker
+
+    the pool is elastic between min_workers and worker_limit (the maximum):
+        - a new worker is spawned when every worker is busy and the earliest queued function
+          of the least loaded worker has been waiting for at least scale_up_wait seconds
+        - a worker without reservation retires when it has been idle for idle_timeout seconds
+          and the pool has more than min_workers, the workers never retire if idle_timeout is None
+
+    max_pending: the maximum of pending functions of all workers, unlimited if None,
+        the backpressure policy decides what happens when the pool is full, see BackpressurePolicy
+
+    timeout: the function is removed from the queue if it has not started in timeout seconds,
+        the executing function could check get_cancellation_token() to stop early
+
+    info() shows the queue wait and execution time percentiles, tasks per second and exceptions
+    since the last reset_metrics(), the metrics of retired workers are kept
+
+    reserve_worker() waits without spinning in FIFO order when every worker is reserved,
+    the released worker is handed off to the first waiter
+
+    dedupe_key: the concurrent calls with the same dedupe_key share one execution and its result or exception,
+        info() counts the deduplicated calls
+
+    resource_factory: each worker creates its resource when the first function runs, the resource is passed as
+        the first argument of functions, resource_dispose(resource) is called when the worker stops or retires
+
+    health_check: health_check(resource) returns False or raises if the resource is broken, check_resources() broadcasts it
+        and the broken resources are created again by the next functions, it is also broadcast every health_check_interval seconds
+
+    adaptive_limit: AdaptiveLimit, the dict of its parameters or True, adjusts max_pending by the execution time of functions,
+        the limit is between min_limit and max_limit which is max_pending or worker_limit by default
+    """
     KEY_IDENTITY = 'identity'
     KEY_WORKER = 'worker'
 
-    def __init__(self, pool_name: str = None, worker_limit: int = 4):
+    def __init__(self, pool_name: str = None, worker_limit: int = 4, work_stealing: bool = False,
+                 min_workers: int = 0, idle_timeout: float = None, scale_up_wait: float = 0,
+                 max_pending: int = None, backpressure: Union[BackpressurePolicy, str] = BackpressurePolicy.Block,
+                 resource_factory: Callable[[], Any] = None, resource_dispose: Callable[[Any], None] = None,
+                 health_check: Callable[[Any], bool] = None, health_check_interval: float = None,
+                 adaptive_limit: Union[AdaptiveLimit, Dict, bool] = None):
         self._pool_name = pool_name or type(self).__name__
         self._q = []
-        self.__worker_limit = worker_limit
+        self._lock = RLock()
+        self.__worker_limit = max(1, worker_limit)
         self.__disposing = False
+        self._work_stealing = work_stealing
+        self._min_workers = min(max(0, min_workers), self.__worker_limit)
+        self._idle_timeout = idle_timeout
+        self._scale_up_wait = scale_up_wait
+        self._created_count = 0
+        self._adaptive_limit = self._create_adaptive_limit(adaptive_limit, max_pending)
+        if self._adaptive_limit is not None:
+            max_pending = self._adaptive_limit.limit
+        self._admission = _Admission(self._pool_name, max_pending, backpressure)
+        self._timed_out_count = 0
+        self._cancelled_count = 0
+        self._retired_metrics = TaskMetrics()
+        self._reservations = _Reservations(self.KEY_IDENTITY)
+        self._single_flight = _SingleFlight()
+        self._resource_factory = resource_factory
+        self._resource_dispose = resource_dispose
+        self._health_check = health_check
+        self._health_check_job = None
+        if resource_factory is not None and health_check is not None and health_check_interval:
+            from .scheduler import get_scheduler
+            self._health_check_job = get_scheduler().schedule(self.check_resources, delay=health_check_interval,
+                                                              interval=health_check_interval, timeout=health_check_interval)
 
     @property
     def workers(self) -> List[FunctionQueueWorker]:
         return [w[self.KEY_WORKER] for w in self._q]
 
+    @property
+    def worker_limit(self) -> int:
+        return self.__worker_limit
+
     def dispose(self) -> None:
-        self.__disposing = True
+        if self._health_check_job is not None:
+            self._health_check_job.cancel()
+
+        with self._lock:
+            self.__disposing = True
+            self._reservations.wake_all()
 
-        for w in self._q:
-            w[self.KEY_WORKER].dispose()
+            for w in self._q:
+                w[self.KEY_WORKER].dispose()
 
     def info(self) -> Dict:
         """return the dict show the current condition of this pool"""
-        return [{
-            'name': w[self.KEY_WORKER].name,
-            'identity': w[self.KEY_IDENTITY],
-            'pending_task': w[self.KEY_WORKER].pending_count
-        } for w in self._q]
-
-    def run_method(self, func: Callable, *args, identity: str = None, **kwargs) -> Any:
-        """execute function, note this causes current thread blocking"""
-        executor = self._get_free_executor(identity=identity)
-        return executor.run_method(func, *args, **kwargs)
-
-    def broadcast_method(self, func_name: str, *args, **kwargs) -> List[Any]:
-        """use this function to force each worker execute some function if it has such as release or refresh resources"""
-        results = []
-        identity = self._get_identity()
-        for iw in self._q:
-            while iw[self.KEY_WORKER].pending_count > 0:
-                time.sleep(0)
-            iw[self.KEY_IDENTITY] = identity
-            if hasattr(iw[self.KEY_WORKER], func_name):
-                pool_worker = PoolWorkerExecutor(iw[self.KEY_WORKER])
-                results.append(pool_worker.run_method(
-                    getattr(iw[self.KEY_WORKER], func_name), *args, **kwargs))
+        with self._lock:
+            return {
+                'size': len(self._q),
+                'min_workers': self._min_workers,
+                'max_workers': self.__worker_limit,
+                'idle_timeout': self._idle_timeout,
+                'scale_up_wait': self._scale_up_wait,
+                **self._admission.info(),
+                'timed_out': self._timed_out_count,
+                'cancelled': self._cancelled_count,
+                **self._reservations.info(),
+                **self._single_flight.info(),
+                'adaptive_limit': None if self._adaptive_limit is None else self._adaptive_limit.info(),
+                'metrics': self.get_metrics().info(),
+                'workers': [{
+                    'name': w[self.KEY_WORKER].name,
+                    'identity': w[self.KEY_IDENTITY],
+                    'pending_task': w[self.KEY_WORKER].pending_count
+                } for w in self._q]
+            }
+
+    def get_metrics(self) -> TaskMetrics:
+        """return the metrics merged from the workers in current window"""
+        with self._lock:
+            return TaskMetrics.merged([self._retired_metrics] + [w.metrics for w in self.workers],
+                                      self._retired_metrics.window_start)
+
+    def reset_metrics(self) -> TaskMetrics:
+        """start a new metrics window and return the metrics of the ended one"""
+        with self._lock:
+            retired, self._retired_metrics = self._retired_metrics, TaskMetrics()
+            return TaskMetrics.merged([retired] + [w.reset_metrics() for w in self.workers],
+                                      retired.window_start)
+
+    def run_method(self, func: Callable, *args, identity: str = None, timeout: float = None,
+                   dedupe_key: Hashable = None, **kwargs) -> Any:
+        """execute function, note this causes current thread blocking, raise TaskTimeoutException if timeout"""
+        if dedupe_key is not None:
+            return self._single_flight.run(dedupe_key, lambda: self.submit(func, *args, identity=identity, **kwargs),
+                                           func, timeout, self._count_cancelled)
+
+        executor = None
+
+        def enqueue():
+            nonlocal executor
+            executor = self._get_free_executor(identity=identity)
+            executor.queue_method(func, args, kwargs)
+
+        if not self._admission.admit(self._lock, self._get_pending_count, self._drop_oldest, enqueue):
+            return self._run_in_caller(func, args, kwargs, identity)
 
-        for iw in self._q:
-            iw[self.KEY_IDENTITY] = None
-        return results
+        try:
+            return executor.wait(timeout)
+        except TaskTimeoutException:
+            self._count_cancelled(timed_out=True)
+            raise
+
+    def submit(self, func: Callable, *args, identity: str = None, **kwargs) -> Future:
+        """
+        queue function and return concurrent.futures.Future of the result, the caller blocks only if backpressure is block,
+        the function is removed from the queue if the future is cancelled
+        """
+        call = _FutureCall(func)
+
+        def enqueue():
+            worker = self._get_free_worker(identity=identity)
+            if worker is None:
+                raise RuntimeError(
+                    '{} has been disposed'.format(self._pool_name))
+            task = _QueuedTask(call, args, kwargs, call.on_finish,
+                               call.on_exception, identity is None)
+            worker._queue_task(task)
+            call.future.add_done_callback(
+                lambda f: f.cancelled() and self._remove_task(task))
+
+        if not self._admission.admit(self._lock, self._get_pending_count, self._drop_oldest, enqueue):
+            try:
+                call.on_finish(self._run_in_caller(call, args, kwargs, identity))
+            except Exception as e:
+                call.on_exception(e)
+        return call.future
+
+    def broadcast_method(self, func_name: str, *args, timeout: float = None, **kwargs) -> List[Any]:
+        """
+        use this function to force each worker execute some function if it has such as release or refresh resources
+
+        the function is queued to all workers at once behind their queued functions, so the workers execute it concurrently,
+        raise TaskTimeoutException if any of them does not complete in timeout seconds
+        """
+        executors = self._queue_broadcast(func_name, args, kwargs)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            return [e.wait(None if deadline is None else max(0, deadline - time.monotonic()))
+                    for e in executors]
+        except TaskTimeoutException:
+            for e in executors:
+                e.cancel()
+            self._count_cancelled(timed_out=True)
+            raise TaskTimeoutException(func_name, timeout) from None
+
+    def refresh_resources(self, timeout: float = None) -> None:
+        """dispose the resources of workers after their queued functions, the next functions create new ones"""
+        self.broadcast_method('dispose_resource', timeout=timeout)
+
+    def check_resources(self, timeout: float = None) -> List[bool]:
+        """broadcast health_check to the workers, the broken resources are disposed, return whether each resource is healthy"""
+        return self.broadcast_method('check_resource', timeout=timeout)
 
     @contextmanager
     def reserve_worker(self):
         """use with clause to reserve the same worker for execute multiple functions"""
+        identity = self._get_identity()
+        waiter = self._reserve_worker(identity)
         try:
-            identity = self._get_identity()
-            while not self._reserve_worker(identity):
-                time.sleep(0)
+            if waiter is not None:
+                waiter.event.wait()
+                self._check_granted(waiter)
             yield identity
         finally:
-            self._cancel_reservation(identity)
+            self._cancel_reservation(identity, waiter)
+
+    def _set_worker_limit(self, worker_limit: int) -> None:
+        """called by subclass to limit the workers, the idle workers without reservation exceeding the limit are disposed"""
+        with self._lock:
+            self.__worker_limit = max(1, worker_limit)
+            self._min_workers = min(self._min_workers, self.__worker_limit)
+            for iw in list(self._q):
+                if len(self._q) <= self.__worker_limit:
+                    break
+                if iw[self.KEY_IDENTITY] is None and iw[self.KEY_WORKER].pending_count == 0:
+                    self._q.remove(iw)
+                    self._retired_metrics.merge(iw[self.KEY_WORKER].metrics)
+                    iw[self.KEY_WORKER].dispose()
 
     def _get_free_executor(self, identity: str = None) -> PoolWorkerExecutor:
         """getting a worker is free to execute function, also reserve worker if identity is specified"""
-        if self.__disposing:
-            return None
-
+        worker = self._get_free_worker(identity=identity)
+        return PoolWorkerExecutor(worker, stealable=identity is None) if worker else None
+
+    def _get_free_worker(self, identity: str = None) -> FunctionQueueWorker:
+        """return the worker reserved with identity, or the unreserved worker if identity is not reserved"""
+        with self._lock:
+            if self.__disposing:
+                return None
+
+            if identity is not None:
+                reserved = self._reservations.get(identity)
+                if reserved is not None:
+                    return reserved[self.KEY_WORKER]
+
+            free_worker = self._get_least_pending_worker()
+            if len(self._q) < self.__worker_limit and self._should_scale_up(free_worker):
+                return self._spawn_worker()
+            return free_worker
+
+    def _get_least_pending_worker(self) -> FunctionQueueWorker:
+        """return the unreserved worker with the least pending functions or None"""
         worker = None
-        for exe in self._q:
-            if identity is not None and identity is exe[self.KEY_IDENTITY]:
-                worker = exe[self.KEY_WORKER]
+        for iw in self._q:
+            if iw[self.KEY_IDENTITY] is None:
+                if worker is None or worker.pending_count > iw[self.KEY_WORKER].pending_count:
+                    worker = iw[self.KEY_WORKER]
+        return worker
+
+    def _should_scale_up(self, free_worker: FunctionQueueWorker) -> bool:
+        if len(self._q) < self._min_workers or free_worker is None:
+            return True
+
+        return free_worker.pending_count > 0 and free_worker.waiting_time >= self._scale_up_wait
+
+    def _spawn_worker(self, identity: str = None) -> FunctionQueueWorker:
+        worker = self._create_worker(
+            '{}_{}'.format(self._pool_name, self._created_count))
+        self._created_count += 1
+        if self._work_stealing:
+            worker.set_work_stealing(self._steal_task, self._notify_backlog)
+        if self._idle_timeout is not None:
+            worker.set_idle_retirement(self._idle_timeout, self._retire_worker)
+        if self._admission.max_pending is not None:
+            worker.set_task_done_callback(self._on_task_done)
+        self._q.append({self.KEY_IDENTITY: identity,
+                        self.KEY_WORKER: worker})
+        return worker
+
+    def _retire_worker(self, worker: FunctionQueueWorker) -> bool:
+        """called by idle worker thread, remove worker from pool and return True if it should stop"""
+        with self._lock:
+            if self.__disposing or len(self._q) <= self._min_workers:
+                return False
+
+            for i, iw in enumerate(self._q):
+                if iw[self.KEY_WORKER] is worker:
+                    if iw[self.KEY_IDENTITY] is None and worker.pending_count == 0:
+                        del self._q[i]
+                        self._retired_metrics.merge(worker.metrics)
+                        worker.dispose()
+                        self._reservations.hand_off(self._get_reservable_entry)
+                        return True
+                    break
+            return False
+
+    def _get_pending_count(self) -> int:
+        return sum(w[self.KEY_WORKER].pending_count for w in self._q)
+
+    def _drop_oldest(self) -> bool:
+        """
+        drop the earliest queued function of the workers without reservation, the dropped function raises QueueFullException,
+        the caller blocks if there is nothing to drop since the functions of reservations keep their order
+        """
+        workers = [iw[self.KEY_WORKER] for iw in self._q if iw[self.KEY_IDENTITY] is None]
+        task = None
+        for worker in sorted(workers, key=lambda w: w.waiting_time, reverse=True):
+            task = worker.drop_task()
+            if task is not None:
+                break
+        if task is None:
+            return False
+
+        if callable(task.on_exception):
+            task.on_exception(QueueFullException(
+                self._pool_name, self._admission.max_pending))
+        return True
+
+    def _remove_task(self, task: _QueuedTask) -> None:
+        """remove the function of cancelled future from the worker queue"""
+        for worker in self.workers:
+            if worker.remove_task(task):
                 break
+        self._count_cancelled()
 
-        if worker is None:
-            if len(self._q) < self.__worker_limit:
-                worker = self._create_worker(
-                    '{}_{}'.format(self._pool_name, len(self._q)))
-                self._q.append({self.KEY_IDENTITY: identity,
-                                self.KEY_WORKER: worker})
+    def _count_cancelled(self, timed_out: bool = False) -> None:
+        """the cancelled function might be removed from queue, let the blocked caller queue function"""
+        with self._lock:
+            if timed_out:
+                self._timed_out_count += 1
             else:
-                m = None
-                index = -1
-                for i in range(len(self._q)):
-                    if self._q[i][self.KEY_IDENTITY] is None:
-                        if m is None:
-                            m = self._q[i][self.KEY_WORKER].pending_count
-                            index = i
-                        else:
-                            if m > self._q[i][self.KEY_WORKER].pending_count:
-                                m = self._q[i][self.KEY_WORKER].pending_count
-                                index = i
-                if index > -1:
-                    worker = self._q[index][self.KEY_WORKER]
-
-        return PoolWorkerExecutor(worker) if worker else None
+                self._cancelled_count += 1
+            self._admission.notify(self._get_pending_count())
+
+    def _on_task_done(self, worker: FunctionQueueWorker) -> None:
+        """called by worker thread, adjust the adaptive limit and let the blocked caller queue function"""
+        with self._lock:
+            pending = self._get_pending_count()
+            if self._adaptive_limit is not None and worker.last_execution_time is not None:
+                saturated = len(self._admission.waiters) > 0 or pending + 1 >= self._admission.max_pending
+                if self._adaptive_limit.record(worker.last_execution_time, saturated):
+                    self._admission.max_pending = self._adaptive_limit.limit
+            self._admission.notify(pending)
+
+    def _create_adaptive_limit(self, adaptive_limit: Union[AdaptiveLimit, Dict, bool, None],
+                               max_pending: int = None) -> AdaptiveLimit:
+        if not adaptive_limit:
+            return None
+        if isinstance(adaptive_limit, dict):
+            adaptive_limit = AdaptiveLimit(**adaptive_limit)
+        elif not isinstance(adaptive_limit, AdaptiveLimit):
+            adaptive_limit = AdaptiveLimit()
+        adaptive_limit.set_range(max_pending or self.__worker_limit)
+        return adaptive_limit
+
+    def _queue_broadcast(self, func_name: str, args: tuple, kwargs: dict,
+                         loop: asyncio.AbstractEventLoop = None) -> List[PoolWorkerExecutor]:
+        """queue the method named func_name of each worker as the last one of its queue, workers cannot retire meanwhile"""
+        executors = []
+        with self._lock:
+            for worker in self.workers:
+                method = getattr(worker, func_name, None)
+                if callable(method):
+                    executor = PoolWorkerExecutor(worker)
+                    executor.queue_method(method, args, kwargs, loop=loop)
+                    executors.append(executor)
+        return executors
+
+    def _steal_task(self, thief: FunctionQueueWorker) -> _QueuedTask:
+        """called by idle worker thread to take a stealable task from the busiest worker"""
+        victims = sorted([w for w in self.workers if w is not thief and w.pending_count > 1],
+                         key=lambda w: w.pending_count, reverse=True)
+        for victim in victims:
+            task = victim.steal_task()
+            if task is not None:
+                return task
+
+    def _notify_backlog(self, busy_worker: FunctionQueueWorker) -> None:
+        """called when a stealable task is queued behind the others, wake up an idle worker to steal it"""
+        for worker in self.workers:
+            if worker is not busy_worker and worker.pending_count == 0:
+                worker.wakeup()
+                break
 
     def _get_identity(self) -> str:
         from ..utils import generate_base64_uid
         return generate_base64_uid()
 
-    def _reserve_worker(self, identity: str) -> bool:
-        return self._get_free_executor(identity=identity) is not None
+    def _reserve_worker(self, identity: str, loop: asyncio.AbstractEventLoop = None) -> _ReservationWaiter:
+        """reserve worker with identity, return the waiter if the caller has to wait for a released worker"""
+        with self._lock:
+            if self.__disposing:
+                raise RuntimeError(
+                    '{} has been disposed'.format(self._pool_name))
+
+            if not self._reservations.waiters:  # first come first served
+                entry = self._get_reservable_entry()
+                if entry is not None:
+                    self._reservations.bind(identity, entry)
+                    return None
+            return self._reservations.add_waiter(identity, loop)
+
+    def _check_granted(self, waiter: _ReservationWaiter) -> None:
+        if not waiter.granted:
+            raise RuntimeError(
+                '{} has been disposed'.format(self._pool_name))
+
+    def _get_reservable_entry(self) -> Dict:
+        """called with lock, spawn worker if pool is not full, otherwise return the unreserved entry with the least pending functions"""
+        if self.__disposing:
+            return None
+
+        if len(self._q) < self.__worker_limit:
+            self._spawn_worker()
+            return self._q[-1]
+
+        entries = [iw for iw in self._q if iw[self.KEY_IDENTITY] is None]
+        return min(entries, key=lambda iw: iw[self.KEY_WORKER].pending_count, default=None)
 
-    def _cancel_reservation(self, identity: str) -> None:
+    def _cancel_reservation(self, identity: str, waiter: _ReservationWaiter = None) -> None:
+        """release the worker reserved with identity and hand it off to the first waiter"""
+        with self._lock:
+            if waiter is not None:
+                self._reservations.remove_waiter(waiter)
+
+            self._reservations.release(identity)
+            self._reservations.hand_off(self._get_reservable_entry)
+
+    @contextmanager
+    def _caller_context(self):
+        """yield the tuple of arguments the worker injects before the arguments of function, for the caller runs the function"""
+        if self._resource_factory is None:
+            yield ()
+            return
+
+        resource = self._resource_factory()
+        try:
+            yield (resource,)
+        finally:
+            if self._resource_dispose is not None:
+                self._resource_dispose(resource)
+
+    def _run_in_caller(self, func: Callable, args: tuple, kwargs: dict, identity: str = None) -> Any:
+        """
+        execute function in the caller thread by BackpressurePolicy.CallerRuns with a temporary resource of worker,
+        the function of reservation is rejected since it should run in the reserved worker after the queued ones
+        """
         if identity is not None:
-            for i in range(0, len(self._q)):
-                if identity is self._q[i][self.KEY_IDENTITY]:
-                    self._q[i][self.KEY_IDENTITY] = None
+            with self._lock:
+                self._admission.reject_caller_run()
+
+        with self._caller_context() as injected:
+            return func(*injected, *args, **kwargs)
+
+    def _iterate_in_caller(self, gen_func: Callable[..., Iterator], args: tuple, kwargs: dict, identity: str = None) -> Iterator:
+        """the same as _run_in_caller() but yield the items of generator"""
+        if identity is not None:
+            with self._lock:
+                self._admission.reject_caller_run()
+
+        with self._caller_context() as injected:
+            yield from gen_func(*injected, *args, **kwargs)
 
     def _create_worker(self, name: str) -> FunctionQueueWorker:
+        if self._resource_factory is not None:
+            return _ResourceWorker(name, self._resource_factory, self._resource_dispose, self._health_check)
         return FunctionQueueWorker(name=name)
 
 
@@ -174,32 +685,126 @@ class AsyncWorkerPool(WorkerPool):
     @asynccontextmanager
     async def reserve_worker_async(self) -> str:
         """use with clause to reserve the same worker for execute multiple functions"""
+        identity = self._get_identity()
+        waiter = self._reserve_worker(identity, asyncio.get_event_loop())
         try:
-            identity = self._get_identity()
-            while not self._reserve_worker(identity):
-                await asyncio.sleep(0)
-
+            if waiter is not None:
+                await waiter.future
+                self._check_granted(waiter)
             yield identity
         finally:
-            self._cancel_reservation(identity)
+            self._cancel_reservation(identity, waiter)
 
-    async def run_method_async(self, func: Callable, *args, identity: str = None, **kwargs) -> Any:
-        executor = self._get_free_executor(identity=identity)
-        return await executor.run_method_async(func, *args, **kwargs)
+    async def run_method_async(self, func: Callable, *args, identity: str = None, timeout: float = None,
+                               dedupe_key: Hashable = None, **kwargs) -> Any:
+        """
+        execute function, the caller awaits if the pool is full and backpressure is block
 
-    async def broadcast_method_async(self, func_name: str, *args, **kwargs) -> List[Any]:
-        """use this function to force each worker execute some function if it has such as release or refresh resources"""
-        results = []
-        identity = self._get_identity()
-        for iw in self._q:
-            while iw[self.KEY_WORKER].pending_count > 0:
-                asyncio.sleep(0)
-            iw[self.KEY_IDENTITY] = identity
-            if hasattr(iw[self.KEY_WORKER], func_name):
-                pool_worker = PoolWorkerExecutor(iw[self.KEY_WORKER])
-                results.append(await pool_worker.run_method_async(
-                    getattr(iw[self.KEY_WORKER], func_name), *args, **kwargs))
+        timeout: raise TaskTimeoutException if the function does not complete in timeout seconds,
+            the function is also cancelled if the awaiting coroutine is cancelled
 
-        for iw in self._q:
-            iw[self.KEY_IDENTITY] = None
-        return results
+        dedupe_key: share the execution with the concurrent calls of the same key, the execution is cancelled
+            only if every caller stops waiting
+        """
+        if dedupe_key is not None:
+            def start():
+                return _start_task(self._execute_async(func, args, kwargs, identity))
+
+            return await self._single_flight.run_async(dedupe_key, start, func, timeout, self._count_cancelled)
+
+        try:
+            return await self._execute_async(func, args, kwargs, identity, timeout)
+        except TaskTimeoutException:
+            self._count_cancelled(timed_out=True)
+            raise
+        except asyncio.CancelledError:
+            self._count_cancelled()
+            raise
+
+    async def _execute_async(self, func: Callable, args: tuple, kwargs: dict, identity: str = None, timeout: float = None) -> Any:
+        executor = None
+
+        def enqueue():
+            nonlocal executor
+            executor = self._get_free_executor(identity=identity)
+            executor.queue_method(func, args, kwargs,
+                                  loop=asyncio.get_event_loop())
+
+        if not await self._admission.admit_async(self._lock, self._get_pending_count, self._drop_oldest, enqueue):
+            # caller runs in the default executor of loop instead of blocking the loop
+            return await asyncio.get_event_loop().run_in_executor(
+                None, partial(self._run_in_caller, func, args, kwargs, identity))
+
+        return await executor.wait_async(timeout)
+
+    async def iterate_async(self, gen_func: Callable[..., Iterator], *args, buffer: int = 64,
+                            identity: str = None, **kwargs) -> AsyncIterator:
+        """
+        iterate the generator returned by gen_func in worker thread and yield its items to async for
+
+        buffer: the maximum of items iterated ahead of the consumer, the worker thread waits while the buffer is full
+        """
+        loop = asyncio.get_event_loop()
+        stream = _GeneratorStream(gen_func, args, kwargs, buffer, loop)
+        executor = None
+
+        def enqueue():
+            nonlocal executor
+            executor = self._get_free_executor(identity=identity)
+            executor.queue_method(stream, (), {}, loop=loop)
+
+        if not await self._admission.admit_async(self._lock, self._get_pending_count, self._drop_oldest, enqueue):
+            # caller runs, the generator is iterated in the default executor of loop instead of blocking the loop
+            gen = self._iterate_in_caller(gen_func, args, kwargs, identity)
+            done = object()
+            try:
+                while True:
+                    item = await loop.run_in_executor(None, next, gen, done)
+                    if item is done:
+                        break
+                    yield item
+            finally:
+                await loop.run_in_executor(None, gen.close)
+            return
+
+        try:
+            while True:
+                try:
+                    item = await stream.get()
+                except StopAsyncIteration:
+                    break
+                yield item
+        finally:
+            stream.close()
+            executor.cancel()
+
+    async def map_async(self, func: Callable, iterable: Iterable, chunksize: int = None, ordered: bool = True) -> List[Any]:
+        """
+        execute func with each item of iterable in chunks, each chunk is a single task of worker
+
+        chunksize: number of items per chunk, default: split items into 4 chunks per worker
+        ordered: return the results in the order of iterable, or in the order of completed chunks
+        """
+        return await self.gather_async([(func, item) for item in iterable], chunksize=chunksize, ordered=ordered)
+
+    async def gather_async(self, calls: Iterable[Union[Callable, tuple]], chunksize: int = None, ordered: bool = True) -> List[Any]:
+        """execute the list of function or tuple (func, *args) in chunks, the parameters are the same as map_async()"""
+        return await _gather_chunks_async(self.run_method_async, _to_calls(calls), chunksize, self.worker_limit, ordered)
+
+    async def refresh_resources_async(self, timeout: float = None) -> None:
+        """the same as refresh_resources() but await the workers"""
+        await self.broadcast_method_async('dispose_resource', timeout=timeout)
+
+    async def check_resources_async(self, timeout: float = None) -> List[bool]:
+        """the same as check_resources() but await the workers"""
+        return await self.broadcast_method_async('check_resource', timeout=timeout)
+
+    async def broadcast_method_async(self, func_name: str, *args, timeout: float = None, **kwargs) -> List[Any]:
+        """the same as broadcast_method() but await the workers"""
+        executors = self._queue_broadcast(
+            func_name, args, kwargs, loop=asyncio.get_event_loop())
+        try:
+            return await asyncio.wait_for(asyncio.gather(*[e.wait_async() for e in executors]), timeout)
+        except asyncio.TimeoutError:
+            self._count_cancelled(timed_out=True)
+            raise TaskTimeoutException(func_name, timeout) from None
@@ -0,0 +1,181 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+ProcessWorkerPool executes the cpu bound functions in worker processes to avoid GIL contention
+
+    - the function, arguments and result must be picklable, the function should be defined in module level
+    - the worker processes are restarted if any of them crashed
+'''
+
+import pickle
+import asyncio
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Tuple, Union
+from threading import Lock
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from .pool import _to_calls, _gather_chunks_async
+from .cancellation import TaskTimeoutException
+from .singleflight import _SingleFlight
+from ..localization import LocalizedMessageException
+from ..constants import LocalCode_Not_Picklable
+
+
+class ProcessWorkerPool():
+    """
+    pool of worker processes, the interface is compatible with the run_method() and run_method_async() of AsyncWorkerPool
+
+    timeout: the function is cancelled if it has not started in timeout seconds,
+        the executing function is not interrupted since cancellation token is not shared with worker process
+
+    dedupe_key: the concurrent calls with the same dedupe_key share one execution, see WorkerPool
+    """
+
+    def __init__(self, pool_name: str = None, worker_limit: int = 4):
+        self._pool_name = pool_name or type(self).__name__
+        self.__worker_limit = max(1, worker_limit)
+        self.__disposing = False
+        self._executor = None
+        self._lock = Lock()
+        self._pending = 0
+        self._restart_count = 0
+        self._timed_out_count = 0
+        self._cancelled_count = 0
+        self._single_flight = _SingleFlight()
+
+    @property
+    def worker_limit(self) -> int:
+        return self.__worker_limit
+
+    def dispose(self) -> None:
+        with self._lock:
+            self.__disposing = True
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def info(self) -> Dict:
+        """return the dict show the current condition of this pool"""
+        return {
+            'type': 'process',
+            'max_workers': self.__worker_limit,
+            'pending_task': self._pending,
+            'restart_count': self._restart_count,
+            'timed_out': self._timed_out_count,
+            'cancelled': self._cancelled_count,
+            **self._single_flight.info()
+        }
+
+    def run_method(self, func: Callable, *args, timeout: float = None, dedupe_key: Hashable = None, **kwargs) -> Any:
+        """execute function in worker process, note this causes current thread blocking, raise TaskTimeoutException if timeout"""
+        if dedupe_key is not None:
+            return self._single_flight.run(dedupe_key, lambda: self.submit(func, *args, **kwargs),
+                                           func, timeout, self._count_cancelled)
+
+        executor, future = self._submit(func, args, kwargs)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self._count_cancelled(timed_out=True)
+            raise TaskTimeoutException(func, timeout) from None
+        except BrokenProcessPool:
+            self._restart(executor)
+            raise
+
+    async def run_method_async(self, func: Callable, *args, timeout: float = None, dedupe_key: Hashable = None, **kwargs) -> Any:
+        if dedupe_key is not None:
+            return await self._single_flight.run_async(dedupe_key, lambda: self.submit(func, *args, **kwargs),
+                                                       func, timeout, self._count_cancelled)
+
+        executor, future = self._submit(func, args, kwargs)
+        try:
+            if timeout is None:
+                return await asyncio.wrap_future(future)
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            self._count_cancelled(timed_out=True)
+            raise TaskTimeoutException(func, timeout) from None
+        except asyncio.CancelledError:
+            self._count_cancelled()
+            raise
+        except BrokenProcessPool:
+            self._restart(executor)
+            raise
+
+    async def map_async(self, func: Callable, iterable: Iterable, chunksize: int = None, ordered: bool = True) -> List[Any]:
+        """execute func with each item of iterable in chunks, see AsyncWorkerPool.map_async()"""
+        return await self.gather_async([(func, item) for item in iterable], chunksize=chunksize, ordered=ordered)
+
+    async def gather_async(self, calls: Iterable[Union[Callable, tuple]], chunksize: int = None, ordered: bool = True) -> List[Any]:
+        """execute the list of function or tuple (func, *args) in chunks, see AsyncWorkerPool.gather_async()"""
+        return await _gather_chunks_async(self.run_method_async, _to_calls(calls), chunksize, self.worker_limit, ordered)
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        """queue function without blocking, return concurrent.futures.Future of the result"""
+        executor, future = self._submit(func, args, kwargs)
+
+        def on_done(f: Future) -> None:
+            if not f.cancelled() and isinstance(f.exception(), BrokenProcessPool):
+                self._restart(executor)
+
+        future.add_done_callback(on_done)
+        return future
+
+    def _submit(self, func: Callable, args: tuple, kwargs: dict) -> Tuple[ProcessPoolExecutor, Future]:
+        try:
+            pickle.dumps((func, args, kwargs), pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            raise LocalizedMessageException(
+                LocalCode_Not_Picklable, getattr(func, '__qualname__', func), e) from e
+
+        executor = self._get_executor()
+        try:
+            future = executor.submit(func, *args, **kwargs)
+        except BrokenProcessPool:  # crashed by the other function, retry with the restarted processes
+            self._restart(executor)
+            executor = self._get_executor()
+            future = executor.submit(func, *args, **kwargs)
+
+        with self._lock:
+            self._pending += 1
+        future.add_done_callback(self._on_done)
+        return executor, future
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self.__disposing:
+                raise RuntimeError(
+                    '{} has been disposed'.format(self._pool_name))
+
+            if self._executor is None:
+                self._executor = self._create_executor()
+            return self._executor
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.__worker_limit)
+
+    def _restart(self, broken_executor: ProcessPoolExecutor) -> None:
+        """drop the broken executor, the worker processes are recreated when the next function is submitted"""
+        with self._lock:
+            if self._executor is not broken_executor:  # restarted already
+                return
+            self._executor = None
+            self._restart_count += 1
+
+        broken_executor.shutdown(wait=False)
+
+    def _count_cancelled(self, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self._timed_out_count += 1
+            else:
+                self._cancelled_count += 1
+
+    def _on_done(self, future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
@@ -0,0 +1,93 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+worker reservation of WorkerPool
+
+    - the reserved workers are indexed by identity
+    - the callers wait in FIFO order without spinning when every worker is reserved,
+      the released worker is handed off to the first waiter directly
+'''
+
+import asyncio
+from collections import deque
+from typing import Callable, Dict
+
+from .backpressure import _Waiter
+
+
+class _ReservationWaiter(_Waiter):
+    """the caller waits for a worker reserved with identity, granted is set when the worker is handed off"""
+    __slots__ = ('identity', 'granted')
+
+    def __init__(self, identity: str, loop: asyncio.AbstractEventLoop = None):
+        super().__init__(loop)
+        self.identity = identity
+        self.granted = False
+        self.reset()
+
+
+class _Reservations():
+    """
+    identity to the reserved worker entry of pool and the FIFO waiters,
+    the methods are called with the lock of pool
+    """
+
+    def __init__(self, key_identity: str):
+        self.key_identity = key_identity
+        self.reserved: Dict[str, Dict] = {}
+        self.waiters = deque()
+        self.waited = 0
+
+    def info(self) -> Dict:
+        return {
+            'reserved': len(self.reserved),
+            'reservation_waiting': len(self.waiters),
+            'reservation_waited': self.waited
+        }
+
+    def get(self, identity: str) -> Dict:
+        return self.reserved.get(identity)
+
+    def bind(self, identity: str, entry: Dict) -> None:
+        entry[self.key_identity] = identity
+        self.reserved[identity] = entry
+
+    def release(self, identity: str) -> bool:
+        """unbind the worker reserved with identity, return True if it is reserved"""
+        entry = self.reserved.pop(identity, None)
+        if entry is not None:
+            entry[self.key_identity] = None
+            return True
+        return False
+
+    def add_waiter(self, identity: str, loop: asyncio.AbstractEventLoop = None) -> _ReservationWaiter:
+        waiter = _ReservationWaiter(identity, loop)
+        self.waiters.append(waiter)
+        self.waited += 1
+        return waiter
+
+    def remove_waiter(self, waiter: _ReservationWaiter) -> None:
+        try:
+            self.waiters.remove(waiter)
+        except ValueError:  # handed off already
+            pass
+
+    def hand_off(self, find_entry: Callable[[], Dict]) -> None:
+        """bind the reservable worker entries to the waiters in FIFO order, find_entry() returns None if nothing left"""
+        while self.waiters:
+            entry = find_entry()
+            if entry is None:
+                break
+
+            waiter = self.waiters.popleft()
+            self.bind(waiter.identity, entry)
+            waiter.granted = True
+            waiter.wake()
+
+    def wake_all(self) -> None:
+        """wake up the waiters without worker since the pool is disposed"""
+        while self.waiters:
+            self.waiters.popleft().wake()
@@ -0,0 +1,82 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+worker-scoped resource of WorkerPool, generalizes the session kept by the orm access worker
+
+    - each worker creates its resource by resource_factory when the first function runs,
+      the resource is passed as the first argument of functions and reused by the later ones
+    - the resource is disposed by resource_dispose when the worker stops or retires
+    - refresh and health check are broadcast to the workers, each of them handles its own resource in its thread
+'''
+
+from typing import Any, Callable
+
+from .worker import FunctionQueueWorker
+
+
+class _ResourceWorker(FunctionQueueWorker):
+    """FunctionQueueWorker keeps the resource created by resource_factory"""
+
+    def __init__(self, name: str = None,
+                 resource_factory: Callable[[], Any] = None,
+                 resource_dispose: Callable[[Any], None] = None,
+                 health_check: Callable[[Any], bool] = None):
+        super().__init__(name=name)
+        self._resource_factory = resource_factory
+        self._resource_dispose = resource_dispose
+        self._health_check = health_check
+        self._resource = None
+        self._has_resource = False
+
+    @property
+    def has_resource(self) -> bool:
+        return self._has_resource
+
+    def dispose_resource(self) -> None:
+        """this function should be called by worker thread, the resource is created again by the next function"""
+        resource, self._resource = self._resource, None
+        if not self._has_resource:
+            return
+
+        self._has_resource = False
+        if self._resource_dispose is not None:
+            self._resource_dispose(resource)
+
+    def check_resource(self) -> bool:
+        """
+        this function should be called by worker thread, dispose the resource if health_check returns False or raises,
+        return True if the resource is healthy or has not been created
+        """
+        if not self._has_resource or self._health_check is None:
+            return True
+
+        try:
+            healthy = bool(self._health_check(self._resource))
+        except Exception:
+            healthy = False
+
+        if not healthy:
+            try:
+                self.dispose_resource()
+            except Exception:
+                pass
+        return healthy
+
+    def run(self) -> None:
+        """do not directly call this function, it will be called by thread automatically"""
+        try:
+            super().run()
+        finally:
+            self.dispose_resource()
+
+    def _execute_function(self, func: Callable, *args, **kwargs) -> Any:
+        if getattr(func, '__self__', None) is self:  # broadcast method of this worker
+            return func(*args, **kwargs)
+
+        if not self._has_resource:
+            self._resource = self._resource_factory()
+            self._has_resource = True
+        return func(self._resource, *args, **kwargs)
@@ -0,0 +1,313 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+TimerWheelScheduler runs periodic and one-shot jobs by a hierarchical timer wheel
+
+    - a single timer thread advances the wheels every tick, the due jobs are executed by a small WorkerPool
+    - wheel level n holds the jobs due within wheel_size ** (n + 1) ticks, the jobs are cascaded
+      to the lower level when the time comes, so scheduling and cancelling are O(1)
+    - fixed_rate: the job is scheduled by its previous scheduled time, the missed periods are skipped
+    - fixed delay (default): the job is scheduled by interval after the previous execution finished
+    - a periodic job never overlaps itself
+    - a job occupies one thread until it returns, the due jobs wait if worker_limit jobs are executing
+
+    get_scheduler() returns the shared scheduler used by FunctionLoopWorker and the health check of WorkerPool,
+    pass worker_limit to it if more slow jobs are executed at the same time
+'''
+
+import math
+import time
+from threading import Thread, Condition, Lock
+from typing import Any, Callable, Dict, List
+
+from .worker import FunctionQueueWorker
+from .pool import WorkerPool
+
+
+class ScheduledJob():
+    """handle of job scheduled by TimerWheelScheduler, call cancel() to stop it"""
+    __slots__ = ('func', 'args', 'kwargs', 'interval', 'fixed_rate',
+                 'on_finish', 'on_exception', 'scheduled_time', 'tick', 'slot',
+                 '_scheduler', '_cancelled')
+
+    def __init__(self, scheduler: 'TimerWheelScheduler', func: Callable, args: tuple, kwargs: dict,
+                 interval: float = None, fixed_rate: bool = False,
+                 on_finish: Callable[[Any], None] = None,
+                 on_exception: Callable[[Exception], None] = None):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.interval = interval
+        self.fixed_rate = fixed_rate
+        self.on_finish = on_finish
+        self.on_exception = on_exception
+        self.scheduled_time = None
+        self.tick = None
+        self.slot = None
+        self._scheduler = scheduler
+        self._cancelled = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    @property
+    def periodic(self) -> bool:
+        return self.interval is not None
+
+    def cancel(self) -> None:
+        """the job will not be executed again, the executing function is not interrupted"""
+        self._scheduler._cancel(self)
+
+
+class _DaemonWorkerPool(WorkerPool):
+    """the workers of scheduler do not block the interpreter from exiting"""
+
+    def _create_worker(self, name: str) -> FunctionQueueWorker:
+        worker = super()._create_worker(name)
+        worker.daemon = True
+        return worker
+
+    def set_worker_limit(self, worker_limit: int) -> None:
+        self._set_worker_limit(worker_limit)
+
+
+class TimerWheelScheduler():
+    """
+    run periodic and one-shot jobs with a hierarchical timer wheel
+
+    tick_seconds: the resolution of timer, the jobs are executed at the first tick after they are due
+    wheel_size: number of slots of each wheel level
+    levels: number of wheel levels, the jobs due later than tick_seconds * wheel_size ** levels are cascaded repeatedly
+    worker_limit: the maximum of threads execute the due jobs, the idle threads retire after idle_timeout seconds,
+                  the due jobs wait while worker_limit jobs are executing
+    """
+
+    def __init__(self, name: str = None, tick_seconds: float = 0.01, wheel_size: int = 64, levels: int = 4,
+                 worker_limit: int = 4, idle_timeout: float = 10):
+        self._name = name or type(self).__name__
+        self._tick_seconds = tick_seconds
+        self._wheel_size = wheel_size
+        self._levels = levels
+        self._wheels: List[List[set]] = [[set() for _ in range(wheel_size)]
+                                         for _ in range(levels)]
+        self._job_count = 0
+        self._cascaded_due: List[ScheduledJob] = []
+        self._current_tick = 0
+        self._start_time = time.monotonic()
+        self._cond = Condition(Lock())
+        self._running = True
+        self._pool = _DaemonWorkerPool(
+            self._name, worker_limit=worker_limit, idle_timeout=idle_timeout)
+        self._timer = Thread(target=self._run, name=self._name, daemon=True)
+        self._timer.start()
+
+    def dispose(self) -> None:
+        """stop immediately, the scheduled jobs are cancelled and the executing functions are not interrupted"""
+        with self._cond:
+            self._running = False
+            for wheel in self._wheels:
+                for slot in wheel:
+                    for job in slot:
+                        job._cancelled = True
+                    slot.clear()
+            self._job_count = 0
+            self._cascaded_due = []
+            self._cond.notify()
+        self._pool.dispose()
+
+    def set_worker_limit(self, worker_limit: int) -> None:
+        """change the maximum of threads execute the due jobs, the idle threads exceeding the limit are disposed"""
+        self._pool.set_worker_limit(worker_limit)
+
+    def info(self) -> Dict:
+        """return the dict show the current condition of this scheduler"""
+        return {
+            'jobs': self._job_count,
+            'tick_seconds': self._tick_seconds,
+            'pool': self._pool.info()
+        }
+
+    def schedule(self, func: Callable, *args,
+                 delay: float = 0,
+                 interval: float = None,
+                 fixed_rate: bool = False,
+                 on_finish: Callable[[Any], None] = None,
+                 on_exception: Callable[[Exception], None] = None,
+                 **kwargs) -> ScheduledJob:
+        """
+        execute func after delay seconds, then repeat every interval seconds if interval is specified
+
+        fixed_rate: the periods are counted from the scheduled time instead of the end of previous execution
+        """
+        job = ScheduledJob(self, func, args, kwargs, interval,
+                           fixed_rate, on_finish, on_exception)
+        with self._cond:
+            if not self._running:
+                job._cancelled = True
+                return job
+            job.scheduled_time = time.monotonic() + max(0, delay)
+            self._sync_idle_tick()
+            self._add(job)
+            self._cond.notify()
+        return job
+
+    def _cancel(self, job: ScheduledJob) -> None:
+        with self._cond:
+            job._cancelled = True
+            self._remove(job)
+
+    def _sync_idle_tick(self) -> None:
+        """called with lock, the timer does not advance idle wheels, move the current tick to now before adding job"""
+        if self._job_count == 0:
+            self._current_tick = max(self._current_tick, int(
+                (time.monotonic() - self._start_time) / self._tick_seconds) - 1)
+
+    def _add(self, job: ScheduledJob) -> None:
+        """called with lock, put job into the wheel slot by its due tick"""
+        job.tick = max(self._current_tick + 1,
+                       math.ceil((job.scheduled_time - self._start_time) / self._tick_seconds))
+        ticks = job.tick - self._current_tick
+        level = 0
+        span = self._wheel_size
+        while ticks >= span and level < self._levels - 1:
+            level += 1
+            span *= self._wheel_size
+
+        slot = self._wheels[level][(job.tick // (span // self._wheel_size)) % self._wheel_size]
+        slot.add(job)
+        job.slot = slot
+        self._job_count += 1
+
+    def _remove(self, job: ScheduledJob) -> None:
+        """called with lock"""
+        if job.slot is not None:
+            job.slot.discard(job)
+            job.slot = None
+            self._job_count -= 1
+
+    def _advance(self) -> List[ScheduledJob]:
+        """called with lock, advance one tick and return the due jobs"""
+        self._current_tick += 1
+        tick = self._current_tick
+
+        # cascade the jobs of higher levels to lower levels when their time comes
+        span = self._wheel_size ** (self._levels - 1)
+        for level in range(self._levels - 1, 0, -1):
+            if tick % span == 0:
+                slot = self._wheels[level][(tick // span) % self._wheel_size]
+                jobs = list(slot)
+                slot.clear()
+                for job in jobs:
+                    job.slot = None
+                    self._job_count -= 1
+                    if job.tick > tick:
+                        self._add(job)
+                    else:
+                        self._cascaded_due.append(job)
+            span //= self._wheel_size
+
+        slot = self._wheels[0][tick % self._wheel_size]
+        due = [job for job in slot if job.tick <= tick]
+        for job in due:
+            self._remove(job)
+
+        if self._cascaded_due:
+            due.extend(self._cascaded_due)
+            self._cascaded_due = []
+        return due
+
+    def _ticks_to_next_event(self) -> int:
+        """called with lock, the ticks to the next non-empty slot of level 0 or the next cascade"""
+        offset = self._current_tick % self._wheel_size
+        for i in range(1, self._wheel_size - offset):
+            if self._wheels[0][(self._current_tick + i) % self._wheel_size]:
+                return i
+        return self._wheel_size - offset
+
+    def _run(self) -> None:
+        while True:
+            due = []
+            with self._cond:
+                if not self._running:
+                    return
+
+                if self._job_count == 0:
+                    self._cond.wait()
+                    continue
+
+                now_tick = int((time.monotonic() - self._start_time) / self._tick_seconds)
+                while self._current_tick < now_tick:
+                    due.extend(self._advance())
+
+                if not due:
+                    next_time = self._start_time + \
+                        (self._current_tick + self._ticks_to_next_event()) * self._tick_seconds
+                    self._cond.wait(max(0, next_time - time.monotonic()))
+                    continue
+
+            for job in due:
+                self._execute(job)
+
+    def _execute(self, job: ScheduledJob) -> None:
+        if job.cancelled:
+            return
+
+        future = self._pool.submit(self._call, job)
+        future.add_done_callback(lambda f: self._on_executed(job))
+
+    def _call(self, job: ScheduledJob) -> None:
+        if job.cancelled:
+            return
+
+        try:
+            result = job.func(*job.args, **job.kwargs)
+            if callable(job.on_finish):
+                job.on_finish(result)
+        except Exception as e:
+            if callable(job.on_exception):
+                job.on_exception(e)
+
+    def _on_executed(self, job: ScheduledJob) -> None:
+        """reschedule the periodic job after it is executed"""
+        if not job.periodic:
+            return
+
+        with self._cond:
+            if job.cancelled or not self._running:
+                return
+
+            now = time.monotonic()
+            if job.fixed_rate:
+                job.scheduled_time += job.interval
+                if job.scheduled_time < now:  # skip the missed periods
+                    missed = math.ceil((now - job.scheduled_time) / job.interval) if job.interval > 0 else 0
+                    job.scheduled_time += missed * job.interval
+            else:
+                job.scheduled_time = now + job.interval
+            self._sync_idle_tick()
+            self._add(job)
+            self._cond.notify()
+
+
+_scheduler = None
+_scheduler_lock = Lock()
+
+
+def get_scheduler(worker_limit: int = None) -> TimerWheelScheduler:
+    """
+    return the shared TimerWheelScheduler, it is created at the first call with 4 threads
+
+    worker_limit: change the maximum of threads if specified, the periodic functions block each other if they
+                  are slower than their intervals and more than worker_limit of them are executing
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = TimerWheelScheduler('hostray_scheduler')
+        if worker_limit is not None:
+            _scheduler.set_worker_limit(worker_limit)
+        return _scheduler
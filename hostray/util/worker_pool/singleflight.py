@@ -0,0 +1,150 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+single-flight execution of the identical concurrent calls
+
+    - the concurrent calls with the same dedupe_key share one execution and its result or exception,
+      the key is released when the execution completes so the later calls execute the function again
+    - each caller waits with its own timeout, the execution is cancelled only if every caller stops waiting
+'''
+
+import asyncio
+from threading import Lock
+from typing import Any, Callable, Coroutine, Dict, Hashable
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from .cancellation import TaskTimeoutException
+
+
+class _Flight():
+    """the shared result of execution and the number of callers waiting for it"""
+    __slots__ = ('future', 'source', 'waiters')
+
+    def __init__(self):
+        self.future = Future()
+        self.source = None
+        self.waiters = 0
+
+
+class _SingleFlight():
+    """
+    dedupe_key to the in-flight execution of pool,
+    start() queues the function and returns the concurrent.futures.Future of its result
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.hits = 0
+
+    def info(self) -> Dict:
+        return {
+            'dedupe_hits': self.hits,
+            'dedupe_in_flight': len(self._flights)
+        }
+
+    def run(self, key: Hashable, start: Callable[[], Future], func: Callable, timeout: float,
+            count_cancelled: Callable[..., None]) -> Any:
+        flight = self._join(key, start)
+        try:
+            return flight.future.result(timeout)
+        except FutureTimeoutError:
+            if flight.future.done():  # raised by the function
+                raise
+            count_cancelled(timed_out=True)
+            raise TaskTimeoutException(func, timeout) from None
+        finally:
+            self._leave(key, flight)
+
+    async def run_async(self, key: Hashable, start: Callable[[], Future], func: Callable, timeout: float,
+                        count_cancelled: Callable[..., None]) -> Any:
+        flight = self._join(key, start)
+        try:
+            # shield the shared future from the cancellation of this caller
+            waiter = asyncio.shield(asyncio.wrap_future(flight.future))
+            if timeout is None:
+                return await waiter
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            if flight.future.done():  # raised by the function
+                raise
+            count_cancelled(timed_out=True)
+            raise TaskTimeoutException(func, timeout) from None
+        except asyncio.CancelledError:
+            count_cancelled()
+            raise
+        finally:
+            self._leave(key, flight)
+
+    def _join(self, key: Hashable, start: Callable[[], Future]) -> _Flight:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.hits += 1
+            flight.waiters += 1
+
+        if leader:
+            try:
+                flight.source = start()
+            except Exception as e:  # rejected by backpressure or disposed, the followers get the same exception
+                self._release(key, flight)
+                flight.future.set_exception(e)
+            else:
+                flight.source.add_done_callback(
+                    lambda source: self._on_done(key, flight, source))
+        return flight
+
+    def _leave(self, key: Hashable, flight: _Flight) -> None:
+        with self._lock:
+            flight.waiters -= 1
+            if flight.waiters > 0 or flight.future.done():
+                return
+            if self._flights.get(key) is flight:  # the later callers start new execution
+                del self._flights[key]
+
+        flight.source.cancel()
+
+    def _release(self, key: Hashable, flight: _Flight) -> None:
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def _on_done(self, key: Hashable, flight: _Flight, source: Future) -> None:
+        self._release(key, flight)
+        if source.cancelled():
+            flight.future.cancel()
+        elif source.exception() is not None:
+            flight.future.set_exception(source.exception())
+        else:
+            flight.future.set_result(source.result())
+
+
+def _start_task(coro: Coroutine) -> Future:
+    """run coroutine as task of current event loop, return concurrent.futures.Future can be cancelled from any thread"""
+    loop = asyncio.get_event_loop()
+    task = loop.create_task(coro)
+    future = Future()
+
+    def on_task_done(t: asyncio.Task) -> None:
+        if future.done():
+            return
+        if t.cancelled():
+            future.cancel()
+        elif t.exception() is not None:
+            future.set_exception(t.exception())
+        else:
+            future.set_result(t.result())
+
+    def on_future_done(f: Future) -> None:
+        if f.cancelled() and not task.done():
+            loop.call_soon_threadsafe(task.cancel)
+
+    task.add_done_callback(on_task_done)
+    future.add_done_callback(on_future_done)
+    return future
@@ -0,0 +1,101 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+stream the items of blocking generator from worker thread to async consumer
+
+    - the generator is iterated in worker thread and the items are put into a bounded buffer,
+      the worker thread waits while the buffer is full so the memory does not grow with the stream
+    - the consumer awaits only when the buffer is empty, the exception of generator is raised after the buffered items
+    - the generator is closed in worker thread if the consumer stops early
+'''
+
+import asyncio
+from collections import deque
+from threading import Condition, Lock
+from typing import Any, Callable
+
+
+class _GeneratorStream():
+    """bounded buffer between the generator in worker thread and the consumer in event loop"""
+
+    def __init__(self, gen_func: Callable, args: tuple, kwargs: dict, buffer: int,
+                 loop: asyncio.AbstractEventLoop):
+        self.gen_func = gen_func
+        self.args = args
+        self.kwargs = kwargs
+        self._buffer = max(1, buffer)
+        self._loop = loop
+        self._items = deque()
+        self._cond = Condition(Lock())
+        self._waiter = None
+        self._done = False
+        self._closed = False
+        self._exception = None
+
+    def __call__(self, *args, **kwargs) -> None:
+        """called by worker thread, the arguments injected by worker are passed to gen_func"""
+        try:
+            gen = self.gen_func(*args, *self.args, **kwargs, **self.kwargs)
+            try:
+                for item in gen:
+                    with self._cond:
+                        while len(self._items) >= self._buffer and not self._closed:
+                            self._cond.wait()
+
+                        if self._closed:
+                            break
+
+                        self._items.append(item)
+                        self._wake_consumer()
+            finally:
+                close = getattr(gen, 'close', None)
+                if callable(close):
+                    close()
+        except Exception as e:
+            self._exception = e
+        finally:
+            with self._cond:
+                self._done = True
+                self._wake_consumer()
+
+    async def get(self) -> Any:
+        """return the next item, raise StopAsyncIteration if the generator is exhausted"""
+        while True:
+            with self._cond:
+                if self._items:
+                    if len(self._items) == self._buffer:
+                        self._cond.notify()  # the producer might be waiting
+                    return self._items.popleft()
+
+                if self._done:
+                    if self._exception is not None:
+                        raise self._exception
+                    raise StopAsyncIteration
+
+                self._waiter = self._loop.create_future()
+                waiter = self._waiter
+            await waiter
+
+    def close(self) -> None:
+        """stop the producer, the buffered items are dropped"""
+        with self._cond:
+            self._closed = True
+            self._items.clear()
+            self._cond.notify()
+
+    def _wake_consumer(self) -> None:
+        """called with lock"""
+        if self._waiter is not None:
+            waiter, self._waiter = self._waiter, None
+            try:
+                self._loop.call_soon_threadsafe(self._resolve, waiter)
+            except RuntimeError:  # loop has been closed, nobody is waiting
+                pass
+
+    @staticmethod
+    def _resolve(future: asyncio.Future) -> None:
+        if not future.done():
+            future.set_result(None)
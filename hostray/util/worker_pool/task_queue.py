@@ -0,0 +1,210 @@
+# Copyright (C) 2019-Present the hostray authors and contributors
+#
+# This module is part of hostray and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php:
+
+'''
+PriorityTaskQueue queues functions by TaskPriority and executes them with FunctionQueueWorkers
+
+    - the functions of higher priority are executed first, the functions of the same priority are FIFO
+    - the function has deadline is dropped and on_expired is called if it does not start in time
+    - max_pending limits the queued functions, the backpressure policy decides what happens when the queue is full,
+      DropOldest drops the oldest function of the lowest priority
+'''
+
+import time
+from enum import IntEnum
+from collections import deque
+from threading import Condition, Lock
+from typing import Any, Callable, Dict, List, Union
+
+from .worker import FunctionQueueWorker, _QueuedTask
+from .backpressure import BackpressurePolicy, QueueFullException, _Admission
+from .metrics import TaskMetrics
+from ..localization import LocalizedMessageException
+from ..constants import LocalCode_Task_Not_Registered
+
+
+class TaskPriority(IntEnum):
+    High = 0
+    Normal = 1
+    Low = 2
+
+
+class _DeadlineTask(_QueuedTask):
+    __slots__ = ('deadline', 'on_expired')
+
+    def __init__(self, func: Callable, args: tuple, kwargs: dict,
+                 on_finish: Callable[[Any], None] = None,
+                 on_exception: Callable[[Exception], None] = None,
+                 deadline: float = None,
+                 on_expired: Callable[[Callable], None] = None):
+        super().__init__(func, args, kwargs, on_finish, on_exception)
+        self.deadline = deadline
+        self.on_expired = on_expired
+
+
+class PriorityTaskQueue():
+    """queue functions executed by the workers in background, the functions of higher priority are executed first"""
+
+    def __init__(self, queue_name: str = None, worker_limit: int = 1, max_pending: int = None,
+                 backpressure: Union[BackpressurePolicy, str] = BackpressurePolicy.Block):
+        self._queue_name = queue_name or type(self).__name__
+        self.__worker_limit = max(1, worker_limit)
+        self.__disposing = False
+        self._workers: List[FunctionQueueWorker] = []
+        self._queues = {p: deque() for p in TaskPriority}
+        self._depth = 0
+        self._cond = Condition(Lock())
+        self._executed_count = 0
+        self._expired_count = 0
+        self._admission = _Admission(self._queue_name, max_pending, backpressure)
+        self._metrics_window_start = time.monotonic()
+        self._tasks: Dict[str, Callable] = {}
+
+    @property
+    def workers(self) -> List[FunctionQueueWorker]:
+        return list(self._workers)
+
+    def dispose(self) -> None:
+        """stop the workers after the queued functions are executed or expired"""
+        with self._cond:
+            self.__disposing = True
+            while self._depth > 0 and self._workers:
+                self._cond.wait()
+
+        for w in self._workers:
+            w.dispose()
+
+    def info(self) -> Dict:
+        """return the dict show the current condition of this queue"""
+        return {
+            'maximum_of_workers': self.__worker_limit,
+            'pendings': {p.name: len(q) for p, q in self._queues.items()},
+            'executing': {w.name: w.pending_count for w in self._workers},
+            'executed': self._executed_count,
+            'expired': self._expired_count,
+            **self._admission.info(),
+            'metrics': self.get_metrics().info()
+        }
+
+    def get_metrics(self) -> TaskMetrics:
+        """return the queue wait and execution time of the functions executed in current window"""
+        return TaskMetrics.merged([w.metrics for w in self._workers], self._metrics_window_start)
+
+    def reset_metrics(self) -> TaskMetrics:
+        """start a new metrics window and return the metrics of the ended one"""
+        window_start, self._metrics_window_start = self._metrics_window_start, time.monotonic()
+        return TaskMetrics.merged([w.reset_metrics() for w in self._workers], window_start)
+
+    def run_method(self, func: Callable, *args,
+                   priority: TaskPriority = TaskPriority.Normal,
+                   deadline: float = None,
+                   on_finish: Callable[[Any], None] = None,
+                   on_exception: Callable[[Exception], None] = None,
+                   on_expired: Callable[[Callable], None] = None,
+                   **kwargs) -> bool:
+        """
+        queue function and return True if it is accepted
+
+        deadline: seconds since queued, the function is dropped and on_expired(func) is called if it does not start in time
+        """
+        if self.__disposing or not callable(func):
+            return False
+
+        task = _DeadlineTask(func, args, kwargs, on_finish, on_exception,
+                             None if deadline is None else time.monotonic() + deadline, on_expired)
+
+        def enqueue():
+            task.queued_time = time.monotonic()
+            self._queues[TaskPriority(priority)].append(task)
+            self._depth += 1
+
+        if self._admission.admit(self._cond, self._get_depth, self._drop_oldest, enqueue):
+            self._wakeup_worker()
+        else:  # caller runs
+            try:
+                result = func(*args, **kwargs)
+                if callable(on_finish):
+                    on_finish(result)
+            except Exception as e:
+                if callable(on_exception):
+                    on_exception(e)
+        return True
+
+    def register_task(self, name: str, func: Callable) -> int:
+        """register func by name to be queued by run_task(), return the number of recovered tasks which is always 0 in memory"""
+        self._tasks[name] = func
+        return 0
+
+    def run_task(self, name: str, *args, **kwargs) -> bool:
+        """queue the registered task of name, the parameters are the same as run_method()"""
+        if not name in self._tasks:
+            raise LocalizedMessageException(LocalCode_Task_Not_Registered, name)
+        return self.run_method(self._tasks[name], *args, **kwargs)
+
+    def _get_depth(self) -> int:
+        return self._depth
+
+    def _drop_oldest(self) -> bool:
+        """drop the oldest function of the lowest priority, the on_exception of dropped function is called with QueueFullException"""
+        for p in reversed(TaskPriority):
+            if self._queues[p]:
+                task = self._queues[p].popleft()
+                self._depth -= 1
+                if callable(task.on_exception):
+                    try:
+                        task.on_exception(QueueFullException(
+                            self._queue_name, self._admission.max_pending))
+                    except Exception:
+                        pass
+                return True
+        return False
+
+    def _wakeup_worker(self) -> None:
+        for w in self._workers:
+            if w.pending_count == 0 and w.wakeup():
+                return
+
+        with self._cond:
+            if len(self._workers) < self.__worker_limit and all(w.pending_count > 0 for w in self._workers):
+                worker = FunctionQueueWorker(
+                    '{}_{}'.format(self._queue_name, len(self._workers)))
+                worker.set_work_stealing(self._next_task)
+                self._workers.append(worker)
+                worker.start()
+
+    def _next_task(self, worker: FunctionQueueWorker) -> _QueuedTask:
+        """called by idle worker thread, return the queued function of the highest priority"""
+        expired = []
+        task = None
+        now = time.monotonic()
+        with self._cond:
+            for q in self._queues.values():
+                while q:
+                    t = q.popleft()
+                    self._depth -= 1
+                    if t.deadline is not None and now > t.deadline:
+                        expired.append(t)
+                    else:
+                        task = t
+                        break
+
+                if task is not None:
+                    break
+
+            self._expired_count += len(expired)
+            if task is not None:
+                self._executed_count += 1
+            if self._depth == 0:
+                self._cond.notify_all()
+            self._admission.notify(self._depth)
+
+        for t in expired:
+            if callable(t.on_expired):
+                try:
+                    t.on_expired(t.func)
+                except Exception:
+                    pass
+
+        return task
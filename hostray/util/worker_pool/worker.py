@@ -8,9 +8,13 @@ Last Updated:  Monday, 4th November 2019 by hsky77 (howardlkung@gmail.com)
 '''
 
 import time
+from collections import deque
 from typing import Callable, Any
 from threading import Thread, Condition, Lock
 
+from .cancellation import CancellationToken, _set_cancellation_token
+from .metrics import TaskMetrics
+
 
 class _BaseWorker(Thread):
     """hostray-customized python threading.Thread class"""
@@ -192,16 +196,103 @@ class Worker(_BaseWorker):
                 self._on_exception = None
 
 
+class _QueuedTask():
+    """compact record of the function queued in FunctionQueueWorker"""
+    __slots__ = ('func', 'args', 'kwargs', 'on_finish',
+                 'on_exception', 'stealable', 'queued_time', 'token')
+
+    def __init__(self, func: Callable, args: tuple, kwargs: dict,
+                 on_finish: Callable[[Any], None] = None,
+                 on_exception: Callable[[Exception], None] = None,
+                 stealable: bool = False,
+                 token: CancellationToken = None):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.on_finish = on_finish
+        self.on_exception = on_exception
+        self.stealable = stealable  # whether the other worker is allowed to execute this task
+        self.queued_time = None
+        self.token = token  # the cancelled task is skipped, get_cancellation_token() returns it while executing
+
+
 class FunctionQueueWorker(_BaseWorker):
     """worker that queues functions to execute"""
 
     def __init__(self, name: str = None):
         super().__init__(name)
-        self.__tasks = []
+        self._tasks = deque()
+        self._tasks_cond = Condition(Lock())
+        self._pending = 0
+
+        self._steal_task_source = None
+        self._notify_backlog = None
+        self._wakeup = False
+
+        self._idle_timeout = None
+        self._retire = None
+        self._on_task_done = None
+        self._metrics = TaskMetrics()
+        self._last_execution_time = None
 
     @property
     def pending_count(self) -> int:
-        return len(self.__tasks)
+        """number of queued functions includes the executing one"""
+        return self._pending
+
+    @property
+    def metrics(self) -> TaskMetrics:
+        """queue wait and execution time of the functions executed since the last reset_metrics()"""
+        return self._metrics
+
+    @property
+    def last_execution_time(self) -> float:
+        """seconds the last function executed, None if it was cancelled before started"""
+        return self._last_execution_time
+
+    def reset_metrics(self) -> TaskMetrics:
+        """start a new metrics window and return the metrics of the ended one"""
+        metrics, self._metrics = self._metrics, TaskMetrics()
+        return metrics
+
+    @property
+    def waiting_time(self) -> float:
+        """seconds the earliest queued function has been waiting for execution"""
+        try:
+            return time.monotonic() - self._tasks[0].queued_time
+        except IndexError:
+            return 0
+
+    def dispose(self) -> None:
+        """stop the worker thread after the queued functions are executed"""
+        with self._tasks_cond:
+            self._running = False
+            self._tasks_cond.notify()
+
+    def set_work_stealing(self,
+                          steal_task_source: Callable[['FunctionQueueWorker'], _QueuedTask] = None,
+                          notify_backlog: Callable[['FunctionQueueWorker'], None] = None) -> None:
+        """
+        steal_task_source is called when this worker is idle to take a task from the other workers,
+        notify_backlog is called when a stealable task is queued but has to wait in this worker
+        """
+        self._steal_task_source = steal_task_source
+        self._notify_backlog = notify_backlog
+
+    def set_idle_retirement(self, idle_timeout: float = None,
+                            retire: Callable[['FunctionQueueWorker'], bool] = None) -> None:
+        """
+        retire is called when this worker has been idle for idle_timeout seconds,
+        the worker thread stops if it returns True
+        """
+        with self._tasks_cond:
+            self._idle_timeout = idle_timeout
+            self._retire = retire
+            self._tasks_cond.notify()
+
+    def set_task_done_callback(self, on_task_done: Callable[['FunctionQueueWorker'], None] = None) -> None:
+        """on_task_done is called by worker thread after each function is executed and pending_count is decreased"""
+        self._on_task_done = on_task_done
 
     def run_method(self,
                    func: Callable,
@@ -210,60 +301,173 @@ class FunctionQueueWorker(_BaseWorker):
                    on_exception: Callable[[Exception], None] = None,
                    **kwargs) -> None:
         """func will be queued and run when the worker thread is free"""
-        with self._run_method_lock:
-            if callable(func):
-                self.__tasks.append({
-                    'func': func,
-                    'on_finish': on_finish,
-                    'on_exception': on_exception,
-                    'args': args,
-                    'kwargs': kwargs
-                })
-
-                if not self.is_started:
-                    self.start()
+        if callable(func):
+            self._queue_task(_QueuedTask(
+                func, args, kwargs, on_finish, on_exception))
+
+    def steal_task(self) -> _QueuedTask:
+        """remove and return the earliest queued stealable task which is not executing, or None"""
+        with self._tasks_cond:
+            for i, task in enumerate(self._tasks):
+                if task.stealable:
+                    del self._tasks[i]
+                    self._pending -= 1
+                    return task
+
+    def remove_task(self, task: _QueuedTask) -> bool:
+        """remove the queued task which is not executing, return False if it is not in the queue"""
+        with self._tasks_cond:
+            try:
+                self._tasks.remove(task)
+            except ValueError:
+                return False
+            self._pending -= 1
+            return True
 
-                self.resume()
+    def drop_task(self) -> _QueuedTask:
+        """
+        remove and return the earliest queued task which is not executing, or None,
+        the tasks of reservation and broadcast are not stealable and never dropped, so their order is kept
+        """
+        return self.steal_task()
 
-    def _run(self) -> Any:
-        while len(self.__tasks) > 0:
-            task = self.__tasks[0]
+    def wakeup(self) -> bool:
+        """wake up the idle worker thread to look for stealable tasks, return False if it has been woken up"""
+        with self._tasks_cond:
+            if self._wakeup:
+                return False
+            self._wakeup = True
+            self._tasks_cond.notify()
+            return True
 
-            try:
-                result = self._execute_function(
-                    task['func'], *task['args'], **task['kwargs'])
-                if callable(task['on_finish']):
-                    task['on_finish'](result)
-            except Exception as e:
-                if callable(task['on_exception']):
-                    task['on_exception'](e)
+    def run(self) -> None:
+        """do not directly call this function, it will be called by thread automatically"""
+        while True:
+            task = self._next_task()
+            if task is None:  # disposed and all tasks are executed
+                break
+            self._run_task(task)
+
+    def _next_task(self) -> _QueuedTask:
+        while True:
+            with self._tasks_cond:
+                if self._tasks:
+                    return self._tasks.popleft()
+
+                if not self._running:
+                    return None
+                self._wakeup = False
+
+            if self._steal_task_source is not None:
+                task = self._steal_task_source(self)
+                if task is not None:
+                    with self._tasks_cond:
+                        self._pending += 1
+                    return task
+
+            idle = False
+            with self._tasks_cond:
+                while self._running and not self._tasks and not self._wakeup:
+                    if not self._tasks_cond.wait(self._idle_timeout) and self._retire is not None:
+                        idle = not self._tasks
+                        break
+
+            if idle and self._retire(self):
+                return None
+
+    def _queue_task(self, task: _QueuedTask) -> None:
+        task.queued_time = time.monotonic()
+        with self._tasks_cond:
+            self._tasks.append(task)
+            self._pending += 1
+
+            if not self.is_started:
+                self.start()
+
+            if len(self._tasks) == 1:  # worker thread waits only when the queue is empty
+                self._tasks_cond.notify()
+
+            backlog = task.stealable and self._pending > 1
+
+        if backlog and self._notify_backlog is not None:
+            self._notify_backlog(self)
+
+    def _run_task(self, task: _QueuedTask) -> None:
+        start = time.monotonic()
+        failed = False
+        self._last_execution_time = None
+        try:
+            if task.token is not None:
+                if task.token.cancelled:  # cancelled after it is stolen by this worker
+                    start = None
+                    return
+                _set_cancellation_token(task.token)
+
+            result = self._execute_function(
+                task.func, *task.args, **task.kwargs)
+            if callable(task.on_finish):
+                task.on_finish(result)
+        except Exception as e:
+            failed = True
+            if callable(task.on_exception):
+                task.on_exception(e)
+        finally:
+            if task.token is not None:
+                _set_cancellation_token(None)
+
+            if start is not None:
+                self._last_execution_time = time.monotonic() - start
+                self._metrics.record(start - (task.queued_time or start),
+                                     self._last_execution_time, failed)
+
+            with self._tasks_cond:
+                self._pending -= 1
+
+            if self._on_task_done is not None:
+                self._on_task_done(self)
+
+
+class FunctionLoopWorker():
+    """
+    loops a single function in one period before calling stop(),
+    the function is executed by the shared TimerWheelScheduler instead of a dedicated thread
+
+    fixed_rate: the periods are counted from the scheduled time instead of the end of previous execution
+    """
+
+    def __init__(self, name: str = None, loop_interval_seconds: float = 1.0, fixed_rate: bool = False):
+        self.name = name or type(self).__name__
+        self.__loop_interval_seconds = loop_interval_seconds
+        self.__fixed_rate = fixed_rate
+        self.__resource_lock = None
+        self._run_method_lock = Lock()
+        self._job = None
 
-            with self._run_method_lock:
-                self.__tasks.pop(0)
+    def __enter__(self):
+        return self
 
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.dispose()
 
-class FunctionLoopWorker(_BaseWorker):
-    """worker class loops a single function in one period before calling stop()"""
+    @property
+    def is_func_running(self) -> bool:
+        return self._job is not None and not self._job.cancelled
 
-    def __init__(self, name: str = None, loop_interval_seconds: float = 1.0):
-        super().__init__(name=name)
-        self.__loop_interval_seconds = loop_interval_seconds
-        self.__on_finish = None
-        self.__on_exception = None
-        self.stop()
+    @property
+    def resource_lock(self) -> Lock:
+        """use this lock access resource synchronously"""
+        self.__resource_lock = self.__resource_lock if self.__resource_lock else Lock()
+        return self.__resource_lock
 
     def dispose(self):
-        super().dispose()
         self.stop()
-        self.join()
 
     def stop(self):
-        """stop looping"""
-        self._func = None
-        self._args = None
-        self._kwargs = None
-        self.__on_finish = None
-        self.__on_exception = None
+        """stop looping immediately, the executing function is not interrupted"""
+        with self._run_method_lock:
+            if self._job is not None:
+                self._job.cancel()
+                self._job = None
 
     def run_method(self,
                    func: Callable,
@@ -272,29 +476,17 @@ class FunctionLoopWorker(_BaseWorker):
                    on_exception: Callable[[Exception], None] = None,
                    **kwargs) -> None:
         """start looping function"""
-        with self._run_method_lock:
-            if self._func is None:
-                self._func = func
-                self._args = args
-                self._kwargs = kwargs
-                self.__on_finish = on_finish
-                self.__on_exception = on_exception
-
-                if not self.is_started:
-                    self._running = True
-                    self.start()
+        from .scheduler import get_scheduler
 
-                self.resume()
+        with self._run_method_lock:
+            if callable(func) and self._job is None:
+                self._job = get_scheduler().schedule(self._execute_function, func, *args,
+                                                     interval=self.__loop_interval_seconds,
+                                                     fixed_rate=self.__fixed_rate,
+                                                     on_finish=on_finish,
+                                                     on_exception=on_exception,
+                                                     **kwargs)
 
-    def _run(self):
-        while callable(self._func):
-            try:
-                result = self._execute_function(
-                    self._func, *self._args, **self._kwargs)
-                if callable(self.__on_finish):
-                    self.__on_finish(result)
-            except Exception as e:
-                if callable(self.__on_exception):
-                    self.__on_exception(e)
-            finally:
-                time.sleep(self.__loop_interval_seconds)
+    def _execute_function(self, func, *args, **kwargs) -> Any:
+        """define how to execute the function"""
+        return func(*args, **kwargs)
@@ -62,19 +62,29 @@ from typing import Callable, ByteString, Generator, Union, Dict, Any
 
 from tornado.ioloop import IOLoop
 
-from hostray.util import Worker, FunctionLoopWorker, KB
+from hostray.util import Worker, KB
 from . import HostrayWebException, LocalCode_Connect_Failed
 
 
-class WebSocketClient(FunctionLoopWorker):
+class WebSocketClient(Worker):
+    """the connection runs in its own thread, it reconnects until the connection is made reconnect times"""
+
     def __init__(self, name: str = None, reconnect: int = 3):
-        super().__init__(name, 0)
+        super().__init__(name)
         self.conn = None
         self.reconnect = reconnect
+        self.__stopped = True
 
     def dispose(self):
         self.disconnect()
+        self.stop()
         super().dispose()
+        if self.is_started:
+            self.join()
+
+    def stop(self):
+        """stop reconnecting"""
+        self.__stopped = True
 
     @property
     def is_connected(self):
@@ -85,6 +95,7 @@ class WebSocketClient(FunctionLoopWorker):
             self.url = url
             self.connect_count = 0
             self.on_message_callback = on_message_callback
+            self.__stopped = False
             self.run_method(self._start)
 
             while not self.is_connected and self.connect_count < self.reconnect:  # wait for connected
@@ -99,6 +110,7 @@ class WebSocketClient(FunctionLoopWorker):
             self.url = url
             self.connect_count = 0
             self.on_message_callback = on_message_callback
+            self.__stopped = False
             self.run_method(self._start)
 
             while not self.is_connected and self.connect_count < self.reconnect:  # wait for connected
@@ -134,11 +146,14 @@ class WebSocketClient(FunctionLoopWorker):
 
     def _start(self):
         import asyncio
-        if self.connect_count < self.reconnect:
+        while not self.__stopped and self.connect_count < self.reconnect:
+            loop = asyncio.new_event_loop()
             try:
-                loop = asyncio.new_event_loop()
                 loop.run_until_complete(self.__run())
+            except Exception:  # reconnect
+                pass
             finally:
+                loop.close()
                 self.connect_count = self.connect_count + 1
 
     async def __run(self):
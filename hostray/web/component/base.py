@@ -47,6 +47,10 @@ class Component():
         """define what meta information of component should be return"""
         return {'component': type(self).__name__, 'info': None}
 
+    def reset_metrics(self) -> Dict:
+        """start a new metrics window and return the metrics of the ended one, None if component has no metrics"""
+        return None
+
     def dispose(self, component_manager) -> None:
         pass
 
@@ -68,6 +72,15 @@ class ComponentManager():
             info[component.component_type.enum_key] = component.info()
         return info
 
+    def reset_metrics(self) -> Dict:
+        """start new metrics windows of components and return the metrics of the ended ones"""
+        metrics = {}
+        for component in self.components:
+            m = component.reset_metrics()
+            if m is not None:
+                metrics[component.component_type.enum_key] = m
+        return metrics
+
     async def dispose_components(self) -> None:
         await self.boardcast_async('dispose', self)
 
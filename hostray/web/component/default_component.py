@@ -24,11 +24,16 @@ server loads all default components in hostray.web.component.DefaultComponentTyp
 
     TaskQueue:
 
-        - queue func (task) to execute and balances tasks with worker_count
+        - queue func (task) to execute by worker_count workers, the tasks of higher TaskPriority are executed first
+          and the tasks past their deadline are dropped
 
         component:                                      # component block of server_config.yaml
             task_queue:                                 # indicate DefaultComponentTypes.TaskQueue
                 worker_count: <number of workers>
+                max_pending: <int>                      # optional - maximum of queued functions, default: unlimited
+                backpressure: <policy>                  # optional - block, reject, drop_oldest or caller_runs, default: block
+                durable: <sqlite file path>             # optional - store the tasks queued by run_task_in_queue() to replay after restart
+                max_batch: <int>                        # optional - maximum of task records written in one transaction, default: 1000
 
     WorkerPoolComponent:
 
@@ -37,6 +42,36 @@ server loads all default components in hostray.web.component.DefaultComponentTyp
         component:                                      # component block of server_config.yaml
             worker_pool:                                # indicate DefaultComponentTypes.WorkerPool
                 <pool_id>: <number limit of workers>
+                <pool_id>:                              # or specify the pool parameters
+                    workers: <number limit of workers>   # or max_workers
+                    work_stealing: <bool>               # optional - idle workers take queued functions from busy workers
+                    min_workers: <int>                  # optional - the workers kept alive when idle, default: 0
+                    idle_timeout: <seconds>             # optional - retire the worker idle for seconds, default: never
+                    scale_up_wait: <seconds>            # optional - spawn worker if queued function waits for seconds, default: 0
+                    max_pending: <int>                  # optional - maximum of pending functions, default: unlimited
+                    backpressure: <policy>              # optional - block, reject, drop_oldest or caller_runs, default: block
+                    resource_factory: <module.function>  # optional - create the resource of each worker passed as the first argument
+                    resource_dispose: <module.function>  # optional - called with the resource when the worker stops
+                    health_check: <module.function>     # optional - return False if the resource is broken to create it again
+                    health_check_interval: <seconds>    # optional - broadcast health_check every seconds, default: never
+                    adaptive_limit: <bool>              # optional - adjust max_pending by the execution time of functions (AIMD)
+                    adaptive_limit:                     # or specify the parameters of AdaptiveLimit
+                        min_limit: <int>                # optional - default: 1
+                        max_limit: <int>                # optional - default: max_pending or workers
+                        tolerance: <float>              # optional - back off if latency exceeds tolerance times the baseline, default: 2.0
+                        backoff: <float>                # optional - the limit is multiplied by backoff, default: 0.9
+                <pool_id>:
+                    type: process                       # run picklable cpu bound functions in worker processes
+                    workers: <number of processes>
+                <pool_id>:
+                    type: coroutine                     # run coroutine functions in worker threads with their own event loops
+                    workers: <number of threads>
+                    max_concurrency: <int>              # optional - maximum of concurrent coroutines per thread, default: unlimited
+                    resource_factory: <module.function>  # optional - function or coroutine function creates the resource of each thread
+                    resource_dispose: <module.function>  # optional - function or coroutine function called with the resource
+                <pool_id>:
+                    workers: <number limit of workers>
+                    default_executor: true              # optional - loop.run_in_executor(None, ...) runs in this pool
 
     CallbackComponent:
 
@@ -46,17 +81,24 @@ Last Updated:  Tuesday, 5th November 2019 by hsky77 (howardlkung@gmail.com)
 '''
 
 
-from typing import Callable, Any, List, Dict
+from typing import Callable, Any, AsyncIterator, List, Dict, Iterable, Iterator, Union
 from enum import Enum
 
 from hostray.util import (get_Hostray_logger,
                           setting_loggers,
                           join_path,
+                          get_class,
                           configure_colored_logging,
                           HostrayLogger,
                           Callbacks,
                           AsyncWorkerPool,
-                          FunctionQueueWorker)
+                          ProcessWorkerPool,
+                          CoroutineWorkerPool,
+                          WorkerPoolExecutor,
+                          PriorityTaskQueue,
+                          DurableTaskQueue,
+                          TaskPriority,
+                          BackpressurePolicy)
 
 from .. import HostrayWebException, LocalCode_Comp_Missing_Parameter
 
@@ -191,45 +233,65 @@ class CallbackComponent(Component):
 
 
 class TaskQueueComponent(Component):
-    """default component to queue func to execute"""
+    """default component to queue func to execute, the functions of higher priority are executed first"""
 
-    def init(self, component_manager: ComponentManager, worker_count: int = 1, **kwargs) -> None:
+    def init(self, component_manager: ComponentManager, worker_count: int = 1, max_pending: int = None,
+             backpressure: str = BackpressurePolicy.Block.value, durable: str = None, max_batch: int = 1000,
+             **kwargs) -> None:
         self.worker_count = worker_count
-        self._queue_workers: List[FunctionQueueWorker] = []
-        self.disposing = False
+        if durable:
+            self._queue = DurableTaskQueue(join_path(kwargs.get('root_dir', ''), durable), 'TaskQueue',
+                                           worker_limit=worker_count, max_pending=max_pending,
+                                           backpressure=backpressure, max_batch=max_batch)
+        else:
+            self._queue = PriorityTaskQueue('TaskQueue', worker_limit=worker_count,
+                                            max_pending=max_pending, backpressure=backpressure)
 
     def run_method_in_queue(self, func: Callable, *args,
                             on_finish: Callable[[Any], None] = None,
                             on_exception: Callable[[Exception], None] = None,
-                            **kwargs) -> None:
-        if not self.disposing:
-            worker: FunctionQueueWorker = None
-
-            if len(self._queue_workers) < self.worker_count:
-                worker = FunctionQueueWorker(
-                    'TaskQueue_{}'.format(len(self._queue_workers)))
-                self._queue_workers.append(worker)
-            else:
-                for w in self._queue_workers:
-                    worker = worker if worker is not None and worker.pending_count < w.pending_count else w
-
-            worker.run_method(func, *args, on_finish=on_finish,
-                              on_exception=on_exception, **kwargs)
+                            priority: TaskPriority = TaskPriority.Normal,
+                            deadline: float = None,
+                            on_expired: Callable[[Callable], None] = None,
+                            **kwargs) -> bool:
+        """
+        queue func and return True if it is accepted
+
+        deadline: seconds since queued, func is dropped and on_expired(func) is called if it does not start in time
+        """
+        return self._queue.run_method(func, *args, priority=priority, deadline=deadline,
+                                      on_finish=on_finish, on_exception=on_exception,
+                                      on_expired=on_expired, **kwargs)
+
+    def register_task(self, name: str, func: Callable) -> int:
+        """
+        register func by name for run_task_in_queue(), return the number of the tasks of name
+        recovered from durable file which are queued again
+        """
+        return self._queue.register_task(name, func)
+
+    def run_task_in_queue(self, name: str, *args,
+                          on_finish: Callable[[Any], None] = None,
+                          on_exception: Callable[[Exception], None] = None,
+                          priority: TaskPriority = TaskPriority.Normal,
+                          deadline: float = None,
+                          on_expired: Callable[[Callable], None] = None,
+                          **kwargs) -> bool:
+        """queue the registered task of name, the task and its picklable arguments are stored if durable is set"""
+        return self._queue.run_task(name, *args, priority=priority, deadline=deadline,
+                                    on_finish=on_finish, on_exception=on_exception,
+                                    on_expired=on_expired, **kwargs)
 
     def info(self) -> Dict:
         return {**super().info(), **{
-            'info': {
-                'maximum_of_workers': self.worker_count,
-                'pendings': {w.name: w.pending_count for w in self._queue_workers}
-            }
+            'info': self._queue.info()
         }}
 
+    def reset_metrics(self) -> Dict:
+        return self._queue.reset_metrics().info()
+
     def dispose(self, component_manager: ComponentManager) -> None:
-        self.disposing = True
-        for w in self._queue_workers:
-            while w.pending_count > 0:
-                pass
-            w.dispose()
+        self._queue.dispose()
 
 
 class WorkerPoolComponent(Component):
@@ -237,22 +299,71 @@ class WorkerPoolComponent(Component):
 
     def init(self, component_manager: ComponentManager, **kwargs) -> None:
         self.pools = {}
-
-        for pool_id, limit in {k: v for k, v in kwargs.items() if not 'root_dir' in k}.items():
-            self.set_pool(pool_id, limit)
+        self.executors = {}
+
+        for pool_id, setting in {k: v for k, v in kwargs.items() if not 'root_dir' in k}.items():
+            if isinstance(setting, dict):
+                setting = dict(setting)
+                worker_limit = setting.pop('workers', 3)
+                default_executor = setting.pop('default_executor', False)
+                self.set_pool(pool_id, setting.pop('max_workers', worker_limit),
+                              pool_type=setting.pop('type', 'thread'), **setting)
+                if default_executor:
+                    self.set_default_executor(pool_id)
+            else:
+                self.set_pool(pool_id, setting)
 
         if len(self.pools) == 0:  # add defualt pull
             self.set_pool()
 
-    def set_pool(self, pool_id: str = 'default', worker_limit: int = 3) -> None:
-        """add or replace a pool object of pool id"""
+    def set_pool(self, pool_id: str = 'default', worker_limit: int = 3, work_stealing: bool = False,
+                 min_workers: int = 0, idle_timeout: float = None, scale_up_wait: float = 0,
+                 max_pending: int = None, backpressure: str = BackpressurePolicy.Block.value,
+                 pool_type: str = 'thread', max_concurrency: int = None,
+                 resource_factory: Union[Callable, str] = None, resource_dispose: Union[Callable, str] = None,
+                 health_check: Union[Callable, str] = None, health_check_interval: float = None,
+                 adaptive_limit: Union[bool, Dict] = None) -> None:
+        """
+        add or replace a pool object of pool id, pool_type is 'thread', 'process' or 'coroutine'
+
+        resource_factory, resource_dispose and health_check are functions or their import paths 'module.function',
+        the process pool has no resource
+        """
+        resource_factory, resource_dispose, health_check = [
+            self._get_function(f) for f in (resource_factory, resource_dispose, health_check)]
+
         if pool_id in self.pools:
+            if pool_id in self.executors:
+                self.executors.pop(pool_id).shutdown(wait=False)
             self.pools[pool_id].dispose()
             self.pools.pop(pool_id)
 
-        if not pool_id in self.pools:
-            self.pools[pool_id] = AsyncWorkerPool(
+        if pool_type == 'process':
+            self.pools[pool_id] = ProcessWorkerPool(
                 pool_id, worker_limit=worker_limit)
+        elif pool_type == 'coroutine':
+            self.pools[pool_id] = CoroutineWorkerPool(
+                pool_id, worker_limit=worker_limit, max_concurrency=max_concurrency,
+                resource_factory=resource_factory, resource_dispose=resource_dispose)
+        else:
+            self.pools[pool_id] = AsyncWorkerPool(
+                pool_id, worker_limit=worker_limit, work_stealing=work_stealing,
+                min_workers=min_workers, idle_timeout=idle_timeout, scale_up_wait=scale_up_wait,
+                max_pending=max_pending, backpressure=backpressure,
+                resource_factory=resource_factory, resource_dispose=resource_dispose,
+                health_check=health_check, health_check_interval=health_check_interval,
+                adaptive_limit=adaptive_limit)
+
+    def get_executor(self, pool_id: str = 'default') -> WorkerPoolExecutor:
+        """return the concurrent.futures.Executor executes functions in the pool of pool id"""
+        if not pool_id in self.executors:
+            self.executors[pool_id] = WorkerPoolExecutor(self.pools[pool_id])
+        return self.executors[pool_id]
+
+    def set_default_executor(self, pool_id: str = 'default') -> None:
+        """install the executor of pool id as the default executor of current IOLoop, loop.run_in_executor(None, ...) runs in that pool"""
+        from tornado.ioloop import IOLoop
+        IOLoop.current().set_default_executor(self.get_executor(pool_id))
 
     def info(self) -> Dict:
         return {**super().info(), **{
@@ -261,12 +372,39 @@ class WorkerPoolComponent(Component):
             }
         }}
 
+    def reset_metrics(self) -> Dict:
+        """reset the metrics of thread pools, the process pools have no metrics"""
+        return {k: v.reset_metrics().info() for k, v in self.pools.items() if hasattr(v, 'reset_metrics')}
+
     def run_method(self, func: Callable, *args, pool_id: str = 'default', **kwargs) -> Any:
         return self.pools[pool_id].run_method(func, *args, **kwargs)
 
     async def run_method_async(self, func: Callable, *args, pool_id: str = 'default', **kwargs) -> Any:
         return await self.pools[pool_id].run_method_async(func, *args, **kwargs)
 
+    def iterate_async(self, gen_func: Callable[..., Iterator], *args, pool_id: str = 'default', buffer: int = 64,
+                      **kwargs) -> AsyncIterator:
+        """use async for to consume the items of blocking generator iterated in worker thread, the pool must be thread type"""
+        return self.pools[pool_id].iterate_async(gen_func, *args, buffer=buffer, **kwargs)
+
+    async def map_async(self, func: Callable, iterable: Iterable, chunksize: int = None, ordered: bool = True,
+                        pool_id: str = 'default') -> List[Any]:
+        return await self.pools[pool_id].map_async(func, iterable, chunksize=chunksize, ordered=ordered)
+
+    async def gather_async(self, calls: Iterable[Union[Callable, tuple]], chunksize: int = None, ordered: bool = True,
+                           pool_id: str = 'default') -> List[Any]:
+        return await self.pools[pool_id].gather_async(calls, chunksize=chunksize, ordered=ordered)
+
+    def _get_function(self, function: Union[Callable, str, None]) -> Callable:
+        """return the function of import path 'module.function'"""
+        if isinstance(function, str):
+            module, _, name = function.rpartition('.')
+            return get_class(module, name)
+        return function
+
     def dispose(self, component_manager: ComponentManager) -> None:
+        for _, v in self.executors.items():
+            v.shutdown(wait=False)
+
         for _, v in self.pools.items():
             v.dispose()
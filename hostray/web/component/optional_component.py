@@ -28,14 +28,24 @@ hostray application loads the components if server_config.yaml specified
         note:
             OrmDBComponent holds database connection, database might cut off the connections for long time idles,
             so it's necessary to refresh connection by calling reset_session() or reset_session_async() before query database,
-            parameter "connection_refresh" is the timer to prevent rapidly reconnect database
+            parameter "connection_refresh" is the timer to prevent rapidly reconnect database,
+            the connection pool checks the connections itself if "pool_pre_ping" or "pool_recycle" is set,
+            then the workers are not reconnected by timer unless "connection_refresh" is specified,
+            the db of "async" awaits AsyncOrmDBEntityAccessor functions in event loop instead of worker threads
 
         component:                                  # component block of server_config.yaml
             orm_db:                                 # indicate DefaultComponentTypes.OrmDB
                 db_id_1:    <str>                   # define string id will be use in code
                     module: <str>                   # required - support 'sqlite', 'sqlite_memory', 'mysql'
                     worker: <int>                   # optional - db access worker limit, default 1
-                    connection_refresh: <int>       # optional - timer to refresh connection, default 30 seconds
+                    connection_refresh: <int>       # optional - timer to refresh connection, default 30 seconds,
+                                                    #   never if pool_pre_ping or pool_recycle is set
+                    pool_pre_ping: <bool>           # optional - test the connection before using it, reconnect if it is broken
+                    pool_recycle: <int>             # optional - reconnect the connection older than seconds
+                    adaptive_limit: <bool or dict>  # optional - adjust the concurrent queries by their execution time,
+                                                    #   the same as the parameter of worker_pool
+                    async: <bool>                   # optional - use AsyncOrmDB with sqlalchemy>=1.4 and aiosqlite or aiomysql,
+                                                    #   the accessors should be AsyncOrmDBEntityAccessor, default false
 
                     # when module is 'sqlite', you should add parameters:
                     file_name: <str>                # required - specify sqlite db file path
@@ -46,6 +56,9 @@ hostray application loads the components if server_config.yaml specified
                     db_name:    <str>               # required - db database name
                     user:       <str>               # required - login user id
                     password:   <str>               # required - login user password
+                    pool_size:  <int>               # optional - connections kept in the pool shared by workers, default 5
+                    max_overflow: <int>             # optional - connections allowed over pool_size, default 10
+                    pool_timeout: <int>             # optional - seconds to wait for a connection, default 30
                 db_id_2:
                     ...etc
 
@@ -78,14 +91,14 @@ Last Updated:  Tuesday, 5th November 2019 by hsky77 (howardlkung@gmail.com)
 import asyncio
 import time
 from enum import Enum
-from typing import Union, Callable, Dict, Tuple, Any, List, Awaitable
+from typing import Union, Callable, Dict, Tuple, Any, List, Awaitable, AsyncIterator
 from datetime import datetime, timedelta
 from contextlib import contextmanager
 import requests
 
 from aiohttp import ClientResponse, TCPConnector, ClientSession
 from hostray.util import generate_base64_uid, join_path, asynccontextmanager
-from hostray.util.orm import OrmAccessWorkerPool, DB_MODULE_NAME, DeclarativeMeta
+from hostray.util.orm import OrmAccessWorkerPool, AsyncOrmDB, DB_MODULE_NAME, DeclarativeMeta
 
 from .. import (HostrayWebException, LocalCode_Not_Accessor_Function,
                 LocalCode_No_DB_Module, LocalCode_Not_Support_DB_Module)
@@ -203,8 +216,10 @@ class OrmDBComponent(Component):
             self.dbs[k]['open'] = False
 
             self.dbs[k]['worker'] = self.dbs[k].get('worker', 1)
+            self.dbs[k]['async'] = self.dbs[k].get('async', False)
             self.dbs[k]['connection_refresh'] = self.dbs[k].get(
-                'connection_refresh', 30)
+                'connection_refresh', None if self.dbs[k].get('pool_pre_ping') or
+                self.dbs[k].get('pool_recycle') is not None else 30)
 
             if not 'module' in self.dbs[k]:
                 if not self.dbs[k]['module'] in self.support_db_type:
@@ -222,26 +237,32 @@ class OrmDBComponent(Component):
             res[db_id] = self.get_db_settings(db_id)
         return {**super().info(), **{'info': res}}
 
-    def get_pool_obj(self, db_id: str) -> OrmAccessWorkerPool:
+    def get_pool_obj(self, db_id: str) -> Union[OrmAccessWorkerPool, AsyncOrmDB]:
         return self.dbs[db_id]['db']
 
+    def is_async(self, db_id: str) -> bool:
+        return self.dbs[db_id]['async']
+
     def get_db_settings(self, db_id: str) -> Dict:
         return {k: v for k, v in self.dbs[db_id].items() if not k in ['db']}
 
     def init_db_declarative_base(self, db_id: str, declared_entity_base: DeclarativeMeta) -> None:
         if db_id in self.dbs:
             if not self.dbs[db_id]['db']:
-                db = OrmAccessWorkerPool(
-                    pool_name=db_id, worker_limit=self.dbs[db_id]['worker'])
-
                 module = DB_MODULE_NAME.SQLITE_MEMORY
                 if self.dbs[db_id]['module'] == 'sqlite':
                     module = DB_MODULE_NAME.SQLITE_FILE
                 elif self.dbs[db_id]['module'] == 'mysql':
                     module = DB_MODULE_NAME.MYSQL
 
-                db.set_session_maker(
-                    module, declared_entity_base, **self.dbs[db_id])
+                if self.dbs[db_id]['async']:
+                    db = AsyncOrmDB(module, declared_entity_base, **self.dbs[db_id])
+                else:
+                    db = OrmAccessWorkerPool(
+                        pool_name=db_id, worker_limit=self.dbs[db_id]['worker'],
+                        adaptive_limit=self.dbs[db_id].get('adaptive_limit'))
+                    db.set_session_maker(
+                        module, declared_entity_base, **self.dbs[db_id])
                 self.dbs[db_id]['reset_dt'] = None
                 self.dbs[db_id]['db'] = db
                 self.dbs[db_id]['open'] = True
@@ -256,19 +277,25 @@ class OrmDBComponent(Component):
         async with self.dbs[db_id]['db'].reserve_worker_async() as identity:
             yield identity
 
+    @asynccontextmanager
+    async def session_async(self, db_id: str) -> 'AsyncSession':
+        """yield a new AsyncSession of the async db, it is closed after the clause"""
+        async with self.dbs[db_id]['db'].session() as sess:
+            yield sess
+
     def reset_session(self, db_id: str, force_reconnect: bool = False) -> None:
         """reset db worker sessions
 
         ATTENTION: do not call this function in the clauses of 'with reserve_worker():' and 'with reserve_worker_async():'
         """
-        if self.dbs[db_id]['open'] and not self.dbs[db_id]['module'] == 'sqlite_memory':
+        if self.dbs[db_id]['open'] and not self.dbs[db_id]['module'] == 'sqlite_memory' and not self.dbs[db_id]['async']:
             if self.dbs[db_id]['worker'] < 2:
                 force_reconnect = False
 
             if force_reconnect:
                 self.dbs[db_id]['db'].reset_connection()
                 self.dbs[db_id]['reset_dt'] = datetime.now()
-            else:
+            elif self.dbs[db_id]['connection_refresh'] is not None:
                 if self.dbs[db_id]['reset_dt'] is None:
                     self.dbs[db_id]['reset_dt'] = datetime.now()
                 elif (datetime.now() - self.dbs[db_id]['reset_dt']).seconds > self.dbs[db_id]['connection_refresh']:
@@ -281,17 +308,20 @@ class OrmDBComponent(Component):
         ATTENTION: do not call this function in the clauses of 'with reserve_worker():' and 'with reserve_worker_async():'
         """
         if self.dbs[db_id]['open'] and not self.dbs[db_id]['module'] == 'sqlite_memory':
-            if self.dbs[db_id]['worker'] < 2:
+            if self.dbs[db_id]['worker'] < 2 or self.dbs[db_id]['async']:  # the sessions of async db are not kept
                 force_reconnect = False
 
             if force_reconnect:
                 await self.dbs[db_id]['db'].reset_connection_async()
                 self.dbs[db_id]['reset_dt'] = datetime.now()
-            else:
+            elif self.dbs[db_id]['connection_refresh'] is not None:
                 if self.dbs[db_id]['reset_dt'] is None:
                     self.dbs[db_id]['reset_dt'] = datetime.now()
                 elif (datetime.now() - self.dbs[db_id]['reset_dt']).seconds > self.dbs[db_id]['connection_refresh']:
-                    await self.dbs[db_id]['db'].reset_connection_async()
+                    if self.dbs[db_id]['async']:
+                        await self.dbs[db_id]['db'].reset_connection()
+                    else:
+                        await self.dbs[db_id]['db'].reset_connection_async()
                     self.dbs[db_id]['reset_dt'] = datetime.now()
 
     def run_accessor(self, db_id: str, accessor_func: Callable, *args, identity: str = None, **kwargs) -> Any:
@@ -304,19 +334,46 @@ class OrmDBComponent(Component):
                 LocalCode_Not_Accessor_Function, accessor_func)
 
     async def run_accessor_async(self, db_id: str, accessor_func: Callable, *args, identity: str = None, **kwargs) -> Any:
-        from hostray.util.orm import OrmDBEntityAccessor
-        if issubclass(type(accessor_func.__self__), OrmDBEntityAccessor):
+        """the functions of AsyncOrmDBEntityAccessor run with a new session of async db, identity is ignored"""
+        from hostray.util.orm import OrmDBEntityAccessor, AsyncOrmDBEntityAccessor
+        if self.dbs[db_id]['async'] and issubclass(type(accessor_func.__self__), AsyncOrmDBEntityAccessor):
+            if self.dbs[db_id]['open']:
+                return await self.dbs[db_id]['db'].run_accessor(accessor_func, *args, **kwargs)
+        elif not self.dbs[db_id]['async'] and issubclass(type(accessor_func.__self__), OrmDBEntityAccessor):
             if self.dbs[db_id]['open']:
                 return await self.dbs[db_id]['db'].run_method_async(accessor_func, *args, identity=identity, **kwargs)
         else:
             raise HostrayWebException(
                 LocalCode_Not_Accessor_Function, accessor_func)
 
-    def dispose(self, component_manager: ComponentManager) -> None:
+    async def iterate_accessor_async(self, db_id: str, accessor_func: Callable, *args, buffer: int = 64, **kwargs) -> AsyncIterator:
+        """
+        yield the items of generator function of accessor such as iterate(),
+        the generator of OrmDBEntityAccessor is iterated in worker thread and the items are buffered at most buffer,
+        the async generator of AsyncOrmDBEntityAccessor iterates with a new session of async db
+        """
+        from hostray.util.orm import OrmDBEntityAccessor, AsyncOrmDBEntityAccessor
+        if self.dbs[db_id]['async'] and issubclass(type(accessor_func.__self__), AsyncOrmDBEntityAccessor):
+            if self.dbs[db_id]['open']:
+                async with self.dbs[db_id]['db'].session() as sess:
+                    async for item in accessor_func(sess, *args, **kwargs):
+                        yield item
+        elif not self.dbs[db_id]['async'] and issubclass(type(accessor_func.__self__), OrmDBEntityAccessor):
+            if self.dbs[db_id]['open']:
+                async for item in self.dbs[db_id]['db'].iterate_async(accessor_func, *args, buffer=buffer, **kwargs):
+                    yield item
+        else:
+            raise HostrayWebException(
+                LocalCode_Not_Accessor_Function, accessor_func)
+
+    async def dispose(self, component_manager: ComponentManager) -> None:
         for db_id in self.dbs:
             if self.dbs[db_id]['open']:
                 self.dbs[db_id]['open'] = False
-                self.dbs[db_id]['db'].dispose()
+                if self.dbs[db_id]['async']:
+                    await self.dbs[db_id]['db'].dispose()
+                else:
+                    self.dbs[db_id]['db'].dispose()
 
 
 class ServicesComponent(Component):
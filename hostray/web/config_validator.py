@@ -11,7 +11,7 @@ from typing import Dict, List, Type, Any, Tuple, Union, Iterable
 
 from enum import Enum
 
-from ..util import HierarchyElementMeta, LocalCode_No_Parameters, LocalCode_Parameters_No_Key
+from ..util import HierarchyElementMeta, LocalCode_No_Parameters, LocalCode_Parameters_No_Key, BackpressurePolicy
 from .constants import Component_Module_Folder, Controller_Module_Folder
 from . import (HostrayWebException, LocalCode_Parameter_Required,
                LocalCode_Parameter_Type_Error, LocalCode_Setup_Error,
@@ -166,7 +166,7 @@ class ConfigScalableContainerMeta(ConfigBaseElementMeta):
 
 class ConfigScalableElementMeta(ConfigBaseElementMeta):
     def __new__(cls, element_type: Union[str, int], parameter_type: Any) -> type:
-        return super().__new__(cls, 'ConfigScalableElementMeta', element_type, False)
+        return super().__new__(cls, 'ConfigScalableElementMeta', parameter_type, False)
 
     def __init__(cls, element_type: Union[str, int], parameter_type: Any) -> None:
         cls.element_type = ConfigElementType.ScalableElement
@@ -194,6 +194,71 @@ class ConfigSwitchableElementMeta(ConfigBaseElementMeta):
         return new_cls
 
 
+class AdaptiveLimitSetting():
+    """validate adaptive_limit of pool, it is bool or the dict of AdaptiveLimit parameters"""
+
+    validator = ConfigContainerMeta(
+        'adaptive_limit_setting', False,
+        ConfigElementMeta('initial_limit', int, False),
+        ConfigElementMeta('min_limit', int, False),
+        ConfigElementMeta('max_limit', int, False),
+        ConfigElementMeta('tolerance', float, False),
+        ConfigElementMeta('backoff', float, False),
+        ConfigElementMeta('window', int, False),
+        ConfigElementMeta('baseline_drift', float, False)
+    )
+
+    def __init__(self, setting: Union[bool, Dict]):
+        if isinstance(setting, dict):
+            for k in setting:
+                if not k in self.validator._cls_parameters:
+                    raise HostrayWebException(
+                        LocalCode_Invalid_Parameter, 'adaptive_limit', k)
+            self.validator(setting)
+        elif not isinstance(setting, bool):
+            raise HostrayWebException(
+                LocalCode_Invalid_Parameter, 'adaptive_limit', setting)
+
+
+class WorkerPoolSetting():
+    """validate the pool setting of worker_pool, it is the number of workers or the dict of pool parameters"""
+
+    pool_types = ('thread', 'process', 'coroutine')
+
+    validator = ConfigContainerMeta(
+        'worker_pool_setting', False,
+        ConfigElementMeta('type', str, False),
+        ConfigElementMeta('workers', int, False),
+        ConfigElementMeta('max_workers', int, False),
+        ConfigElementMeta('work_stealing', bool, False),
+        ConfigElementMeta('min_workers', int, False),
+        ConfigElementMeta('idle_timeout', float, False),
+        ConfigElementMeta('scale_up_wait', float, False),
+        ConfigElementMeta('default_executor', bool, False),
+        ConfigElementMeta('max_pending', int, False),
+        ConfigElementMeta('backpressure', BackpressurePolicy, False),
+        ConfigElementMeta('max_concurrency', int, False),
+        ConfigElementMeta('resource_factory', str, False),
+        ConfigElementMeta('resource_dispose', str, False),
+        ConfigElementMeta('health_check', str, False),
+        ConfigElementMeta('health_check_interval', float, False),
+        ConfigElementMeta('adaptive_limit', AdaptiveLimitSetting, False)
+    )
+
+    def __init__(self, setting: Union[int, Dict]):
+        if isinstance(setting, dict):
+            for k in setting:
+                if not k in self.validator._cls_parameters:
+                    raise HostrayWebException(
+                        LocalCode_Invalid_Parameter, 'worker_pool', k)
+            if not setting.get('type', 'thread') in self.pool_types:
+                raise HostrayWebException(
+                    LocalCode_Invalid_Parameter, 'worker_pool.type', setting['type'])
+            self.validator(setting)
+        else:
+            int(setting)
+
+
 HostrayWebConfigRootValidator = ConfigContainerMeta(
     'root', True,
     ConfigElementMeta('name', str, False),
@@ -220,11 +285,15 @@ HostrayWebConfigComponentValidator = ConfigContainerMeta(
     ),
     ConfigContainerMeta(
         'task_queue', False,
-        ConfigElementMeta('worker_count', int, True)
+        ConfigElementMeta('worker_count', int, True),
+        ConfigElementMeta('max_pending', int, False),
+        ConfigElementMeta('backpressure', BackpressurePolicy, False),
+        ConfigElementMeta('durable', str, False),
+        ConfigElementMeta('max_batch', int, False)
     ),
     ConfigContainerMeta(
         'worker_pool', False,
-        ConfigScalableElementMeta(str, int)
+        ConfigScalableElementMeta(str, WorkerPoolSetting)
     ),
     ConfigContainerMeta(
         'memory_cache', False,
@@ -241,21 +310,36 @@ HostrayWebConfigComponentValidator = ConfigContainerMeta(
                 ConfigContainerMeta(
                     'sqlite_memory', False,
                     ConfigElementMeta('worker', int, True),
-                    ConfigElementMeta('connection_refresh', int, True)),
+                    ConfigElementMeta('connection_refresh', int, False),
+                    ConfigElementMeta('pool_pre_ping', bool, False),
+                    ConfigElementMeta('pool_recycle', int, False),
+                    ConfigElementMeta('adaptive_limit', AdaptiveLimitSetting, False),
+                    ConfigElementMeta('async', bool, False)),
                 ConfigContainerMeta(
                     'sqlite', False,
                     ConfigElementMeta('worker', int, True),
-                    ConfigElementMeta('connection_refresh', int, True),
+                    ConfigElementMeta('connection_refresh', int, False),
+                    ConfigElementMeta('pool_pre_ping', bool, False),
+                    ConfigElementMeta('pool_recycle', int, False),
+                    ConfigElementMeta('adaptive_limit', AdaptiveLimitSetting, False),
+                    ConfigElementMeta('async', bool, False),
                     ConfigElementMeta('file_name', str, True)),
                 ConfigContainerMeta(
                     'mysql', False,
                     ConfigElementMeta('worker', int, True),
-                    ConfigElementMeta('connection_refresh', int, True),
+                    ConfigElementMeta('connection_refresh', int, False),
+                    ConfigElementMeta('pool_pre_ping', bool, False),
+                    ConfigElementMeta('pool_recycle', int, False),
+                    ConfigElementMeta('adaptive_limit', AdaptiveLimitSetting, False),
+                    ConfigElementMeta('async', bool, False),
                     ConfigElementMeta('host', str, True),
                     ConfigElementMeta('port', int, True),
                     ConfigElementMeta('db_name', str, True),
                     ConfigElementMeta('user', str, True),
                     ConfigElementMeta('password', str, True),
+                    ConfigElementMeta('pool_size', int, False),
+                    ConfigElementMeta('max_overflow', int, False),
+                    ConfigElementMeta('pool_timeout', int, False),
                 ))
         )
     ),
@@ -50,6 +50,7 @@ LocalCode_Failed_To_Load_Controller = 300
 LocalCode_Missing_Required_Parameter = 301
 LocalCode_Incorrect_Type = 302
 LocalCode_Not_Valid_Column = 303
+LocalCode_Not_Json_Array = 304
 
 LocalCode_Cache_Expired = 310
 LocalCode_Data_Added = 311
@@ -58,6 +59,7 @@ LocalCode_Data_Delete = 313
 LocalCode_Data_No_Changed = 314
 LocalCode_Data_Not_Exist = 315
 LocalCode_Data_Added_Failed = 316
+LocalCode_Rows_Changed = 317
 
 LocalCode_Upload_Success = 320
 LocalCode_Connect_Failed = 321
@@ -74,6 +74,14 @@ class UnitTestControllerType(ControllerType):
         'test_orm', 'unittest_controller', 'TestCUSDController'
     )
 
+    TestAsyncCUSDController = (
+        'test_orm_async', 'unittest_controller', 'TestAsyncCUSDController'
+    )
+
+    TestCustomGetCUSDController = (
+        'test_orm_custom_get', 'unittest_controller', 'TestCustomGetCUSDController'
+    )
+
     TestStreamDownloadController = (
         'test_download', 'unittest_controller', 'TestStreamDownloadController'
     )
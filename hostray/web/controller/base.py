@@ -9,13 +9,13 @@ This module defines the base Controller classes
 Last Updated:  Monday, 4th November 2019 by hsky77 (howardlkung@gmail.com)
 '''
 
-from typing import Union, Callable, Any, List, Dict
+from typing import Union, Callable, Any, AsyncIterator, Iterator, List, Dict
 from requests import Response
 
 from tornado.web import Finish, RequestHandler
 
 from ... import Module_Path
-from ...util import DynamicClassEnum, HostrayLogger, join_path
+from ...util import DynamicClassEnum, HostrayLogger, join_path, TaskPriority
 
 from .. import HostrayWebException, Controller_Module_Folder, HostrayWebFinish
 from ..component import DefaultComponentTypes, OptionalComponentTypes, ComponentManager
@@ -61,23 +61,27 @@ class ControllerAddon():
     async def run_method_async(self, func: Callable, *args, pool_id: str = 'default', **kwargs) -> Any:
         return await self.application.run_method_async(func, *args, pool_id=pool_id, **kwargs)
 
+    def iterate_async(self, gen_func: Callable[..., Iterator], *args, pool_id: str = 'default', buffer: int = 64, **kwargs) -> AsyncIterator:
+        """use async for to consume the items of blocking generator iterated in worker thread"""
+        return self.application.iterate_async(gen_func, *args, pool_id=pool_id, buffer=buffer, **kwargs)
+
     def log_info(self, msg: str, *args, exc_info=None, extra=None, stack_info=False) -> None:
         if self.logger is None:
             self.logger = self.application.get_logger(type(self).__name__)
         self.application.run_method_in_queue(
-            self.logger.info, msg, *args, exc_info=exc_info, extra=extra, stack_info=stack_info)
+            self.logger.info, msg, *args, priority=TaskPriority.Low, exc_info=exc_info, extra=extra, stack_info=stack_info)
 
     def log_warning(self, msg: str, *args, exc_info=None, extra=None, stack_info=False) -> None:
         if self.logger is None:
             self.logger = self.application.get_logger(type(self).__name__)
         self.application.run_method_in_queue(
-            self.logger.warning, msg, *args, exc_info=exc_info, extra=extra, stack_info=stack_info)
+            self.logger.warning, msg, *args, priority=TaskPriority.Low, exc_info=exc_info, extra=extra, stack_info=stack_info)
 
     def log_error(self, msg: str, *args, exc_info=None, extra=None, stack_info=False) -> None:
         if self.logger is None:
             self.logger = self.application.get_logger(type(self).__name__)
         self.application.run_method_in_queue(
-            self.logger.error, msg, *args, exc_info=exc_info, extra=extra, stack_info=stack_info)
+            self.logger.error, msg, *args, priority=TaskPriority.Low, exc_info=exc_info, extra=extra, stack_info=stack_info)
 
     async def invoke_service_async(self,
                                    service_name_or_url: str = None,
@@ -8,12 +8,17 @@ Last Updated:  Tuesday, 5th November 2019 by hsky77 (howardlkung@gmail.com)
 '''
 
 
-from typing import Dict
+import json
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Tuple, Union
 
+from tornado.escape import json_encode
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.inspection import inspect
 from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base
 
-from hostray.util.orm import EntityBaseAddon, OrmDBEntityAccessor
+from hostray.util import asynccontextmanager, str_to_datetime
+from hostray.util.orm import EntityBaseAddon, OrmDBEntityAccessor, AsyncOrmDBEntityAccessor
 
 from .. import (HostrayWebException,
                 LocalCode_Not_Accessor_Function,
@@ -23,7 +28,9 @@ from .. import (HostrayWebException,
                 LocalCode_Data_Delete,
                 LocalCode_Data_No_Changed,
                 LocalCode_Data_Not_Exist,
-                LocalCode_Data_Added_Failed)
+                LocalCode_Data_Added_Failed,
+                LocalCode_Rows_Changed,
+                LocalCode_Incorrect_Type)
 from ..component import OptionalComponentTypes
 from ..component.optional_component import OrmDBComponent
 
@@ -32,9 +39,23 @@ from .request_controller import RequestController, RESTfulMethodType
 
 
 class DBCSUDController(RequestController):
+    """
+    orm_db_accessor should be AsyncOrmDBEntityAccessor if the db is async
+
+    POST, PUT and DELETE with the body of JSON array of objects (Content-Type: application/json) are
+    bulk_add(), bulk_merge() and bulk_delete() of accessor in one transaction
+
+    GET with the arguments of page_arguments if the GET method of orm_db_methods is select() of accessor:
+        - limit, after: select_page() of accessor, the header Next-After is the after of next page if the page is full
+        - stream: write the entities of iterate() as JSON array and flush every yield_per entities,
+          the entities are not kept in the cache, the stream of db with worker pool occupies a worker until the response is written
+    the customized GET method gets page_arguments as the other arguments
+    """
     qn_key = 'queried_entities'
+    page_arguments = ('limit', 'after', 'stream')
+    yield_per = 1000
 
-    orm_db_accessor: OrmDBEntityAccessor = None
+    orm_db_accessor: Union[OrmDBEntityAccessor, AsyncOrmDBEntityAccessor] = None
     orm_db_methods: dict = {k.value: None for k in RESTfulMethodType}
 
     def initialize(self, use_orm_db):
@@ -42,6 +63,10 @@ class DBCSUDController(RequestController):
             OptionalComponentTypes.OrmDB)
 
         self.db_id = use_orm_db
+        if not self.orm_db.is_async(self.db_id) == isinstance(self.orm_db_accessor, AsyncOrmDBEntityAccessor):
+            raise HostrayWebException(
+                LocalCode_Not_Accessor_Function, self.orm_db_accessor)
+
         self.orm_db.init_db_declarative_base(
             self.db_id, self.orm_db_accessor.entity_cls)
 
@@ -65,10 +90,21 @@ class DBCSUDController(RequestController):
         return self.orm_db_methods[self.request.method]
 
     async def get(self):
-        keys = self.get_allowed_arguments()
+        paged = self.get_orm_db_method() == self.orm_db_accessor.select
+        limit, after, stream = self._get_page_arguments() if paged else (None, None, False)
+        keys = self._get_allowed_values({k: self.get_argument(k) for k in self.request.arguments
+                                         if not (paged and k in self.page_arguments)})
         await self.orm_db.reset_session_async(self.db_id)
-        async with self.orm_db.reserve_worker_async(self.db_id) as identity:
-            entities = await self.orm_db.run_accessor_async(self.db_id, self.get_orm_db_method(), identity=identity, **keys)
+        if stream:
+            return await self._write_stream(limit, after, keys)
+
+        async with self._accessor_runner() as run:
+            if limit is None and after is None:
+                entities = await run(self.get_orm_db_method(), **keys)
+            else:
+                entities = await run(self.orm_db_accessor.select_page, limit, after, **keys)
+                if limit is not None and len(entities) == limit:
+                    self.set_header('Next-After', self._get_next_after(entities[-1]))
 
             if entities is not None:
                 entities = entities if isinstance(
@@ -78,14 +114,18 @@ class DBCSUDController(RequestController):
                     self.write(entity.to_client_dict())
 
     async def post(self):
+        rows = self.get_json_array_arguments()
+        if rows is not None:
+            return await self._bulk_write(self.orm_db_accessor.bulk_add, rows)
+
         keys = self.get_allowed_arguments()
         rkeys = self.get_required_valid_arguments()
-        async with self.orm_db.reserve_worker_async(self.db_id) as identity:
+        async with self._accessor_runner() as run:
             try:
-                entity: EntityBaseAddon = await self.orm_db.run_accessor_async(self.db_id, self.get_orm_db_method(), identity=identity, **keys)
+                entity: EntityBaseAddon = await run(self.get_orm_db_method(), **keys)
 
-                changed = await self.orm_db.run_accessor_async(self.db_id, self.orm_db_accessor.save, identity=identity)
-                entity = await self.orm_db.run_accessor_async(self.db_id, self.orm_db_accessor.refresh, entity, identity=identity)
+                changed = await run(self.orm_db_accessor.save)
+                entity = await run(self.orm_db_accessor.refresh, entity)
                 self.changed_data = entity.to_dict()
                 self._update_entity_cache(entity)
 
@@ -98,20 +138,24 @@ class DBCSUDController(RequestController):
 
                 await self.orm_db.reset_session_async(self.db_id, force_reconnect=True)
             except IntegrityError:
-                await self.orm_db.run_accessor_async(self.db_id, self.orm_db_accessor.rollback, identity=identity)
+                await run(self.orm_db_accessor.rollback)
                 raise HostrayWebFinish(LocalCode_Data_Added_Failed)
             except:
-                await self.orm_db.run_accessor_async(self.db_id, self.orm_db_accessor.rollback, identity=identity)
+                await run(self.orm_db_accessor.rollback)
                 raise
 
     async def put(self):
+        rows = self.get_json_array_arguments()
+        if rows is not None:
+            return await self._bulk_write(self.orm_db_accessor.bulk_merge, rows)
+
         keys = self.get_allowed_arguments()
-        async with self.orm_db.reserve_worker_async(self.db_id) as identity:
+        async with self._accessor_runner() as run:
             try:
-                entity: EntityBaseAddon = await self.orm_db.run_accessor_async(self.db_id, self.get_orm_db_method(), identity=identity, **keys)
+                entity: EntityBaseAddon = await run(self.get_orm_db_method(), **keys)
 
-                changed = await self.orm_db.run_accessor_async(self.db_id, self.orm_db_accessor.save, identity=identity)
-                entity = await self.orm_db.run_accessor_async(self.db_id, self.orm_db_accessor.refresh, entity, identity=identity)
+                changed = await run(self.orm_db_accessor.save)
+                entity = await run(self.orm_db_accessor.refresh, entity)
                 self.changed_data = entity.to_dict()
                 self._update_entity_cache(entity)
 
@@ -124,16 +168,20 @@ class DBCSUDController(RequestController):
 
                 await self.orm_db.reset_session_async(self.db_id, force_reconnect=True)
             except:
-                await self.orm_db.run_accessor_async(self.db_id, self.orm_db_accessor.rollback, identity=identity)
+                await run(self.orm_db_accessor.rollback)
                 raise
 
     async def delete(self):
+        rows = self.get_json_array_arguments()
+        if rows is not None:  # the rows are not loaded, so they are not checked with the cache
+            return await self._bulk_write(self.orm_db_accessor.bulk_delete, rows)
+
         self._check_entity_cache()
         rkeys = self.get_required_valid_arguments()
 
-        async with self.orm_db.reserve_worker_async(self.db_id) as identity:
+        async with self._accessor_runner() as run:
             try:
-                entity = await self.orm_db.run_accessor_async(self.db_id, self.orm_db_accessor.load, identity=identity, **rkeys)
+                entity = await run(self.orm_db_accessor.load, **rkeys)
                 if entity is None:
                     raise HostrayWebFinish(LocalCode_Data_Not_Exist)
 
@@ -141,8 +189,8 @@ class DBCSUDController(RequestController):
                 self.changed_data = entity.to_dict()
                 entity_identity = entity.identity
                 entity_type = type(entity)
-                await self.orm_db.run_accessor_async(self.db_id, self.get_orm_db_method(), entity, identity=identity)
-                _, _, delete = await self.orm_db.run_accessor_async(self.db_id, self.orm_db_accessor.save, identity=identity)
+                await run(self.get_orm_db_method(), entity)
+                _, _, delete = await run(self.orm_db_accessor.save)
 
                 if delete > 0:
                     self._delete_entity_cache(entity_type, entity_identity)
@@ -154,7 +202,7 @@ class DBCSUDController(RequestController):
 
                 await self.orm_db.reset_session_async(self.db_id, force_reconnect=True)
             except:
-                await self.orm_db.run_accessor_async(self.db_id, self.orm_db_accessor.rollback, identity=identity)
+                await run(self.orm_db_accessor.rollback)
                 raise
 
     async def patch(self):
@@ -163,17 +211,17 @@ class DBCSUDController(RequestController):
         akeys = self.get_allowed_arguments()
         params = self.get_non_required_valid_arguments()
 
-        async with self.orm_db.reserve_worker_async(self.db_id) as identity:
+        async with self._accessor_runner() as run:
             try:
-                entity = await self.orm_db.run_accessor_async(self.db_id, self.orm_db_accessor.load, identity=identity, **rkeys)
+                entity = await run(self.orm_db_accessor.load, **rkeys)
 
                 if entity is None:
                     raise HostrayWebFinish(LocalCode_Data_Not_Exist)
                 self._check_entity_cache(entity)
 
-                await self.orm_db.run_accessor_async(self.db_id, self.get_orm_db_method(), entity, identity=identity, **params)
-                _, update, _ = await self.orm_db.run_accessor_async(self.db_id, self.orm_db_accessor.save, identity=identity)
-                entity = await self.orm_db.run_accessor_async(self.db_id, self.orm_db_accessor.refresh, entity, identity=identity)
+                await run(self.get_orm_db_method(), entity, **params)
+                _, update, _ = await run(self.orm_db_accessor.save)
+                entity = await run(self.orm_db_accessor.refresh, entity)
                 self.changed_data = entity.to_dict()
                 self._update_entity_cache(entity)
 
@@ -185,9 +233,89 @@ class DBCSUDController(RequestController):
                     self.write(self.get_localized_message(
                         LocalCode_Data_No_Changed))
             except:
-                await self.orm_db.run_accessor_async(self.db_id, self.orm_db_accessor.rollback, identity=identity)
+                await run(self.orm_db_accessor.rollback)
                 raise
 
+    def _get_page_arguments(self) -> Tuple[int, Any, bool]:
+        """return limit, after converted to the types of primary key columns, and stream"""
+        limit = self.get_argument('limit', None)
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                limit = 0
+            if limit < 1:
+                raise HostrayWebFinish(
+                    LocalCode_Incorrect_Type, self.get_argument('limit'), int)
+
+        after = self.get_argument('after', None)
+        if after is not None:
+            columns = list(inspect(self.orm_db_accessor.entity_cls).primary_key)
+            try:
+                values = [after] if len(columns) == 1 else json.loads(after)
+                if not isinstance(values, list) or not len(values) == len(columns):
+                    raise ValueError(after)
+                values = [str_to_datetime(v) if c.type.python_type is datetime else c.type.python_type(v)
+                          for c, v in zip(columns, values)]
+            except Exception:
+                raise HostrayWebFinish(
+                    LocalCode_Incorrect_Type, after, columns[0].type.python_type if len(columns) == 1 else list)
+            after = values[0] if len(columns) == 1 else tuple(values)
+
+        stream = self.get_argument('stream', 'false').lower() in ('1', 'true')
+        return limit, after, stream
+
+    def _get_next_after(self, entity: EntityBaseAddon) -> str:
+        """the primary key of entity, the JSON array of keys if the primary key is composite"""
+        keys = entity.to_dict()
+        values = [keys[k] for k in self.orm_db_accessor.entity_cls.primary_keys()]
+        return str(values[0]) if len(values) == 1 else json.dumps(values)
+
+    async def _write_stream(self, limit: int, after: Any, keys: Dict) -> None:
+        """write JSON array and flush every yield_per entities, the rows are fetched while the chunks are sent"""
+        self.set_header('Content-Type', 'application/json; charset=UTF-8')
+        self.write('[')
+        count = 0
+        async for entity in self.orm_db.iterate_accessor_async(self.db_id, self.orm_db_accessor.iterate,
+                                                               limit=limit, after=after, yield_per=self.yield_per, **keys):
+            self.write((',' if count > 0 else '') + json_encode(entity.to_client_dict()))
+            count += 1
+            if count % self.yield_per == 0:
+                await self.flush()
+        self.write(']')
+
+    async def _bulk_write(self, func: Callable, rows: List[Dict]) -> None:
+        async with self._accessor_runner() as run:
+            try:
+                changed = await run(func, rows)
+                await run(self.orm_db_accessor.save)
+            except IntegrityError:
+                await run(self.orm_db_accessor.rollback)
+                raise HostrayWebFinish(LocalCode_Data_Added_Failed)
+            except:
+                await run(self.orm_db_accessor.rollback)
+                raise
+
+        if func == self.orm_db_accessor.bulk_add:
+            counts = (changed, 0, 0)
+        elif func == self.orm_db_accessor.bulk_merge:
+            counts = (*changed, 0)
+        else:
+            counts = (0, 0, changed)
+        self.write(self.get_localized_message(LocalCode_Rows_Changed, *counts))
+        await self.orm_db.reset_session_async(self.db_id, force_reconnect=True)
+
+    @asynccontextmanager
+    async def _accessor_runner(self) -> Callable[..., Awaitable]:
+        """yield the function awaits accessor functions in one session, the session of reserved worker or a new session of async db"""
+        if self.orm_db.is_async(self.db_id):
+            async with self.orm_db.session_async(self.db_id) as sess:
+                yield lambda func, *args, **kwargs: func(sess, *args, **kwargs)
+        else:
+            async with self.orm_db.reserve_worker_async(self.db_id) as identity:
+                yield lambda func, *args, **kwargs: self.orm_db.run_accessor_async(
+                    self.db_id, func, *args, identity=identity, **kwargs)
+
     def _check_entity_cache(self, entity: EntityBaseAddon = None) -> bool:
         if self.cache is not None:
             if not self.qn_key in self.cache:
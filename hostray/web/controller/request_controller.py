@@ -8,17 +8,18 @@ Last Updated:  Tuesday, 5th November 2019 by hsky77 (howardlkung@gmail.com)
 '''
 
 import sys
+import json
 import traceback
 from enum import Enum
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 from tornado.web import RequestHandler, HTTPError
 
 from .base import ControllerAddon, HostrayWebFinish
 
 from .. import (LocalCode_Missing_Required_Parameter, LocalCode_Incorrect_Type, LocalizedMessageWarning,
-                LocalCode_Not_Valid_Column)
+                LocalCode_Not_Valid_Column, LocalCode_Not_Json_Array)
 
 
 class RESTfulMethodType(Enum):
@@ -67,15 +68,44 @@ class RequestController(ControllerAddon, RequestHandler):
         self.set_header('App-Name', self.app_name)
 
     def get_allowed_arguments(self) -> Dict[str, Any]:
+        return self._get_allowed_values({k: self.get_argument(k) for k in self.request.arguments})
+
+    def get_json_array_arguments(self) -> List[Dict[str, Any]]:
+        """
+        return the list of arguments in the body of JSON array if the content type is application/json,
+        otherwise None such as the body is single object or empty, each object is validated like get_required_valid_arguments()
+        """
+        if not self.request.headers.get('Content-Type', '').startswith('application/json'):
+            return None
+
+        try:
+            rows = json.loads(self.request.body)
+        except ValueError:
+            return None
+        if not isinstance(rows, list):
+            return None
+        if not all(isinstance(row, dict) for row in rows):
+            raise HostrayWebFinish(LocalCode_Not_Json_Array)
+
+        rows = [self._get_allowed_values(row) for row in rows]
+        for row in rows:
+            for k in self.required_arugments.get(self.request.method, []):
+                if not k in row:
+                    raise HostrayWebFinish(
+                        LocalCode_Missing_Required_Parameter, k)
+        return rows
+
+    def _get_allowed_values(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
         keys = {}
-        for k in self.request.arguments:
+        for k, value in arguments.items():
             if len(self.allowed_arugments[self.request.method]) > 0:
                 if not k in self.allowed_arugments[self.request.method]:
                     raise HostrayWebFinish(
                         LocalCode_Not_Valid_Column, k)
+                elif value is None:  # null of JSON
+                    keys[k] = None
                 else:
                     try:
-                        value = self.get_argument(k)
                         if self.allowed_arugments[self.request.method][k] is datetime:
                             # datetime type
                             from hostray.util import str_to_datetime
@@ -87,7 +117,7 @@ class RequestController(ControllerAddon, RequestHandler):
                         raise HostrayWebFinish(
                             LocalCode_Incorrect_Type, value, self.allowed_arugments[self.request.method][k])
             else:
-                keys[k] = self.get_argument(k)
+                keys[k] = value
         return keys
 
     def get_required_valid_arguments(self) -> Dict[str, Any]:
@@ -7,11 +7,11 @@
 Last Updated:  Wednesday, 13th November 2019 by hsky77 (howardlkung@gmail.com)
 '''
 
-from . import (RequestController, DBCSUDController, WebSocketController,
+from . import (RequestController, DBCSUDController, WebSocketController, RESTfulMethodType,
                StreamingDownloadController, StreamingFileUploadController, StreamingUploadController)
 
 from ...util import GB
-from ...unit_test.util_orm import TestAccessor
+from ...unit_test.util_orm import TestAccessor, AsyncTestAccessor
 
 
 class TestController(RequestController):
@@ -54,6 +54,22 @@ class TestCUSDController(DBCSUDController):
     orm_db_accessor = TestAccessor()
 
 
+class TestAsyncCUSDController(DBCSUDController):
+    orm_db_accessor = AsyncTestAccessor()
+
+
+class TestCustomGetAccessor(TestAccessor):
+    def select_adults(self, sess, limit=None, **kwargs):
+        entities = [e for e in self.select(sess, **kwargs) if e.age >= 18]
+        return entities if limit is None else entities[:int(limit)]
+
+
+class TestCustomGetCUSDController(DBCSUDController):
+    orm_db_accessor = TestCustomGetAccessor()
+    orm_db_methods = {**DBCSUDController.orm_db_methods,
+                      RESTfulMethodType.GET.value: orm_db_accessor.select_adults}
+
+
 class TestStreamDownloadController(StreamingDownloadController):
     async def _prepare_binary(self):
         self.set_header('Content-Disposition',
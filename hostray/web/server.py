@@ -9,11 +9,11 @@ Last Updated:  Monday, 4th November 2019 by hsky77 (howardlkung@gmail.com)
 
 
 import os
-from typing import List, Any, Callable, Awaitable, Dict, Union
+from typing import List, Any, AsyncIterator, Callable, Awaitable, Dict, Iterator, Union
 from tornado.web import Application
 
 
-from hostray.util import join_path, HostrayLogger, DynamicClassEnum, join_to_abs_path
+from hostray.util import join_path, HostrayLogger, DynamicClassEnum, join_to_abs_path, TaskPriority
 from .component import (ComponentManager, ComponentTypes, DefaultComponentTypes,
                         OptionalComponentTypes, create_server_component_manager)
 
@@ -74,13 +74,25 @@ class HostrayApplication(Application):
         return self.component_manager.get_component(DefaultComponentTypes.Logger).get_logger(name, sub_dir, mode, encoding)
 
     def run_method_in_queue(self, func: Callable, *args, on_finish: Callable[[Any], None] = None, on_exception: Callable[[Exception], None] = None,
-                            **kwargs):
-        self.component_manager.get_component(DefaultComponentTypes.TaskQueue).run_method_in_queue(
-            func, *args, on_finish=on_finish, on_exception=on_exception, **kwargs)
+                            priority: TaskPriority = TaskPriority.Normal, deadline: float = None,
+                            on_expired: Callable[[Callable], None] = None, **kwargs) -> bool:
+        return self.component_manager.get_component(DefaultComponentTypes.TaskQueue).run_method_in_queue(
+            func, *args, on_finish=on_finish, on_exception=on_exception,
+            priority=priority, deadline=deadline, on_expired=on_expired, **kwargs)
+
+    def run_task_in_queue(self, name: str, *args, on_finish: Callable[[Any], None] = None, on_exception: Callable[[Exception], None] = None,
+                          priority: TaskPriority = TaskPriority.Normal, deadline: float = None,
+                          on_expired: Callable[[Callable], None] = None, **kwargs) -> bool:
+        return self.component_manager.get_component(DefaultComponentTypes.TaskQueue).run_task_in_queue(
+            name, *args, on_finish=on_finish, on_exception=on_exception,
+            priority=priority, deadline=deadline, on_expired=on_expired, **kwargs)
 
     async def run_method_async(self, func: Callable, *args, pool_id: str = 'default', **kwargs) -> Any:
         return await self.component_manager.get_component(DefaultComponentTypes.WorkerPool).run_method_async(func, *args, pool_id=pool_id, **kwargs)
 
+    def iterate_async(self, gen_func: Callable[..., Iterator], *args, pool_id: str = 'default', buffer: int = 64, **kwargs) -> AsyncIterator:
+        return self.component_manager.get_component(DefaultComponentTypes.WorkerPool).iterate_async(gen_func, *args, pool_id=pool_id, buffer=buffer, **kwargs)
+
 
 class HostrayServer():
     def start(self):
@@ -38,6 +38,7 @@ setuptools.setup(
                       'PyMySQL>=0.9.3',
                       'aiohttp>=3.6.2',
                       'requests>=2.20.0'],
+    extras_require={'async': ['sqlalchemy>=1.4', 'aiosqlite>=0.17.0', 'aiomysql>=0.0.21']},
     python_requires='>=3.6',
     package_data={'': ['*.yaml', '*.csv']}
 )